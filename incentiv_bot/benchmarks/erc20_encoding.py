@@ -0,0 +1,128 @@
+# Micro-benchmark: web3 contract-function path vs. ERC20Codec fast path.
+#
+#   python benchmarks/erc20_encoding.py [--iterations N] [--json out.json]
+#
+# Runs against an in-process provider, so the numbers are pure client-side
+# overhead (encoding, normalization, decoding, middleware), not network time.
+# Each case takes a wallet address: "fast" cycles through more distinct
+# addresses than the codec's address cache holds, so every call pays for the
+# checksum check, as for a large wallet set; "fast_cached" reuses one address.
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from eth_account import Account  # noqa: E402
+from web3 import Web3  # noqa: E402
+from web3.providers.base import BaseProvider  # noqa: E402
+
+from incentiv_bot.contracts import (  # noqa: E402
+    ERC20_ABI,
+    ERC20Codec,
+    ERC20Helper,
+    ERC20TxBuilder,
+    TokenRegistry,
+    _address_word,
+)
+
+TOKEN = "0x4200000000000000000000000000000000000006"
+OWNER = "0x00000000219ab540356cBB839Cbe05303d7705Fa"
+SPENDER = "0xcA11bde05977b3631167028862bE2a173976CA11"
+WORD = "0x" + (12345).to_bytes(32, "big").hex()
+
+
+class _StaticProvider(BaseProvider):
+    # Every eth_call returns the same uint256 word
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+    def make_request(self, method, params):
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x1"}
+        if method == "eth_call":
+            return {"jsonrpc": "2.0", "id": 1, "result": WORD}
+        raise NotImplementedError(method)
+
+
+def _addresses(count: int) -> List[str]:
+    return [Web3.to_checksum_address((i + 1).to_bytes(20, "big")) for i in range(count)]
+
+
+def _rate(fn: Callable[[str], object], iterations: int, addresses: List[str]) -> float:
+    _address_word.cache_clear()
+    fn(addresses[0])
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(addresses[i % len(addresses)])
+    return iterations / (time.perf_counter() - start)
+
+
+def run(iterations: int) -> Dict[str, Dict[str, float]]:
+    web3 = Web3(_StaticProvider())
+    registry = TokenRegistry(web3, chain_id=1)
+    contract = web3.eth.contract(address=Web3.to_checksum_address(TOKEN), abi=ERC20_ABI)
+    helper = ERC20Helper(web3, TOKEN, registry=registry)
+    account = Account.create()
+    builder = ERC20TxBuilder(chain_id=1)
+    fees = {"maxFeePerGas": 2 * 10**9, "maxPriorityFeePerGas": 10**9}
+
+    # The spender stays fixed (one router); the wallet side varies
+    cases = {
+        "encode_transfer": (
+            lambda to: contract.encode_abi("transfer", args=[to, 10**18]),
+            lambda to: ERC20Codec.transfer(to, 10**18),
+        ),
+        "encode_allowance": (
+            lambda owner: contract.encode_abi("allowance", args=[owner, SPENDER]),
+            lambda owner: ERC20Codec.allowance(owner, SPENDER),
+        ),
+        "balance_of_call": (
+            lambda owner: contract.functions.balanceOf(owner).call(),
+            lambda owner: helper.balance_of(owner),
+        ),
+        "build_transfer_tx": (
+            lambda to: contract.functions.transfer(to, 10**18).build_transaction(
+                {"from": account.address, "nonce": 0, "gas": 65000, "chainId": 1, **fees}
+            ),
+            lambda to: builder.transfer(TOKEN, to, 10**18, nonce=0, gas=65000, **fees),
+        ),
+    }
+    distinct = _addresses(2 * (_address_word.cache_info().maxsize or 0) + 1)
+    results: Dict[str, Dict[str, float]] = {}
+    for name, (web3_path, fast_path) in cases.items():
+        before = _rate(web3_path, iterations, distinct)
+        after = _rate(fast_path, iterations, distinct)
+        cached = _rate(fast_path, iterations, [OWNER])
+        results[name] = {
+            "web3_per_sec": round(before),
+            "fast_per_sec": round(after),
+            "fast_cached_per_sec": round(cached),
+            "speedup": round(after / before, 1),
+            "speedup_cached": round(cached / before, 1),
+        }
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="ERC20 encoding micro-benchmark")
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    for name, r in results.items():
+        print(
+            f"{name:20} web3 {r['web3_per_sec']:>10,.0f}/s  fast {r['fast_per_sec']:>10,.0f}/s  x{r['speedup']:<5}"
+            f"  cached {r['fast_cached_per_sec']:>10,.0f}/s  x{r['speedup_cached']}"
+        )
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+# Local stand-ins for the Incentiv API and a JSON-RPC node, for offline
+# benchmarks. One aiohttp app serves both (/api/... and /rpc) from a
+# background thread, so sync (web3) and async (HttpClient) clients can use it.
+#
+#   with StandIns(latency_ms=2) as s:
+#       s.api_base, s.rpc_url, s.ws_url
+#
+# The chain is just enough for the bot's read and send paths: ERC20
+# balanceOf/allowance/decimals/symbol/name, transfer/approve simulation
+# (reverting when the sender's balance is short), Multicall3 aggregate3,
+# EIP-1559 fee fields, nonces, raw-transaction broadcast, instant receipts and
+# (empty) logs.
+# /ws speaks JSON-RPC too and pushes eth_subscribe("newHeads") notifications.
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+from aiohttp import web
+from eth_abi import decode, encode
+from eth_utils import keccak
+
+MULTICALL3 = "0xca11bde05977b3631167028862be2a173976ca11"
+CHAIN_ID = 1
+GWEI = 10**9
+
+_SELECTORS = {
+    "70a08231": "balanceOf",
+    "dd62ed3e": "allowance",
+    "313ce567": "decimals",
+    "95d89b41": "symbol",
+    "06fdde03": "name",
+    "82ad56cb": "aggregate3",
+    "a9059cbb": "transfer",
+    "095ea7b3": "approve",
+}
+
+
+class _Revert(Exception):
+    pass
+
+
+class FakeChain:
+    # Deterministic state: balance = int(owner) % 10**21, allowance = 0,
+    # one block per `block_time` seconds; nothing a transaction does sticks
+    def __init__(self, block_time: float = 1.0) -> None:
+        self.block_time = block_time
+        self.started = time.time()
+        self.nonces: Dict[str, int] = {}
+        self.receipts: Dict[str, Dict[str, Any]] = {}
+
+    def head(self) -> int:
+        return 100 + int((time.time() - self.started) / self.block_time)
+
+    def block(self, number: int) -> Dict[str, Any]:
+        return {
+            "number": hex(number),
+            "hash": "0x" + keccak(number.to_bytes(32, "big")).hex(),
+            "parentHash": "0x" + keccak((number - 1).to_bytes(32, "big")).hex(),
+            "timestamp": hex(int(self.started + (number - 100) * self.block_time)),
+            "gasLimit": hex(30_000_000),
+            "gasUsed": hex(0),
+            "baseFeePerGas": hex(GWEI),
+            "transactions": [],
+        }
+
+    @staticmethod
+    def balance(owner: str) -> int:
+        return int(owner, 16) % 10**21
+
+    def call(self, to: str, data: bytes, sender: Optional[str] = None) -> bytes:
+        name = _SELECTORS.get(data[:4].hex())
+        if to.lower() == MULTICALL3 and name == "aggregate3":
+            (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+            out = []
+            for target, _, calldata in calls:
+                try:
+                    out.append((True, self.call(target, calldata)))
+                except _Revert:
+                    out.append((False, b""))
+            return encode(["(bool,bytes)[]"], [out])
+        if name == "balanceOf":
+            (owner,) = decode(["address"], data[4:])
+            return encode(["uint256"], [self.balance(owner)])
+        if name == "transfer":
+            _, amount = decode(["address", "uint256"], data[4:])
+            if sender is None or amount > self.balance(sender):
+                raise _Revert()
+            return encode(["bool"], [True])
+        if name == "approve":
+            return encode(["bool"], [True])
+        if name == "allowance":
+            return encode(["uint256"], [0])
+        if name == "decimals":
+            return encode(["uint8"], [18])
+        if name == "symbol":
+            return encode(["string"], ["TKN"])
+        if name == "name":
+            return encode(["string"], ["Token"])
+        raise _Revert()
+
+    def handle(self, method: str, params: Any) -> Any:
+        if method == "eth_chainId":
+            return hex(CHAIN_ID)
+        if method == "eth_blockNumber":
+            return hex(self.head())
+        if method == "eth_getBlockByNumber":
+            tag = params[0]
+            return self.block(self.head() if tag in ("latest", "pending", "safe", "finalized") else int(tag, 16))
+        if method == "eth_gasPrice":
+            return hex(2 * GWEI)
+        if method == "eth_maxPriorityFeePerGas":
+            return hex(GWEI)
+        if method == "eth_feeHistory":
+            count = int(params[0], 16) if isinstance(params[0], str) else int(params[0])
+            head = self.head()
+            return {
+                "oldestBlock": hex(head - count + 1),
+                "baseFeePerGas": [hex(GWEI)] * (count + 1),
+                "gasUsedRatio": [0.5] * count,
+                "reward": [[hex(GWEI)] * len(params[2] if len(params) > 2 else [])] * count,
+            }
+        if method == "eth_estimateGas":
+            data = params[0].get("data") or params[0].get("input") or "0x"
+            raw = bytes.fromhex(data[2:])
+            if _SELECTORS.get(raw[:4].hex()) not in ("transfer", "approve"):
+                return hex(21_000)
+            self.call(params[0]["to"], raw, params[0].get("from"))
+            (target,) = decode(["address"], raw[4:36])
+            # Writing a zero balance slot costs a fresh SSTORE
+            fresh = _SELECTORS[raw[:4].hex()] == "approve" or self.balance(target) == 0
+            return hex(51_000 if fresh else 34_000)
+        if method == "eth_getTransactionCount":
+            return hex(self.nonces.get(params[0].lower(), 0))
+        if method == "eth_getCode":
+            return "0x6080" if params[0].lower() == MULTICALL3 else "0x"
+        if method == "eth_call":
+            data = params[0].get("data") or params[0].get("input") or "0x"
+            return "0x" + self.call(params[0]["to"], bytes.fromhex(data[2:]), params[0].get("from")).hex()
+        if method == "eth_sendRawTransaction":
+            tx_hash = "0x" + keccak(bytes.fromhex(params[0][2:])).hex()
+            self.receipts[tx_hash] = self._receipt(tx_hash)
+            return tx_hash
+        if method == "eth_getTransactionReceipt":
+            return self.receipts.get(params[0])
+        if method == "eth_getLogs":
+            return []
+        raise KeyError(method)
+
+    def _receipt(self, tx_hash: str) -> Dict[str, Any]:
+        number = self.head()
+        return {
+            "transactionHash": tx_hash,
+            "transactionIndex": "0x0",
+            "blockNumber": hex(number),
+            "blockHash": self.block(number)["hash"],
+            "status": "0x1",
+            "gasUsed": hex(52_000),
+            "cumulativeGasUsed": hex(52_000),
+            "effectiveGasPrice": hex(2 * GWEI),
+            "logs": [],
+            "type": "0x2",
+        }
+
+
+def _rpc_one(chain: FakeChain, request: Dict[str, Any]) -> Dict[str, Any]:
+    reply: Dict[str, Any] = {"jsonrpc": "2.0", "id": request.get("id")}
+    try:
+        reply["result"] = chain.handle(request["method"], request.get("params") or [])
+    except KeyError:
+        reply["error"] = {"code": -32601, "message": f"method not found: {request.get('method')}"}
+    except _Revert:
+        reply["error"] = {"code": 3, "message": "execution reverted", "data": "0x"}
+    return reply
+
+
+def _api_routes(app: web.Application, delay) -> None:
+    users: Dict[str, str] = {}
+
+    def payload(request: web.Request, body: Any) -> web.Response:
+        # Stable ETag so HttpClient's conditional requests get 304s
+        raw = web.json_response(body).body
+        etag = '"' + hashlib.sha1(raw).hexdigest()[:16] + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response(body, headers={"ETag": etag})
+
+    async def challenge(request: web.Request) -> web.Response:
+        await delay()
+        address = request.query.get("address", "")
+        return web.json_response({"message": f"Sign in to Incentiv as {address}"})
+
+    async def login(request: web.Request) -> web.Response:
+        await delay()
+        body = await request.json()
+        token = hashlib.sha256(str(body.get("address")).encode()).hexdigest()
+        users[token] = str(body.get("address"))
+        return web.json_response({"token": token})
+
+    async def user(request: web.Request) -> web.Response:
+        await delay()
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        return payload(request, {"address": users.get(token), "xp": 1200, "level": 3})
+
+    async def faucet(request: web.Request) -> web.Response:
+        await delay()
+        return web.json_response({"ok": True})
+
+    async def swap_route(request: web.Request) -> web.Response:
+        await delay()
+        path = [request.query.get("from"), request.query.get("to")]
+        return payload(request, {"path": path, "fee": 3000})
+
+    async def badge_check(request: web.Request) -> web.Response:
+        await delay()
+        return payload(request, {"badges": [{"id": i, "earned": i % 2 == 0} for i in range(8)]})
+
+    async def transaction_badge(request: web.Request) -> web.Response:
+        await delay()
+        return payload(request, {"count": 12})
+
+    async def xp_chart(request: web.Request) -> web.Response:
+        await delay()
+        return payload(request, {"points": [{"day": d, "xp": d * 10} for d in range(30)]})
+
+    app.router.add_get("/api/user/challenge", challenge)
+    app.router.add_post("/api/user/login", login)
+    app.router.add_get("/api/user", user)
+    app.router.add_post("/api/user/faucet", faucet)
+    app.router.add_get("/api/user/swap-route", swap_route)
+    app.router.add_get("/api/badge/check", badge_check)
+    app.router.add_get("/api/user/transaction-badge", transaction_badge)
+    app.router.add_get("/api/user/xp/chart", xp_chart)
+
+
+class StandIns:
+    # ws=False leaves /ws unrouted, as on a node without WebSocket support
+    def __init__(self, latency_ms: float = 0.0, block_time: float = 1.0, ws: bool = True) -> None:
+        self.latency = latency_ms / 1000
+        self.chain = FakeChain(block_time)
+        self.ws = ws
+        self._sockets: Set[web.WebSocketResponse] = set()
+        self.port: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.requests = 0
+
+    @property
+    def api_base(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def rpc_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/rpc"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}/ws"
+
+    async def _delay(self) -> None:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _rpc(self, request: web.Request) -> web.Response:
+        await self._delay()
+        body = await request.json()
+        if isinstance(body, list):
+            return web.json_response([_rpc_one(self.chain, r) for r in body])
+        return web.json_response(_rpc_one(self.chain, body))
+
+    async def _push_heads(self, ws: web.WebSocketResponse, subscription: str) -> None:
+        last = self.chain.head()
+        while not ws.closed:
+            await asyncio.sleep(self.chain.block_time / 20)
+            head = self.chain.head()
+            if head > last:
+                last = head
+                await ws.send_json(
+                    {
+                        "jsonrpc": "2.0",
+                        "method": "eth_subscription",
+                        "params": {"subscription": subscription, "result": self.chain.block(head)},
+                    }
+                )
+
+    async def _ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.add(ws)
+        pushers = []
+        try:
+            async for msg in ws:
+                if msg.type != web.WSMsgType.TEXT:
+                    continue
+                body = json.loads(msg.data)
+                if body.get("method") == "eth_subscribe" and body.get("params") == ["newHeads"]:
+                    subscription = hex(len(pushers) + 1)
+                    await ws.send_json({"jsonrpc": "2.0", "id": body.get("id"), "result": subscription})
+                    pushers.append(asyncio.ensure_future(self._push_heads(ws, subscription)))
+                else:
+                    await ws.send_json(_rpc_one(self.chain, body))
+        finally:
+            for pusher in pushers:
+                pusher.cancel()
+            self._sockets.discard(ws)
+        return ws
+
+    def close_websockets(self) -> None:
+        # Drops every open /ws connection (clients should fall back or reconnect)
+        async def close() -> None:
+            for ws in list(self._sockets):
+                await ws.close()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()  # type: ignore[arg-type]
+
+    async def _start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/rpc", self._rpc)
+        if self.ws:
+            app.router.add_get("/ws", self._ws)
+        _api_routes(app, self._delay)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+
+    def __enter__(self) -> "StandIns":
+        ready = threading.Event()
+        self._loop = asyncio.new_event_loop()
+
+        def run() -> None:
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())  # type: ignore[union-attr]
+            ready.set()
+            self._loop.run_forever()  # type: ignore[union-attr]
+
+        self._thread = threading.Thread(target=run, name="standins", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        assert self._loop is not None and self._runner is not None
+        self.close_websockets()
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()  # type: ignore[union-attr]
+        self._loop.close()
@@ -0,0 +1,132 @@
+# Import-time regression check for HTTP-only CLI commands.
+#
+#   python benchmarks/startup_budget.py [--budget-ms 450] [--repeat 5] [--json out.json]
+#
+# Runs `bot.py api-badge` (and `bot.py --daemon api-badge`) under
+# `python -X importtime` against a local stub API, then fails (exit 1) if any
+# web3/eth-stack module was imported or if total import time exceeds the
+# budget. Import time is summed over top-level imports (including the
+# interpreter's own, e.g. site), so it excludes the network round trip; the
+# best of --repeat runs is compared so a noisy machine does not fail it.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BOT = ROOT / "bot.py"
+
+# Top-level packages an HTTP-only command must never import
+FORBIDDEN = ("web3", "eth_account", "eth_abi", "eth_utils", "eth_keys", "hexbytes", "ckzg")
+
+
+class _StubApi(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def _parse_importtime(stderr: str) -> Tuple[float, List[str]]:
+    # Lines look like "import time:   self [us] | cumulative | name"; nested
+    # imports are indented, top-level ones are not
+    total_us = 0
+    modules: List[str] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules.append(name.strip())
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000, modules
+
+
+def measure(argv: List[str], env_file: Path, cwd: str, repeat: int) -> Dict[str, object]:
+    runs = []
+    for _ in range(max(1, repeat)):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", str(BOT), "--env", str(env_file), *argv],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            env={**os.environ, "PYTHONPATH": str(ROOT)},
+        )
+        runs.append((proc.returncode, *_parse_importtime(proc.stderr)))
+    returncode, import_ms, modules = min(runs, key=lambda r: r[1])
+    forbidden = sorted({m.split(".")[0] for m in modules if m.split(".")[0] in FORBIDDEN})
+    return {
+        "argv": argv,
+        "returncode": returncode,
+        "import_ms": round(import_ms, 1),
+        "runs_ms": [round(r[1], 1) for r in runs],
+        "modules": len(modules),
+        "forbidden": forbidden,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="HTTP-only command import-time budget")
+    parser.add_argument("--budget-ms", type=float, default=450.0, help="Max total import time for api-badge")
+    parser.add_argument("--client-budget-ms", type=float, default=150.0, help="Max total import time for --daemon")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command; the fastest is compared")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        env_file = Path(tmp) / ".env"
+        env_file.write_text(
+            "\n".join(
+                [
+                    "RPC_URL=http://127.0.0.1:9/unused",
+                    "CHAIN_ID=1",
+                    f"API_BASE=http://127.0.0.1:{server.server_address[1]}",
+                    "API_CACHE_FILE=",
+                    "ACCOUNTS_FILE=accounts.json",
+                ]
+            )
+        )
+        results = [
+            (measure(["api-badge"], env_file, tmp, args.repeat), args.budget_ms),
+            # No daemon is listening, so this exits 1 after parsing; only imports matter
+            (
+                measure(["--daemon", "--socket", str(Path(tmp) / "none.sock"), "api-badge"], env_file, tmp, args.repeat),
+                args.client_budget_ms,
+            ),
+        ]
+    server.shutdown()
+
+    failed = False
+    for result, budget in results:
+        result["budget_ms"] = budget
+        over = result["import_ms"] > budget
+        failed |= over or bool(result["forbidden"])
+        status = "FAIL" if over or result["forbidden"] else "ok"
+        label = "--daemon api-badge" if "--daemon" in result["argv"] else "api-badge"
+        print(f"{label:20} {result['import_ms']:>8.1f} ms / {budget:.0f} ms  {result['modules']:>4} modules  {status}")
+        if result["forbidden"]:
+            print(f"  forbidden imports: {', '.join(result['forbidden'])}")
+    if results[0][0]["returncode"] != 0:
+        print("api-badge did not complete against the stub API")
+        failed = True
+    if args.json:
+        Path(args.json).write_text(json.dumps([r for r, _ in results], indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+# Offline benchmark suite: HttpClient, IncentivApi, ERC20Helper,
+# WalletManager, the pooled RPC provider and the new-head feed against local stand-ins
+# (benchmarks/standins.py).
+#
+#   python benchmarks/suite.py [--iterations 200] [--latency-ms 0] [--wallets 10,100,1000]
+#                              [--blocks 20] [--only erc20] [--json out.json] [--compare baseline.json]
+#
+# Each scenario reports throughput (ops/s over its wall time) and p50/p99
+# latency per op. The stand-ins run in-process on another thread, so absolute
+# numbers include their cost too; compare runs on the same machine.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from standins import CHAIN_ID, StandIns  # noqa: E402
+
+TOKEN = "0x4200000000000000000000000000000000000006"
+RECIPIENT = "0x00000000219ab540356cBB839Cbe05303d7705Fa"
+
+
+def _key(i: int) -> str:
+    return "0x" + (i + 1).to_bytes(32, "big").hex()
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    # Nearest-rank
+    index = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float], wall: float, ops: Optional[int] = None) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    ops = len(samples) if ops is None else ops
+    return {
+        "ops": ops,
+        "wall_s": round(wall, 4),
+        "throughput_per_s": round(ops / wall, 1) if wall else None,
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int = 3) -> Dict[str, Any]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return summarize(samples, time.perf_counter() - start)
+
+
+async def ameasure(fn: Callable[[], Awaitable[Any]], iterations: int, concurrency: int = 1, warmup: int = 3) -> Dict[str, Any]:
+    for _ in range(warmup):
+        await fn()
+    samples: List[float] = []
+
+    async def one() -> None:
+        t = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    for offset in range(0, iterations, concurrency):
+        await asyncio.gather(*(one() for _ in range(min(concurrency, iterations - offset))))
+    result = summarize(samples, time.perf_counter() - start)
+    result["concurrency"] = concurrency
+    return result
+
+
+async def bench_http(s: StandIns, iterations: int) -> Dict[str, Dict[str, Any]]:
+    from incentiv_bot.http_cache import ResponseCache
+    from incentiv_bot.http_client import HttpClient
+    from incentiv_bot.incentiv_api import IncentivApi
+
+    results: Dict[str, Dict[str, Any]] = {}
+    async with HttpClient(s.api_base, user_agent="bench") as client:
+        results["http_client.get"] = await ameasure(lambda: client.get_json("/api/badge/check"), iterations)
+        results["http_client.get_x16"] = await ameasure(
+            lambda: client.get_json("/api/badge/check"), iterations, concurrency=16
+        )
+        results["http_client.post"] = await ameasure(
+            lambda: client.post_json("/api/user/login", {"address": RECIPIENT, "signature": "0x00"}), iterations
+        )
+    async with HttpClient(s.api_base, user_agent="bench", cache=ResponseCache()) as client:
+        results["http_client.get_cached"] = await ameasure(lambda: client.get_json("/api/badge/check"), iterations)
+
+    async with HttpClient(s.api_base, user_agent="bench") as client:
+        api = IncentivApi(s.api_base, client)
+
+        async def login() -> None:
+            await api.challenge(RECIPIENT)
+            await api.login(RECIPIENT, "0x00")
+
+        results["incentiv_api.login"] = await ameasure(login, iterations)
+        results["incentiv_api.user"] = await ameasure(api.user, iterations)
+        results["incentiv_api.swap_route"] = await ameasure(lambda: api.swap_route(TOKEN, RECIPIENT), iterations)
+        results["incentiv_api.xp_chart"] = await ameasure(api.xp_chart, iterations)
+    return results
+
+
+def bench_erc20(s: StandIns, iterations: int, tmp: Path) -> Dict[str, Dict[str, Any]]:
+    from incentiv_bot.client import make_web3
+    from incentiv_bot.contracts import ERC20Codec, ERC20Helper, TokenRegistry
+    from incentiv_bot.wallet import WalletManager
+
+    w3 = make_web3(s.rpc_url, CHAIN_ID)
+    helper = ERC20Helper(w3, TOKEN, registry=TokenRegistry(w3, chain_id=CHAIN_ID))
+    owners = ["0x" + (i + 1).to_bytes(20, "big").hex() for i in range(100)]
+    results = {
+        "erc20.balance_of": measure(lambda: helper.balance_of(RECIPIENT), iterations),
+        "erc20.balances_of_100": measure(lambda: helper.balances_of(owners), max(1, iterations // 10)),
+        "erc20.decimals": measure(helper.decimals, iterations),
+    }
+
+    accounts = tmp / "erc20_accounts.json"
+    accounts.write_text(json.dumps([{"private_key": _key(0)}]))
+    wallets = WalletManager(w3, str(accounts))
+    wallet = wallets.attach_first_wallet()
+    w3.eth.default_account = wallet.address
+    results["erc20.transfer"] = measure(lambda: helper.transfer(RECIPIENT, 10**15), iterations)
+
+    pipeline = wallets.pipeline(wallet)
+    batch = [{"to": TOKEN, "data": ERC20Codec.transfer(RECIPIENT, 10**15)}] * 10
+    result = measure(lambda: pipeline.submit_many(batch), max(1, iterations // 10))
+    # Per-transaction figures for the batch
+    result["throughput_per_s"] = round(result["throughput_per_s"] * len(batch), 1)
+    result["ops"] *= len(batch)
+    result["batch"] = len(batch)
+    results["erc20.pipeline_transfer_x10"] = result
+    return results
+
+
+def bench_wallets(s: StandIns, counts: List[int], repeats: int, tmp: Path) -> Dict[str, Dict[str, Any]]:
+    from web3 import Web3
+
+    from incentiv_bot.wallet import WalletManager
+
+    w3 = Web3(Web3.HTTPProvider(s.rpc_url))
+    results: Dict[str, Dict[str, Any]] = {}
+    for count in counts:
+        accounts = tmp / f"accounts_{count}.json"
+        accounts.write_text(json.dumps([{"private_key": _key(i)} for i in range(count)]))
+        cache = tmp / f"addresses_{count}.json"
+
+        def cold() -> None:
+            if cache.exists():
+                cache.unlink()
+            WalletManager(w3, str(accounts), str(cache))
+
+        results[f"wallet_manager.load_cold_{count}"] = measure(cold, repeats, warmup=0)
+        results[f"wallet_manager.load_cached_{count}"] = measure(
+            lambda: WalletManager(w3, str(accounts), str(cache)), repeats, warmup=1
+        )
+        manager = WalletManager(w3, str(accounts), str(cache))
+        start = time.perf_counter()
+        manager.derive_all()
+        results[f"wallet_manager.derive_all_{count}"] = summarize([time.perf_counter() - start], time.perf_counter() - start)
+    return results
+
+
+def bench_heads(blocks: int, block_time: float = 0.2) -> Dict[str, Dict[str, Any]]:
+    from incentiv_bot.client import make_web3, start_head_feed
+
+    # Latency is from the block's timestamp to delivery on the HeadBus
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, use_ws in (("ws", True), ("poll", False)):
+        with StandIns(block_time=block_time) as s:
+            w3 = make_web3(s.rpc_url, CHAIN_ID)
+            lags: List[float] = []
+
+            def record(head: Any) -> None:
+                lags.append(time.time() - (s.chain.started + (head.number - 100) * block_time))
+
+            start_requests = s.requests
+            start = time.perf_counter()
+            feed = start_head_feed(w3, s.ws_url if use_ws else None, poll_max_seconds=block_time)
+            feed.bus.subscribe(record)
+            while len(lags) < blocks:
+                time.sleep(block_time / 10)
+            feed.stop()
+            result = summarize(lags[:blocks], time.perf_counter() - start)
+            result["rpc_requests_per_head"] = round((s.requests - start_requests) / blocks, 2)
+            results[f"heads.{name}_delivery"] = result
+    return results
+
+
+def bench_pool(iterations: int, tmp: Path) -> Dict[str, Dict[str, Any]]:
+    from incentiv_bot.client import make_web3
+    from incentiv_bot.contracts import ERC20Codec
+    from incentiv_bot.wallet import WalletManager
+
+    # Two endpoints, one 10x slower. Raises if reads do not settle on the
+    # fast one, a stalled primary is not hedged, or a sender's sends and
+    # nonce lookups are split across endpoints.
+    results: Dict[str, Dict[str, Any]] = {}
+    with StandIns(latency_ms=20) as slow, StandIns(latency_ms=2) as fast:
+        w3 = make_web3([slow.rpc_url, fast.rpc_url], CHAIN_ID, hedge_percentile=0.9)
+        pool = w3.provider.pool
+        read = lambda: w3.eth.get_transaction_count(RECIPIENT)  # noqa: E731
+
+        before = fast.requests
+        results["rpc_pool.read"] = measure(read, iterations)
+        share = (fast.requests - before) / (iterations + 3)
+        results["rpc_pool.read"]["fast_share"] = round(share, 3)
+        if share < 0.9:
+            raise RuntimeError(f"rpc_pool: only {share:.0%} of reads went to the faster endpoint")
+
+        # Stall the fast endpoint; reads should come back at about the slow
+        # endpoint's latency, not the stall's
+        stall = 0.25
+        fast.latency = stall
+        before = slow.requests
+        result = measure(read, 10, warmup=0)
+        fast.latency = 0.002
+        result["hedged"] = slow.requests - before
+        results["rpc_pool.read_stalled_primary"] = result
+        if result["p99_ms"] >= stall * 1000 or not result["hedged"]:
+            raise RuntimeError(f"rpc_pool: stalled reads were not hedged (p99 {result['p99_ms']} ms)")
+
+        accounts = tmp / "pool_accounts.json"
+        accounts.write_text(json.dumps([{"private_key": _key(i)} for i in range(4)]))
+        wallets = WalletManager(w3, str(accounts))
+        batch = [{"to": TOKEN, "data": ERC20Codec.transfer(RECIPIENT, 10**15)}] * 5
+        samples = []
+        start = time.perf_counter()
+        for wallet in wallets.wallets:
+            t = time.perf_counter()
+            hashes = [h.to_0x_hex() for h in wallets.pipeline(wallet).submit_many(batch)]
+            samples.append(time.perf_counter() - t)
+            landed = {name for name, s in (("slow", slow), ("fast", fast)) for h in hashes if h in s.chain.receipts}
+            if len(landed) != 1:
+                raise RuntimeError(f"rpc_pool: sends from {wallet.address} landed on {sorted(landed)}")
+        result = summarize(samples, time.perf_counter() - start, ops=len(samples) * len(batch))
+        result["endpoints"] = [s["requests"] for s in pool.stats()]
+        results["rpc_pool.sticky_send_x5"] = result
+    return results
+
+
+def _meta(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "iterations": args.iterations,
+        "latency_ms": args.latency_ms,
+    }
+
+
+def _compare(results: Dict[str, Dict[str, Any]], baseline_path: str) -> None:
+    baseline = json.loads(Path(baseline_path).read_text()).get("results", {})
+    print(f"\nvs {baseline_path} (p50 and throughput ratios, >1 is better)")
+    for name, r in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        p50 = old["p50_ms"] / r["p50_ms"] if r["p50_ms"] else float("nan")
+        rate = r["throughput_per_s"] / old["throughput_per_s"] if old.get("throughput_per_s") else float("nan")
+        print(f"{name:40} p50 x{p50:5.2f}  throughput x{rate:5.2f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("--iterations", type=int, default=200, help="Ops per scenario")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial stand-in latency per request")
+    parser.add_argument("--wallets", default="10,100,1000", help="Wallet counts for WalletManager loading")
+    parser.add_argument("--load-repeats", type=int, default=3, help="Loads per wallet count")
+    parser.add_argument("--blocks", type=int, default=20, help="Heads to receive per new-head source")
+    parser.add_argument("--only", default=None, help="Run only scenarios whose name contains this")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Print ratios against an earlier --json file")
+    args = parser.parse_args()
+
+    groups = ("http_client", "incentiv_api", "erc20", "wallet_manager", "rpc_pool", "heads")
+    wanted = [g for g in groups if args.only is None or args.only in g or g in args.only]
+    results: Dict[str, Dict[str, Any]] = {}
+    with StandIns(latency_ms=args.latency_ms) as s, tempfile.TemporaryDirectory() as tmp:
+        if "http_client" in wanted or "incentiv_api" in wanted:
+            results.update(asyncio.run(bench_http(s, args.iterations)))
+        if "erc20" in wanted:
+            results.update(bench_erc20(s, args.iterations, Path(tmp)))
+        if "wallet_manager" in wanted:
+            counts = [int(c) for c in args.wallets.split(",") if c.strip()]
+            results.update(bench_wallets(s, counts, args.load_repeats, Path(tmp)))
+        if "rpc_pool" in wanted:
+            results.update(bench_pool(args.iterations, Path(tmp)))
+    if "heads" in wanted:
+        results.update(bench_heads(args.blocks))
+    if args.only:
+        results = {k: v for k, v in results.items() if args.only in k}
+
+    for name, r in results.items():
+        print(f"{name:40} {r['throughput_per_s']:>10,.1f}/s  p50 {r['p50_ms']:>9.3f} ms  p99 {r['p99_ms']:>9.3f} ms")
+    if args.json:
+        Path(args.json).write_text(json.dumps({"meta": _meta(args), "results": results}, indent=2))
+    if args.compare:
+        _compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
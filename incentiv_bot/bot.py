@@ -1,126 +1,439 @@
 #!/usr/bin/env python3
 import argparse
 import asyncio
+import os
+from itertools import permutations
 from pathlib import Path
-from typing import Optional
-
-from fake_useragent import UserAgent
-from eth_account.messages import encode_defunct
+from typing import TYPE_CHECKING, Optional
 
+from incentiv_bot import daemon
 from incentiv_bot.config import load_env
-from incentiv_bot.client import make_web3
-from incentiv_bot.wallet import WalletManager
-from incentiv_bot.http_client import HttpClient
-from incentiv_bot.incentiv_api import IncentivApi
-from incentiv_bot.captcha import solve_turnstile
+from incentiv_bot.tracing import TRACER
+
+# web3, eth_account, aiohttp and fake_useragent are imported inside the
+# commands that need them, so e.g. `api-badge` never loads web3 and
+# `--daemon` loads neither; see benchmarks/startup_budget.py
+if TYPE_CHECKING:
+    from incentiv_bot.wallet import WalletManager
 
 
 def resolve_proxy(cfg_proxy_file: Optional[str], cli_proxy: Optional[str]) -> Optional[str]:
     if cli_proxy:
         return cli_proxy
-    if cfg_proxy_file and Path(cfg_proxy_file).exists():
-        for line in Path(cfg_proxy_file).read_text().splitlines():
-            line = line.strip()
-            if not line or line.startswith("#"):
-                continue
-            return line if "://" in line else f"http://{line}"
+    with TRACER.span("resolve_proxy"):
+        if cfg_proxy_file and Path(cfg_proxy_file).exists():
+            for line in Path(cfg_proxy_file).read_text().splitlines():
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                return line if "://" in line else f"http://{line}"
     return None
 
 
-def choose_wallet_for_address(wallets: WalletManager, address: str):
-    address_lower = address.lower()
-    for w in wallets.iterate_wallets():
-        if w.address.lower() == address_lower:
-            return w
-    raise SystemExit(f"Address not found in accounts: {address}")
+def choose_wallet_for_address(wallets: "WalletManager", address: str):
+    wallet = wallets.get(address)
+    if wallet is None:
+        raise SystemExit(f"Address not found in accounts: {address}")
+    return wallet
+
+
+def run_balances(args, cfg) -> None:
+    from incentiv_bot.client import make_web3
+    from incentiv_bot.contracts import TokenRegistry, portfolio
+    from incentiv_bot.multicall import Multicall
+    from incentiv_bot.wallet import WalletManager
+
+    tokens = cfg.token_addresses()
+    if not tokens:
+        raise SystemExit("No token addresses configured (TCENT_ADDRESS, SMPL_ADDRESS, BULL_ADDRESS, FLIP_ADDRESS)")
+    with TRACER.span("make_web3"):
+        w3 = make_web3(
+            cfg.rpc_urls,
+            cfg.chain_id,
+            proxy_url=resolve_proxy(cfg.proxy_file, args.proxy),
+            max_batch_size=cfg.rpc_max_batch_size,
+            hedge_percentile=cfg.rpc_hedge_percentile,
+        )
+    wallets = WalletManager(w3, cfg.accounts_file, cfg.address_cache_file)
+    owners = [w.address for w in wallets.iterate_wallets()]
+    if not owners:
+        raise SystemExit("No wallets loaded")
+
+    registry = TokenRegistry(w3, cfg.token_cache_file, chain_id=cfg.chain_id).attach()
+    holdings = portfolio(w3, owners, tokens.values(), Multicall(w3, cfg.multicall_address), registry)
+    for symbol, token in tokens.items():
+        entry = holdings[token]
+        for owner in owners:
+            raw = entry.balances.get(owner)
+            if raw is None or entry.decimals is None:
+                print(f"{owner} {symbol}: error")
+            else:
+                print(f"{owner} {symbol}: {raw / 10 ** entry.decimals}")
 
 
-async def run_api_action(args) -> None:
-    cfg = load_env(args.env)
+def run_index(args, cfg) -> None:
+    from incentiv_bot.chain_cache import ChainStateCache
+    from incentiv_bot.client import make_web3, start_head_feed
+    from incentiv_bot.indexer import TransferIndexer
+    from incentiv_bot.wallet import WalletManager
 
+    tokens = cfg.token_addresses()
+    if not tokens:
+        raise SystemExit("No token addresses configured (TCENT_ADDRESS, SMPL_ADDRESS, BULL_ADDRESS, FLIP_ADDRESS)")
     proxy_url = resolve_proxy(cfg.proxy_file, args.proxy)
-
-    user_agent = cfg.user_agent or UserAgent().random
-    referer = cfg.site_url or "https://testnet.incentiv.io/login"
-    origin = referer.split("/login")[0] if "/login" in referer else referer
-
-    async with HttpClient(
-        base_url=cfg.api_base,
-        user_agent=user_agent,
-        proxy=proxy_url,
-        referer=referer,
-        origin=origin,
-    ) as http:
-        api = IncentivApi(cfg.api_base, http)
-
-        if args.command == "api-badge":
-            res = await api.badge_check()
-            print(res)
+    chain_cache = ChainStateCache()
+    with TRACER.span("make_web3"):
+        w3 = make_web3(
+            cfg.rpc_urls,
+            cfg.chain_id,
+            proxy_url=proxy_url,
+            max_batch_size=cfg.rpc_max_batch_size,
+            chain_cache=chain_cache,
+            hedge_percentile=cfg.rpc_hedge_percentile,
+        )
+    owners = [w.address for w in WalletManager(w3, cfg.accounts_file, cfg.address_cache_file).iterate_wallets()]
+    if not owners:
+        raise SystemExit("No wallets loaded")
+    with TransferIndexer(
+        cfg.index_db_file,
+        w3,
+        tokens.values(),
+        owners,
+        start_block=cfg.index_start_block,
+        reorg_depth=cfg.index_reorg_depth,
+    ) as indexer:
+        added = indexer.sync()
+        print(f"Indexed {added} new transfers up to block {indexer.checkpoint}")
+        if not args.follow:
             return
+        # Re-sync (and so refresh derived balances) once per new head
+        feed = start_head_feed(
+            w3, cfg.ws_rpc_url, chain_cache, proxy_url=proxy_url, poll_max_seconds=cfg.head_poll_max_seconds
+        )
+        try:
+            last = indexer.checkpoint
+            while True:
+                head = feed.bus.wait(after=last)
+                added = indexer.sync(to_block=head.number)
+                last = head.number
+                if added:
+                    print(f"Indexed {added} new transfers up to block {indexer.checkpoint}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            feed.stop()
+
+
+def run_history(args, cfg) -> None:
+    from incentiv_bot.indexer import TransferIndexer
+
+    # Answered from the local index only; run `index` first to refresh it
+    symbols = {address.lower(): symbol for symbol, address in cfg.token_addresses().items()}
+    token = cfg.token_addresses().get(args.token.upper(), args.token) if args.token else None
+    if not Path(cfg.index_db_file).exists():
+        raise SystemExit(f"No transfer index at {cfg.index_db_file}; run `bot.py index` first")
+    with TransferIndexer(cfg.index_db_file) as indexer:
+        for row in indexer.history(args.address, token=token, limit=args.limit):
+            counterparty = row["from"] if row["direction"] == "in" else row["to"]
+            symbol = symbols.get(row["token"], row["token"])
+            print(f"{row['block']} {row['direction']:3} {row['amount']} {symbol} {counterparty} {row['tx_hash']}")
+        for token_address, amount in indexer.balances(args.address).items():
+            print(f"balance {symbols.get(token_address, token_address)}: {amount}")
+
+
+def run_journal(args, cfg) -> None:
+    from incentiv_bot.journal import RunJournal
+
+    # Read-only summary; runs record their steps through RunJournal
+    if not Path(cfg.journal_file).exists():
+        raise SystemExit(f"No run journal at {cfg.journal_file}")
+    with RunJournal(cfg.journal_file, run=args.run) as journal:
+        counts = journal.counts()
+        print(f"run {args.run}: " + ", ".join(f"{n} {status}" for status, n in counts.items()))
+        if args.status:
+            for step in journal.steps(args.status):
+                detail = step.tx_hash or step.error or ""
+                print(f"{step.status:8} {step.key} {detail}".rstrip())
+
+
+class ApiSession:
+    # State an api-* command needs. The CLI builds one per invocation; `serve`
+    # keeps one alive so the HTTP pool, RPC connection and wallets stay warm.
+    def __init__(self, cfg, proxy_url: Optional[str]) -> None:
+        from incentiv_bot.http_cache import ResponseCache
+        from incentiv_bot.http_client import HttpClient
+        from incentiv_bot.incentiv_api import IncentivApi
+
+        self.cfg = cfg
+        self.proxy_url = proxy_url
+        if cfg.user_agent:
+            user_agent = cfg.user_agent
+        else:
+            from fake_useragent import UserAgent
+
+            user_agent = UserAgent().random
+        referer = cfg.site_url or "https://testnet.incentiv.io/login"
+        origin = referer.split("/login")[0] if "/login" in referer else referer
+        self.http = HttpClient(
+            base_url=cfg.api_base,
+            user_agent=user_agent,
+            proxy=proxy_url,
+            referer=referer,
+            origin=origin,
+            cache=ResponseCache(cfg.api_cache_file, max_entries=cfg.api_cache_size) if cfg.api_cache_size > 0 else None,
+        )
+        self.api = IncentivApi(cfg.api_base, self.http)
+        self._w3 = None
+        self._wallets: Optional["WalletManager"] = None
+        self._routes = None
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "ApiSession":
+        await self.http.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self._w3 is not None:
+            await self._w3.provider.disconnect()
+            self._w3 = None
+        await self.http.__aexit__(exc_type, exc, tb)
+
+    async def web3(self):
+        from incentiv_bot.client import make_async_web3
+
+        # RPC shares the API connection pool
+        async with self._lock:
+            if self._w3 is None:
+                with TRACER.span("make_web3"):
+                    self._w3 = await make_async_web3(
+                        self.cfg.rpc_urls,
+                        self.cfg.chain_id,
+                        proxy_url=self.proxy_url,
+                        connector=self.http.connector,
+                        max_batch_size=self.cfg.rpc_max_batch_size,
+                        hedge_percentile=self.cfg.rpc_hedge_percentile,
+                    )
+            return self._w3
+
+    async def wallets(self) -> "WalletManager":
+        from incentiv_bot.wallet import WalletManager
+
+        w3 = await self.web3()
+        async with self._lock:
+            if self._wallets is None:
+                # key derivation is CPU-bound, keep it off the loop
+                self._wallets = await asyncio.to_thread(
+                    WalletManager, w3, self.cfg.accounts_file, self.cfg.address_cache_file
+                )
+            return self._wallets
+
+    def routes(self):
+        from incentiv_bot.routes import RouteIndex
+
+        if self._routes is None:
+            self._routes = RouteIndex(
+                self.api,
+                self.cfg.token_addresses().values(),
+                ttl=self.cfg.route_ttl,
+                concurrency=self.cfg.route_prefetch_concurrency,
+            )
+        return self._routes
+
+    def token(self, symbol_or_address: str) -> str:
+        return self.cfg.token_addresses().get(symbol_or_address.upper(), symbol_or_address)
+
+
+async def run_api_action(args, session: ApiSession):
+    cfg = session.cfg
+    api = session.api
+
+    if args.command == "api-badge":
+        return await api.badge_check()
+
+    if args.command == "api-user":
+        return await api.user()
+
+    if args.command == "api-xp":
+        return await api.xp_chart()
+
+    if args.command == "api-swap-route":
+        return await session.routes().route(session.token(args.from_token), session.token(args.to_token))
+
+    if args.command == "api-swap-routes":
+        routes = session.routes()
+        await routes.prefetch()
+        symbols = {address.lower(): symbol for symbol, address in cfg.token_addresses().items()}
+        return {f"{symbols[a]}->{symbols[b]}": routes.get(a, b) for a, b in permutations(symbols, 2)}
+
+    if args.command == "api-challenge":
+        return await api.challenge(args.address)
+
+    if args.command == "api-login":
+        if not Path(cfg.accounts_file).exists():
+            raise SystemExit("accounts file not found")
+        # fetch challenge and load wallets concurrently
+        challenge, wallets = await asyncio.gather(
+            api.challenge(args.address), session.wallets(), return_exceptions=True
+        )
+        if isinstance(wallets, BaseException):
+            raise wallets
+        if isinstance(challenge, BaseException):
+            raise challenge
+        # extract message heuristically
+        message = None
+        if isinstance(challenge, dict):
+            message = challenge.get("message") or challenge.get("data", {}).get("message") or challenge.get("payload")
+        if not isinstance(message, str) or not message.strip():
+            raise SystemExit(f"Cannot extract challenge message from: {challenge}")
+
+        # sign with matching wallet
+        from eth_account.messages import encode_defunct
+
+        signer = choose_wallet_for_address(wallets, args.address)
+        with TRACER.span("sign_challenge"):
+            sig = signer.account.sign_message(encode_defunct(text=message)).signature.hex()
+        res = await api.login(args.address, sig)
+        # Routes were fetched under the previous identity
+        session.routes().invalidate()
+        return res
+
+    if args.command == "api-faucet":
+        captcha_field = args.captcha_field or cfg.captcha_field
+        if args.solve:
+            from incentiv_bot.captcha import solve_turnstile
+
+            if not cfg.captcha_api_key or not cfg.turnstile_sitekey or not cfg.site_url:
+                raise SystemExit("Missing CAPTCHA_API_KEY or TURNSTILE_SITEKEY or SITE_URL for solving")
+            token = await solve_turnstile(cfg.captcha_api_key, cfg.turnstile_sitekey, cfg.site_url, session.proxy_url)
+        else:
+            if not args.captcha_token:
+                raise SystemExit("Provide --captcha-token or use --solve to auto-solve")
+            token = args.captcha_token
+        return await api.faucet(captcha_field, token)
 
-        if args.command == "api-user":
-            res = await api.user()
-            print(res)
-            return
+    raise SystemExit("Unknown command")
 
-        if args.command == "api-xp":
-            res = await api.xp_chart()
-            print(res)
-            return
 
-        if args.command == "api-swap-route":
-            res = await api.swap_route(args.from_token, args.to_token)
-            print(res)
-            return
+async def run_api_command(args, cfg) -> None:
+    async with ApiSession(cfg, resolve_proxy(cfg.proxy_file, args.proxy)) as session:
+        print(await run_api_action(args, session))
+
+
+async def run_serve(args, cfg) -> None:
+    # Fail before paying for startup if another daemon has the socket
+    try:
+        daemon.claim(args.socket)
+    except daemon.DaemonError as exc:
+        raise SystemExit(str(exc))
+    async with ApiSession(cfg, resolve_proxy(cfg.proxy_file, args.proxy)) as session:
+        # Pay for the chain id check and wallet derivation up front, not on the first command
+        await session.web3()
+        if Path(cfg.accounts_file).exists():
+            await session.wallets()
+        # Fill the route index in the background; lookups that race it share its requests
+        prefetch = asyncio.create_task(session.routes().prefetch())
+        exporter = None
+        if cfg.metrics_listen:
+            from incentiv_bot.metrics import METRICS, serve_prometheus
+
+            exporter = await serve_prometheus(METRICS, cfg.metrics_listen)
+            print(f"Metrics on http://{cfg.metrics_listen}/metrics")
+
+        async def handle(request):
+            if not str(request.get("command", "")).startswith("api-"):
+                raise SystemExit(f"Daemon only serves api-* commands, got: {request.get('command')}")
+            return await run_api_action(argparse.Namespace(**request), session)
+
+        try:
+            await daemon.serve(args.socket, handle, on_ready=lambda: print(f"Listening on {args.socket}", flush=True))
+        except daemon.DaemonError as exc:
+            raise SystemExit(str(exc))
+        finally:
+            prefetch.cancel()
+            if exporter is not None:
+                await exporter.cleanup()
+
+
+def run_command(args, cfg) -> None:
+    if not args.command:
+        from incentiv_bot.client import make_web3
+        from incentiv_bot.wallet import WalletManager
 
-        if args.command == "api-challenge":
-            res = await api.challenge(args.address)
-            print(res)
-            return
+        # keep the original info action for quick check
+        with TRACER.span("make_web3"):
+            w3 = make_web3(
+                cfg.rpc_urls,
+                cfg.chain_id,
+                proxy_url=resolve_proxy(cfg.proxy_file, args.proxy),
+                max_batch_size=cfg.rpc_max_batch_size,
+                hedge_percentile=cfg.rpc_hedge_percentile,
+            )
+        wallets = WalletManager(w3, cfg.accounts_file, cfg.address_cache_file)
+        if wallets.wallets:
+            print(f"Chain ID: {w3.eth.chain_id}")
+            print(f"First wallet: {wallets.wallets[0].address}")
+        else:
+            print(f"Chain ID: {w3.eth.chain_id}")
+            print("No wallets loaded")
+        return
 
-        if args.command == "api-login":
-            # fetch challenge
-            challenge = await api.challenge(args.address)
-            # extract message heuristically
-            message = None
-            if isinstance(challenge, dict):
-                message = challenge.get("message") or challenge.get("data", {}).get("message") or challenge.get("payload")
-            if not isinstance(message, str) or not message.strip():
-                raise SystemExit(f"Cannot extract challenge message from: {challenge}")
-
-            # sign with matching wallet
-            if not Path(cfg.accounts_file).exists():
-                raise SystemExit("accounts file not found")
-            w3 = make_web3(cfg.rpc_url, cfg.chain_id, proxy_url)
-            wallets = WalletManager(w3, cfg.accounts_file)
-            signer = choose_wallet_for_address(wallets, args.address)
-            sig = signer.account.sign_message(encode_defunct(text=message)).signature.hex()
+    if args.command == "balances":
+        run_balances(args, cfg)
+        return
 
-            res = await api.login(args.address, sig)
-            print(res)
-            return
+    if args.command == "index":
+        run_index(args, cfg)
+        return
 
-        if args.command == "api-faucet":
-            captcha_field = args.captcha_field or cfg.captcha_field
-            if args.solve:
-                if not cfg.captcha_api_key or not cfg.turnstile_sitekey or not cfg.site_url:
-                    raise SystemExit("Missing CAPTCHA_API_KEY or TURNSTILE_SITEKEY or SITE_URL for solving")
-                token = await solve_turnstile(cfg.captcha_api_key, cfg.turnstile_sitekey, cfg.site_url, proxy_url)
-            else:
-                if not args.captcha_token:
-                    raise SystemExit("Provide --captcha-token or use --solve to auto-solve")
-                token = args.captcha_token
-            res = await api.faucet(captcha_field, token)
-            print(res)
-            return
+    if args.command == "history":
+        run_history(args, cfg)
+        return
+
+    if args.command == "journal":
+        run_journal(args, cfg)
+        return
+
+    if args.command == "serve":
+        asyncio.run(run_serve(args, cfg))
+        return
+
+    asyncio.run(run_api_command(args, cfg))
 
-    raise SystemExit("Unknown command")
+
+def dispatch(args) -> None:
+    if args.daemon:
+        if not args.command or not args.command.startswith("api-"):
+            raise SystemExit("--daemon only applies to api-* commands")
+        if args.env or args.proxy:
+            # The daemon answers with the config and proxy it was started with
+            raise SystemExit("--env and --proxy are set when starting `bot.py serve`, not per --daemon request")
+        try:
+            print(daemon.request(args.socket, vars(args)))
+        except daemon.DaemonError as exc:
+            raise SystemExit(str(exc))
+        return
+
+    from incentiv_bot.metrics import METRICS
+
+    with TRACER.span("load_env"):
+        cfg = load_env(args.env)
+    if cfg.metrics_file or (args.command == "serve" and cfg.metrics_listen):
+        METRICS.enable()
+    try:
+        run_command(args, cfg)
+    finally:
+        if cfg.metrics_file:
+            METRICS.dump(cfg.metrics_file)
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Incentiv EVM bot CLI")
     parser.add_argument("--env", default=None, help="Path to .env file")
     parser.add_argument("--proxy", default=None, help="HTTP/SOCKS proxy URL")
+    parser.add_argument("--daemon", action="store_true", help="Send the command to a running `serve` process")
+    parser.add_argument("--socket", default=os.getenv("BOT_SOCKET") or daemon.DEFAULT_SOCKET, help="Daemon Unix socket path")
+    parser.add_argument("--profile", default=None, metavar="TRACE_JSON", help="Write phase timings as a Chrome trace")
+    parser.add_argument("--cprofile", default=None, metavar="PROF", help="Also write a cProfile dump (pstats format)")
 
     sub = parser.add_subparsers(dest="command")
 
@@ -132,12 +445,28 @@ def main() -> None:
     p_swap.add_argument("--from-token", dest="from_token", required=True)
     p_swap.add_argument("--to-token", dest="to_token", required=True)
 
+    sub.add_parser("api-swap-routes")
+
     p_ch = sub.add_parser("api-challenge")
     p_ch.add_argument("--address", required=True)
 
     p_login = sub.add_parser("api-login")
     p_login.add_argument("--address", required=True)
 
+    sub.add_parser("balances")
+    p_index = sub.add_parser("index")
+    p_index.add_argument("--follow", action="store_true", help="Keep indexing as new blocks arrive")
+
+    p_history = sub.add_parser("history")
+    p_history.add_argument("--address", required=True)
+    p_history.add_argument("--token", default=None, help="Token symbol or address")
+    p_history.add_argument("--limit", type=int, default=50)
+
+    p_journal = sub.add_parser("journal")
+    p_journal.add_argument("--run", default="default", help="Run name")
+    p_journal.add_argument("--status", default=None, choices=("planned", "pending", "done", "failed"), help="List steps in this state")
+    sub.add_parser("serve")
+
     p_faucet = sub.add_parser("api-faucet")
     p_faucet.add_argument("--solve", action="store_true")
     p_faucet.add_argument("--captcha-token", dest="captcha_token", default=None)
@@ -145,20 +474,23 @@ def main() -> None:
 
     args = parser.parse_args()
 
-    if not args.command:
-        # keep the original info action for quick check
-        cfg = load_env(args.env)
-        w3 = make_web3(cfg.rpc_url, cfg.chain_id, resolve_proxy(cfg.proxy_file, args.proxy))
-        wallets = WalletManager(w3, cfg.accounts_file)
-        if wallets.wallets:
-            print(f"Chain ID: {w3.eth.chain_id}")
-            print(f"First wallet: {wallets.wallets[0].address}")
-        else:
-            print(f"Chain ID: {w3.eth.chain_id}")
-            print("No wallets loaded")
-        return
-
-    asyncio.run(run_api_action(args))
+    if args.profile:
+        TRACER.enable()
+    profiler = None
+    if args.cprofile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with TRACER.span(f"bot.py {args.command or 'info'}"):
+            dispatch(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        if args.profile:
+            TRACER.write(args.profile)
 
 
 if __name__ == "__main__":
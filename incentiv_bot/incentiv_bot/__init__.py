@@ -1,4 +1,79 @@
-from .config import load_env, BotConfig
-from .client import make_web3
-from .wallet import WalletManager
-from .contracts import ERC20Helper, ContractCaller
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# Public name -> submodule. Resolved on first attribute access so importing
+# the package (or any light submodule such as http_client) never loads web3.
+_EXPORTS = {
+    "load_env": "config",
+    "BotConfig": "config",
+    "ChainStateCache": "chain_cache",
+    "FeeOracle": "chain_cache",
+    "make_web3": "client",
+    "make_async_web3": "client",
+    "start_head_feed": "client",
+    "WalletManager": "wallet",
+    "AllowanceCache": "approvals",
+    "ApprovalPlanner": "approvals",
+    "AsyncContractCaller": "contracts",
+    "AsyncERC20Helper": "contracts",
+    "ContractCaller": "contracts",
+    "ERC20Codec": "contracts",
+    "ERC20Helper": "contracts",
+    "ERC20TxBuilder": "contracts",
+    "TokenPortfolio": "contracts",
+    "TokenRegistry": "contracts",
+    "portfolio": "contracts",
+    "GasEstimateCache": "gas",
+    "Head": "heads",
+    "HeadBus": "heads",
+    "HeadFeed": "heads",
+    "RunJournal": "journal",
+    "Preflight": "gas",
+    "AsyncMulticall": "multicall",
+    "Multicall": "multicall",
+    "NonceManager": "nonce",
+    "TransactionPipeline": "nonce",
+    "ReceiptTracker": "receipts",
+    "TransactionDropped": "receipts",
+    "TransactionReplaced": "receipts",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
+
+if TYPE_CHECKING:
+    from .config import load_env, BotConfig
+    from .chain_cache import ChainStateCache, FeeOracle
+    from .client import make_web3, make_async_web3, start_head_feed
+    from .wallet import WalletManager
+    from .approvals import AllowanceCache, ApprovalPlanner
+    from .contracts import (
+        AsyncContractCaller,
+        AsyncERC20Helper,
+        ContractCaller,
+        ERC20Codec,
+        ERC20Helper,
+        ERC20TxBuilder,
+        TokenPortfolio,
+        TokenRegistry,
+        portfolio,
+    )
+    from .gas import GasEstimateCache, Preflight
+    from .heads import Head, HeadBus, HeadFeed
+    from .journal import RunJournal
+    from .multicall import AsyncMulticall, Multicall
+    from .nonce import NonceManager, TransactionPipeline
+    from .receipts import ReceiptTracker, TransactionDropped, TransactionReplaced
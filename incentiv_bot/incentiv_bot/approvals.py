@@ -0,0 +1,246 @@
+from __future__ import annotations
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+
+from .contracts import UINT256_MAX, ERC20Codec
+from .multicall import Multicall, decode_uint
+
+if TYPE_CHECKING:
+    from .journal import RunJournal
+    from .receipts import ReceiptTracker
+
+# Allowances at or above this are treated as unlimited (OpenZeppelin and most
+# tokens do not decrement a max allowance on transferFrom)
+UNLIMITED_THRESHOLD = 2**255
+
+# (owner, token, spender), all lowercase
+Triple = Tuple[str, str, str]
+
+POLICIES = ("exact", "max")
+
+
+def _triple(owner: str, token: str, spender: str) -> Triple:
+    return owner.lower(), token.lower(), spender.lower()
+
+
+@dataclass
+class Approval:
+    owner: str
+    token: str
+    spender: str
+    amount: int
+    current: int
+
+
+class AllowanceCache:
+    # Known allowances. Everything is kept for the run; unlimited allowances
+    # are also written to cache_file (per chain id), since only our own
+    # approvals change them, so later runs need not read them again.
+    # Approvals sent but not yet mined are held apart as pending and never
+    # written out: a dropped or reverted approve must not outlive the run.
+    def __init__(self, cache_file: Optional[str] = None, chain_id: Optional[int] = None) -> None:
+        if cache_file and chain_id is None:
+            raise ValueError("AllowanceCache needs a chain_id to persist allowances")
+        self.cache_path = Path(cache_file) if cache_file else None
+        self.chain_id = chain_id
+        self._lock = threading.Lock()
+        self._values: Dict[Triple, int] = {}
+        self._pending: Dict[Triple, int] = {}
+        # Other chains' entries, kept so a save does not drop them
+        self._stored: Dict[str, List[str]] = {}
+        if self.cache_path is not None and self.cache_path.exists():
+            try:
+                data = json.loads(self.cache_path.read_text())
+                if isinstance(data, dict):
+                    self._stored = {str(k): list(v) for k, v in data.items() if isinstance(v, list)}
+                for key in self._stored.get(str(chain_id), []):
+                    owner, token, spender = key.split(":")
+                    self._values[(owner, token, spender)] = UINT256_MAX
+            except (OSError, ValueError):
+                self._values.clear()
+
+    def get(self, triple: Triple) -> Optional[int]:
+        with self._lock:
+            return self._values.get(triple)
+
+    def put(self, triple: Triple, amount: int) -> None:
+        with self._lock:
+            was_unlimited = self._values.get(triple, 0) >= UNLIMITED_THRESHOLD
+            self._values[triple] = amount
+            if was_unlimited != (amount >= UNLIMITED_THRESHOLD):
+                self._save()
+
+    def pending(self, triple: Triple) -> Optional[int]:
+        with self._lock:
+            return self._pending.get(triple)
+
+    def mark_pending(self, triple: Triple, amount: int) -> None:
+        with self._lock:
+            self._pending[triple] = amount
+
+    def confirm(self, triple: Triple, amount: int) -> None:
+        # The approve was mined: the allowance is now known (and persistable)
+        with self._lock:
+            self._pending.pop(triple, None)
+        self.put(triple, amount)
+
+    def reject(self, triple: Triple) -> None:
+        # The approve reverted or was dropped: forget it and read it again
+        with self._lock:
+            self._pending.pop(triple, None)
+            self._values.pop(triple, None)
+
+    def consume(self, triple: Triple, amount: int) -> None:
+        # A transferFrom by the spender lowers a limited allowance
+        with self._lock:
+            for values in (self._values, self._pending):
+                current = values.get(triple)
+                if current is not None and current < UNLIMITED_THRESHOLD:
+                    values[triple] = max(0, current - amount)
+
+    def invalidate(self, triple: Optional[Triple] = None) -> None:
+        with self._lock:
+            if triple is None:
+                self._values.clear()
+                self._pending.clear()
+            else:
+                self._values.pop(triple, None)
+                self._pending.pop(triple, None)
+            self._save()
+
+    def _save(self) -> None:
+        if self.cache_path is None:
+            return
+        self._stored[str(self.chain_id)] = sorted(":".join(t) for t, v in self._values.items() if v >= UNLIMITED_THRESHOLD)
+        tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        try:
+            if self.cache_path.parent != Path(""):
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(self._stored, indent=2, sort_keys=True))
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+
+class ApprovalPlanner:
+    # Turns "wallet W will spend N of token T through spender S" requirements
+    # into the approvals actually needed. Unknown allowances are read in one
+    # Multicall batch; with policy="max" the approval is for uint256 max, so
+    # the same triple never needs another approve. Given a tracker, an
+    # approve's allowance is recorded once its receipt shows it succeeded;
+    # until then it only counts as pending for this process.
+    def __init__(
+        self,
+        web3: Web3,
+        multicall: Optional[Multicall] = None,
+        policy: str = "exact",
+        cache: Optional[AllowanceCache] = None,
+        journal: Optional["RunJournal"] = None,
+        tracker: Optional["ReceiptTracker"] = None,
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown approval policy: {policy} (expected one of {', '.join(POLICIES)})")
+        self.web3 = web3
+        self.multicall = multicall or Multicall(web3)
+        self.policy = policy
+        self.cache = cache or AllowanceCache()
+        # The journal records each approve and, with a tracker, its outcome.
+        # It never skips one: an approval reaches execute() only when the
+        # allowance just read from the chain is short, and a repeated approve
+        # of the same amount is harmless.
+        self.journal = journal
+        self.tracker = tracker
+
+    def allowances(self, triples: Iterable[Tuple[str, str, str]], refresh: bool = False) -> Dict[Triple, Optional[int]]:
+        keys = list(OrderedDict.fromkeys(_triple(*t) for t in triples))
+        unknown = keys if refresh else [k for k in keys if self.cache.get(k) is None]
+        if unknown:
+            calls = [(Web3.to_checksum_address(token), ERC20Codec.allowance(owner, spender)) for owner, token, spender in unknown]
+            for key, result in zip(unknown, self.multicall.aggregate(calls)):
+                value = decode_uint(result)
+                if value is not None:
+                    self.cache.put(key, value)
+        return {k: self.cache.get(k) for k in keys}
+
+    def plan(self, requirements: Sequence[Tuple[str, str, str, int]]) -> List[Approval]:
+        # Several uses of one triple in a run need their sum approved
+        needed: Dict[Triple, int] = OrderedDict()
+        for owner, token, spender, amount in requirements:
+            key = _triple(owner, token, spender)
+            needed[key] = needed.get(key, 0) + int(amount)
+        current = self.allowances(needed.keys())
+        approvals = []
+        for key, amount in needed.items():
+            have = current.get(key)
+            # An unreadable allowance is treated as zero so the run can proceed
+            have = 0 if have is None else have
+            # An approve this process sent and has not seen fail yet
+            pending = self.cache.pending(key)
+            if have >= amount or (pending is not None and pending >= amount):
+                continue
+            owner, token, spender = key
+            approvals.append(
+                Approval(
+                    owner=Web3.to_checksum_address(owner),
+                    token=Web3.to_checksum_address(token),
+                    spender=Web3.to_checksum_address(spender),
+                    amount=UINT256_MAX if self.policy == "max" else amount,
+                    current=have,
+                )
+            )
+        return approvals
+
+    def execute(self, approvals: Sequence[Approval]) -> List[HexBytes]:
+        # Sent as eth_sendTransaction from the owner, so the wallet signing and
+        # local nonce middlewares sign and sequence them. Later transactions
+        # from the same owner are mined after it, so plan() counts it as soon
+        # as it is sent; the cache records it only once it is mined.
+        hashes = []
+        for approval in approvals:
+            key = "approve:" + ":".join((*_triple(approval.owner, approval.token, approval.spender), str(approval.amount)))
+            tx = {
+                "from": approval.owner,
+                "to": approval.token,
+                "data": ERC20Codec.approve(approval.spender, approval.amount),
+            }
+            tx_hash = self.web3.eth.send_transaction(tx)
+            if self.journal is not None:
+                self.journal.record(key, "pending", inputs=tx, tx_hash=tx_hash, durable=True)
+            triple = _triple(approval.owner, approval.token, approval.spender)
+            self.cache.mark_pending(triple, approval.amount)
+            if self.tracker is not None:
+                future = self.tracker.track(tx_hash, sender=approval.owner)
+                if self.journal is not None:
+                    self.journal.watch(key, future)
+                self._confirm(triple, approval.amount, future)
+            hashes.append(HexBytes(tx_hash))
+        return hashes
+
+    def _confirm(self, triple: Triple, amount: int, future: Future) -> None:
+        # A timeout leaves the approve pending: it may still be mined
+        def finished(f: Future) -> None:
+            exc = f.exception()
+            if isinstance(exc, TimeExhausted):
+                return
+            if exc is None and f.result().get("status") != 0:
+                self.cache.confirm(triple, amount)
+            else:
+                self.cache.reject(triple)
+
+        future.add_done_callback(finished)
+
+    def ensure(self, requirements: Sequence[Tuple[str, str, str, int]]) -> List[HexBytes]:
+        return self.execute(self.plan(requirements))
+
+    def spent(self, owner: str, token: str, spender: str, amount: int) -> None:
+        self.cache.consume(_triple(owner, token, spender), amount)
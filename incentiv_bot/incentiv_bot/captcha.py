@@ -4,6 +4,8 @@ import aiohttp
 import asyncio
 import time
 
+from .metrics import METRICS
+
 CREATE_URL = "https://api.2captcha.com/createTask"
 RESULT_URL = "https://api.2captcha.com/getTaskResult"
 
@@ -23,7 +25,7 @@ async def solve_turnstile(
         "websiteKey": sitekey,
     }
 
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(trace_configs=METRICS.trace_configs("captcha")) as session:
         async with session.post(CREATE_URL, json={"clientKey": api_key, "task": task}) as resp:
             data = await resp.json()
             task_id = data.get("taskId")
@@ -43,6 +45,7 @@ async def solve_turnstile(
                         raise RuntimeError(f"2captcha ready without token: {data}")
                     return token
                 if status == "processing":
+                    METRICS.retry("captcha", "/getTaskResult")
                     continue
                 raise RuntimeError(f"2captcha error: {data}")
         raise TimeoutError("2captcha turnstile solve timeout")
\ No newline at end of file
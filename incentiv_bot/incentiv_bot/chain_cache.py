@@ -0,0 +1,218 @@
+from __future__ import annotations
+import json
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple, Union
+
+from toolz import curry
+from web3 import AsyncWeb3, Web3
+from web3.middleware.base import Web3MiddlewareBuilder
+from web3.types import RPCEndpoint, RPCResponse
+
+# Never change for the life of a connection
+FOREVER_METHODS = frozenset({"eth_chainId", "net_version"})
+# Valid until the next block
+BLOCK_METHODS = frozenset(
+    {
+        "eth_blockNumber",
+        "eth_gasPrice",
+        "eth_maxPriorityFeePerGas",
+        "eth_feeHistory",
+        "eth_blobBaseFee",
+    }
+)
+FEE_FIELDS = ("gasPrice", "maxFeePerGas", "maxPriorityFeePerGas")
+
+
+def _block_number(response: RPCResponse, method: RPCEndpoint) -> Optional[int]:
+    result = response.get("result") if isinstance(response, dict) else None
+    if method == "eth_blockNumber" and isinstance(result, str):
+        return int(result, 16)
+    if method == "eth_getBlockByNumber" and isinstance(result, dict) and result.get("number"):
+        return int(result["number"], 16)
+    return None
+
+
+class ChainStateCache:
+    # Caches chain id forever and block-scoped reads (gas price, fee history,
+    # latest block, block number) until a newer head is seen or
+    # block_time_seconds passes, whichever is first.
+    def __init__(self, block_time_seconds: float = 1.0) -> None:
+        self.block_time_seconds = block_time_seconds
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._lock = threading.Lock()
+        self._forever: Dict[Tuple[str, str], RPCResponse] = {}
+        # key -> (response, stored_at)
+        self._block: Dict[Tuple[str, str], Tuple[RPCResponse, float]] = {}
+        self._head: Optional[int] = None
+
+    @staticmethod
+    def key(method: RPCEndpoint, params: Any) -> Optional[Tuple[str, str]]:
+        if method in FOREVER_METHODS or method in BLOCK_METHODS:
+            return method, json.dumps(params, sort_keys=True, default=str)
+        # The latest header carries baseFeePerGas; full-tx variants are too big to keep
+        if method == "eth_getBlockByNumber" and params and params[0] == "latest":
+            if len(params) < 2 or not params[1]:
+                return method, "latest"
+        return None
+
+    @property
+    def head(self) -> Optional[int]:
+        return self._head
+
+    def get(self, method: RPCEndpoint, key: Tuple[str, str]) -> Optional[RPCResponse]:
+        with self._lock:
+            if method in FOREVER_METHODS:
+                response = self._forever.get(key)
+            else:
+                entry = self._block.get(key)
+                response = None
+                if entry is not None and time.monotonic() - entry[1] <= self.block_time_seconds:
+                    response = entry[0]
+            if response is None:
+                self.misses[method] += 1
+            else:
+                self.hits[method] += 1
+            return response
+
+    def put(self, method: RPCEndpoint, key: Tuple[str, str], response: RPCResponse) -> None:
+        if not isinstance(response, dict) or "error" in response or response.get("result") is None:
+            return
+        number = _block_number(response, method)
+        with self._lock:
+            if number is not None:
+                self._observe_head(number)
+            if method in FOREVER_METHODS:
+                self._forever[key] = response
+            else:
+                self._block[key] = (response, time.monotonic())
+
+    def new_head(self, block_number: int) -> None:
+        # Entry point for push-based head notifications (heads.HeadBus). The
+        # pushed number also answers eth_blockNumber until it goes stale.
+        with self._lock:
+            if self._head is not None and block_number <= self._head:
+                return
+            self._observe_head(block_number)
+            response: RPCResponse = {"jsonrpc": "2.0", "id": 0, "result": hex(block_number)}
+            self._block[self.key(RPCEndpoint("eth_blockNumber"), [])] = (response, time.monotonic())
+
+    def _observe_head(self, block_number: int) -> None:
+        if self._head is None or block_number > self._head:
+            self._block.clear()
+            self._head = block_number
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {"hits": dict(self.hits), "misses": dict(self.misses)}
+
+
+class FeeOracle:
+    # EIP-1559 fees computed once per block and shared by every sender; falls
+    # back to legacy gasPrice on chains without baseFeePerGas.
+    def __init__(self, web3: Union[Web3, AsyncWeb3], base_fee_multiplier: int = 2) -> None:
+        self.web3 = web3
+        self.base_fee_multiplier = base_fee_multiplier
+        self._lock = threading.Lock()
+        self._cached: Optional[Tuple[int, Dict[str, int]]] = None
+
+    def _compute(self, block: Any, priority_fee: Optional[int], gas_price: Optional[int]) -> Dict[str, int]:
+        base_fee = block.get("baseFeePerGas")
+        if base_fee is None:
+            return {"gasPrice": int(gas_price or 0)}
+        tip = int(priority_fee or 0)
+        return {
+            "maxPriorityFeePerGas": tip,
+            "maxFeePerGas": int(base_fee) * self.base_fee_multiplier + tip,
+        }
+
+    def _lookup(self, block_number: int) -> Optional[Dict[str, int]]:
+        with self._lock:
+            if self._cached is not None and self._cached[0] == block_number:
+                return dict(self._cached[1])
+        return None
+
+    def _store(self, block_number: int, fees: Dict[str, int]) -> Dict[str, int]:
+        with self._lock:
+            self._cached = (block_number, fees)
+        return dict(fees)
+
+    def fees(self) -> Dict[str, int]:
+        block = self.web3.eth.get_block("latest")
+        fees = self._lookup(block["number"])
+        if fees is not None:
+            return fees
+        if block.get("baseFeePerGas") is None:
+            return self._store(block["number"], self._compute(block, None, self.web3.eth.gas_price))
+        return self._store(block["number"], self._compute(block, self.web3.eth.max_priority_fee, None))
+
+    async def async_fees(self) -> Dict[str, int]:
+        block = await self.web3.eth.get_block("latest")
+        fees = self._lookup(block["number"])
+        if fees is not None:
+            return fees
+        if block.get("baseFeePerGas") is None:
+            return self._store(block["number"], self._compute(block, None, await self.web3.eth.gas_price))
+        return self._store(block["number"], self._compute(block, await self.web3.eth.max_priority_fee, None))
+
+
+class ChainStateMiddlewareBuilder(Web3MiddlewareBuilder):
+    # Serves cacheable reads from a ChainStateCache and fills fee fields on
+    # eth_sendTransaction from a FeeOracle so signing never re-fetches them.
+    cache: ChainStateCache
+    oracle: Optional[FeeOracle] = None
+
+    @staticmethod
+    @curry
+    def build(
+        cache: ChainStateCache, w3: Union[Web3, AsyncWeb3], fill_fees: bool = True
+    ) -> "ChainStateMiddlewareBuilder":
+        middleware = ChainStateMiddlewareBuilder(w3)
+        middleware.cache = cache
+        middleware.oracle = FeeOracle(w3) if fill_fees else None
+        return middleware
+
+    def _needs_fees(self, method: RPCEndpoint, params: Any) -> bool:
+        return (
+            self.oracle is not None
+            and method == "eth_sendTransaction"
+            and bool(params)
+            and isinstance(params[0], dict)
+            and not any(f in params[0] for f in FEE_FIELDS)
+        )
+
+    def wrap_make_request(self, make_request):
+        def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            if self._needs_fees(method, params):
+                params = [{**params[0], **self.oracle.fees()}, *params[1:]]
+                return make_request(method, params)
+            key = self.cache.key(method, params)
+            if key is None:
+                return make_request(method, params)
+            cached = self.cache.get(method, key)
+            if cached is not None:
+                return cached
+            response = make_request(method, params)
+            self.cache.put(method, key, response)
+            return response
+
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            if self._needs_fees(method, params):
+                params = [{**params[0], **(await self.oracle.async_fees())}, *params[1:]]
+                return await make_request(method, params)
+            key = self.cache.key(method, params)
+            if key is None:
+                return await make_request(method, params)
+            cached = self.cache.get(method, key)
+            if cached is not None:
+                return cached
+            response = await make_request(method, params)
+            self.cache.put(method, key, response)
+            return response
+
+        return middleware
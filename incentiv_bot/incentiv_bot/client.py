@@ -1,25 +1,123 @@
-from typing import Optional
-from web3 import Web3
+from typing import List, Optional, Sequence, Union
+
+import aiohttp
+from web3 import AsyncWeb3, Web3
+
+from .chain_cache import ChainStateCache, ChainStateMiddlewareBuilder
+from .heads import HeadBus, HeadFeed
+from .providers import AsyncBatchingHTTPProvider, BatchingHTTPProvider
+from .rpc_pool import AsyncPooledHTTPProvider, EndpointPool, PooledHTTPProvider
+from .tracing import TRACER
 
 
 class ChainIdMismatch(RuntimeError):
     pass
 
 
+def _endpoints(rpc_url: Union[str, Sequence[str]]) -> List[str]:
+    urls = [rpc_url] if isinstance(rpc_url, str) else list(rpc_url)
+    if not urls:
+        raise ValueError("At least one RPC endpoint is required")
+    return urls
+
+
 def make_web3(
-    rpc_url: str,
+    rpc_url: Union[str, Sequence[str]],
     expected_chain_id: int,
     request_timeout_seconds: int = 30,
     proxy_url: Optional[str] = None,
+    max_batch_size: int = 100,
+    chain_cache: Optional[ChainStateCache] = None,
+    hedge_percentile: float = 0.0,
 ) -> Web3:
     request_kwargs = {"timeout": request_timeout_seconds}
     if proxy_url:
         request_kwargs["proxies"] = {"http": proxy_url, "https": proxy_url}
-    provider = Web3.HTTPProvider(rpc_url, request_kwargs=request_kwargs)
+    urls = _endpoints(rpc_url)
+    # Concurrent calls are coalesced into JSON-RPC batches; max_batch_size=1 disables it
+    if len(urls) == 1:
+        provider = BatchingHTTPProvider(urls[0], request_kwargs=request_kwargs, max_batch_size=max_batch_size)
+    else:
+        provider = PooledHTTPProvider(
+            urls,
+            pool=EndpointPool(urls, hedge_percentile=hedge_percentile),
+            request_kwargs=request_kwargs,
+            max_batch_size=max_batch_size,
+        )
     w3 = Web3(provider)
-    chain_id = w3.eth.chain_id
+    # Chain id, gas price, fee history and the latest header are then fetched at most once per block
+    w3.middleware_onion.add(ChainStateMiddlewareBuilder.build(chain_cache or ChainStateCache()), name="chain_state")
+    with TRACER.span("chain_id_check", endpoints=len(urls)):
+        chain_id = w3.eth.chain_id
     if chain_id != expected_chain_id:
         raise ChainIdMismatch(
             f"Unexpected chain id: got {chain_id}, expected {expected_chain_id}"
         )
     return w3
+
+
+async def make_async_web3(
+    rpc_url: Union[str, Sequence[str]],
+    expected_chain_id: int,
+    request_timeout_seconds: int = 30,
+    proxy_url: Optional[str] = None,
+    connector: Optional[aiohttp.BaseConnector] = None,
+    max_batch_size: int = 100,
+    chain_cache: Optional[ChainStateCache] = None,
+    hedge_percentile: float = 0.0,
+) -> AsyncWeb3:
+    request_kwargs = {"timeout": aiohttp.ClientTimeout(total=request_timeout_seconds)}
+    if proxy_url:
+        request_kwargs["proxy"] = proxy_url
+    urls = _endpoints(rpc_url)
+    if len(urls) == 1:
+        provider = AsyncBatchingHTTPProvider(urls[0], request_kwargs=request_kwargs, max_batch_size=max_batch_size)
+        http_providers = [provider]
+    else:
+        provider = AsyncPooledHTTPProvider(
+            urls,
+            pool=EndpointPool(urls, hedge_percentile=hedge_percentile),
+            request_kwargs=request_kwargs,
+            max_batch_size=max_batch_size,
+        )
+        http_providers = provider.providers
+    if connector is not None:
+        # Reuse the caller's connection pool (e.g. HttpClient.connector); the
+        # provider closes only its session on disconnect, never the connector.
+        for http_provider in http_providers:
+            await http_provider.cache_async_session(
+                aiohttp.ClientSession(connector=connector, connector_owner=False)
+            )
+    w3 = AsyncWeb3(provider)
+    w3.middleware_onion.add(ChainStateMiddlewareBuilder.build(chain_cache or ChainStateCache()), name="chain_state")
+    try:
+        with TRACER.span("chain_id_check", endpoints=len(urls)):
+            chain_id = await w3.eth.chain_id
+        if chain_id != expected_chain_id:
+            raise ChainIdMismatch(
+                f"Unexpected chain id: got {chain_id}, expected {expected_chain_id}"
+            )
+    except BaseException:
+        await provider.disconnect()
+        raise
+    return w3
+
+
+def start_head_feed(
+    web3: Optional[Web3],
+    ws_url: Optional[str] = None,
+    chain_cache: Optional[ChainStateCache] = None,
+    proxy_url: Optional[str] = None,
+    poll_max_seconds: float = 5.0,
+    bus: Optional[HeadBus] = None,
+) -> HeadFeed:
+    # One newHeads subscription (or adaptive eth_blockNumber polling without
+    # ws_url) for the whole process; block-driven components subscribe to
+    # feed.bus. Pass the chain_cache given to make_web3 so block-scoped reads
+    # are dropped as soon as a head arrives. Stop the feed when done.
+    bus = bus or HeadBus()
+    if chain_cache is not None:
+        bus.subscribe(lambda head: chain_cache.new_head(head.number))
+    feed = HeadFeed(bus, web3, ws_url=ws_url, proxy_url=proxy_url, poll_max_seconds=poll_max_seconds)
+    feed.start()
+    return feed
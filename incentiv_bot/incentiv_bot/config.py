@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 import os
 from dotenv import load_dotenv
 
@@ -9,13 +9,17 @@ from dotenv import load_dotenv
 class BotConfig:
     rpc_url: str
     chain_id: int
+    multicall_address: Optional[str]
     accounts_file: str
     proxy_file: Optional[str]
+    token_cache_file: Optional[str]
+    address_cache_file: Optional[str]
 
     # API and site
     api_base: str
     site_url: Optional[str]
     user_agent: Optional[str]
+    api_cache_file: Optional[str]
 
     # Captcha
     turnstile_sitekey: Optional[str]
@@ -33,6 +37,56 @@ class BotConfig:
     flip_swap: float
     bundle_amount: float
 
+    # Token contracts (optional, keyed by symbol)
+    tcent_address: Optional[str] = None
+    smpl_address: Optional[str] = None
+    bull_address: Optional[str] = None
+    flip_address: Optional[str] = None
+
+    # RPC tuning
+    rpc_max_batch_size: int = 100
+    # Every endpoint in RPC_URLS (rpc_url is the first); more than one enables the pool
+    rpc_urls: List[str] = field(default_factory=list)
+    # Hedge a slow read to a second endpoint after this latency percentile (0 disables)
+    rpc_hedge_percentile: float = 0.0
+
+    # API response cache (0 disables it)
+    api_cache_size: int = 256
+
+    # Transfer indexer
+    index_db_file: str = ".transfers.sqlite"
+    index_start_block: int = 0
+    index_reorg_depth: int = 12
+
+    # Swap-route index
+    route_ttl: float = 300.0
+    route_prefetch_concurrency: int = 8
+
+    # Request metrics: JSON dump at CLI exit, Prometheus endpoint for `serve`
+    metrics_file: Optional[str] = None
+    metrics_listen: Optional[str] = None
+
+    # New-head feed: WebSocket newHeads subscription, else adaptive HTTP polling
+    ws_rpc_url: Optional[str] = None
+    head_poll_max_seconds: float = 5.0
+
+    # Run journal (SQLite) of finished and in-flight steps, for resuming runs
+    journal_file: str = ".journal.sqlite"
+
+    def __post_init__(self) -> None:
+        # A config built without RPC_URLS still has its one endpoint to pool
+        if not self.rpc_urls:
+            self.rpc_urls = [self.rpc_url]
+
+    def token_addresses(self) -> Dict[str, str]:
+        tokens = {
+            "TCENT": self.tcent_address,
+            "SMPL": self.smpl_address,
+            "BULL": self.bull_address,
+            "FLIP": self.flip_address,
+        }
+        return {symbol: address for symbol, address in tokens.items() if address}
+
 
 def load_env(env_path: Optional[str] = None) -> BotConfig:
     load_dotenv(dotenv_path=env_path or ".env")
@@ -43,15 +97,23 @@ def load_env(env_path: Optional[str] = None) -> BotConfig:
             raise ValueError(f"Missing required env var: {name}")
         return value
 
-    rpc_url = must("RPC_URL")
+    # RPC_URLS (comma separated) takes precedence over RPC_URL
+    rpc_urls = [u.strip() for u in os.getenv("RPC_URLS", "").split(",") if u.strip()] or [must("RPC_URL")]
+    rpc_url = rpc_urls[0]
     chain_id = int(must("CHAIN_ID"))
+    # Empty MULTICALL_ADDRESS disables batching and forces plain per-call reads
+    multicall_address = os.getenv("MULTICALL_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11").strip() or None
     accounts_file = os.getenv("ACCOUNTS_FILE", "accounts.json").strip()
     proxy_file_raw = os.getenv("PROXY_FILE", "").strip()
     proxy_file = proxy_file_raw if proxy_file_raw else None
+    token_cache_file = os.getenv("TOKEN_CACHE_FILE", ".token_cache.json").strip() or None
+    address_cache_file = os.getenv("ADDRESS_CACHE_FILE", ".address_cache.json").strip() or None
 
     api_base = os.getenv("API_BASE", "https://api.testnet.incentiv.io").strip()
     site_url = os.getenv("SITE_URL", "https://testnet.incentiv.io/login").strip() or None
     user_agent = os.getenv("USER_AGENT", "").strip() or None
+    # Opt-in: only anonymous responses are ever written to it
+    api_cache_file = os.getenv("API_CACHE_FILE", "").strip() or None
 
     turnstile_sitekey = os.getenv("TURNSTILE_SITEKEY", "").strip() or None
     captcha_api_key = os.getenv("CAPTCHA_API_KEY", "").strip() or None
@@ -64,11 +126,15 @@ def load_env(env_path: Optional[str] = None) -> BotConfig:
     return BotConfig(
         rpc_url=rpc_url,
         chain_id=chain_id,
+        multicall_address=multicall_address,
         accounts_file=accounts_file,
         proxy_file=proxy_file,
+        token_cache_file=token_cache_file,
+        address_cache_file=address_cache_file,
         api_base=api_base,
         site_url=site_url,
         user_agent=user_agent,
+        api_cache_file=api_cache_file,
         turnstile_sitekey=turnstile_sitekey,
         captcha_api_key=captcha_api_key,
         captcha_field=captcha_field,
@@ -81,4 +147,22 @@ def load_env(env_path: Optional[str] = None) -> BotConfig:
         bull_swap=f("BULL_SWAP_AMOUNT", 0.1),
         flip_swap=f("FLIP_SWAP_AMOUNT", 0.1),
         bundle_amount=f("BUNDLE_ACTION_AMOUNT", 0.1),
+        tcent_address=os.getenv("TCENT_ADDRESS", "").strip() or None,
+        smpl_address=os.getenv("SMPL_ADDRESS", "").strip() or None,
+        bull_address=os.getenv("BULL_ADDRESS", "").strip() or None,
+        flip_address=os.getenv("FLIP_ADDRESS", "").strip() or None,
+        rpc_max_batch_size=int(os.getenv("RPC_MAX_BATCH_SIZE", "").strip() or 100),
+        rpc_urls=rpc_urls,
+        rpc_hedge_percentile=float(os.getenv("RPC_HEDGE_PERCENTILE", "").strip() or 0.0),
+        api_cache_size=int(os.getenv("API_CACHE_SIZE", "").strip() or 256),
+        index_db_file=os.getenv("INDEX_DB_FILE", "").strip() or ".transfers.sqlite",
+        index_start_block=int(os.getenv("INDEX_START_BLOCK", "").strip() or 0),
+        index_reorg_depth=int(os.getenv("INDEX_REORG_DEPTH", "").strip() or 12),
+        route_ttl=float(os.getenv("ROUTE_TTL", "").strip() or 300.0),
+        route_prefetch_concurrency=int(os.getenv("ROUTE_PREFETCH_CONCURRENCY", "").strip() or 8),
+        metrics_file=os.getenv("METRICS_FILE", "").strip() or None,
+        metrics_listen=os.getenv("METRICS_LISTEN", "").strip() or None,
+        ws_rpc_url=os.getenv("WS_RPC_URL", "").strip() or None,
+        head_poll_max_seconds=float(os.getenv("HEAD_POLL_MAX_SECONDS", "").strip() or 5.0),
+        journal_file=os.getenv("JOURNAL_FILE", "").strip() or ".journal.sqlite",
     )
\ No newline at end of file
@@ -1,7 +1,22 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Any, List
-from web3 import Web3
+import json
+import os
+import weakref
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from eth_account.signers.local import LocalAccount
+from hexbytes import HexBytes
+from web3 import AsyncWeb3, Web3
+from web3.exceptions import Web3RPCError
+from web3.types import TxParams
+
+from .multicall import AsyncMulticall, Multicall, decode_uint
+
+if TYPE_CHECKING:
+    from .gas import GasEstimateCache
+    from .receipts import ReceiptTracker
 
 ERC20_ABI: List[dict] = [
     {
@@ -18,6 +33,20 @@ ERC20_ABI: List[dict] = [
         "outputs": [{"name": "", "type": "uint8"}],
         "type": "function",
     },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "symbol",
+        "outputs": [{"name": "", "type": "string"}],
+        "type": "function",
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "name",
+        "outputs": [{"name": "", "type": "string"}],
+        "type": "function",
+    },
     {
         "constant": False,
         "inputs": [{"name": "to", "type": "address"}, {"name": "amount", "type": "uint256"}],
@@ -45,52 +74,451 @@ ERC20_ABI: List[dict] = [
 ]
 
 
+# 4-byte selectors of the hot ERC20 calls, packed by hand to skip web3's
+# per-call ABI lookup and argument normalization
+ERC20_SELECTORS: Dict[str, bytes] = {
+    "balanceOf": bytes.fromhex("70a08231"),
+    "allowance": bytes.fromhex("dd62ed3e"),
+    "transfer": bytes.fromhex("a9059cbb"),
+    "approve": bytes.fromhex("095ea7b3"),
+    "decimals": bytes.fromhex("313ce567"),
+}
+UINT256_MAX = 2**256 - 1
+
+
+@lru_cache(maxsize=4096)
+def _address_word(address: str) -> bytes:
+    # Checksum is validated once per distinct string, then the word is reused
+    raw = address[2:] if address[:2] in ("0x", "0X") else address
+    if len(raw) != 40:
+        raise ValueError(f"Invalid address: {address}")
+    if raw != raw.lower() and raw != raw.upper() and Web3.to_checksum_address(address)[2:] != raw:
+        raise ValueError(f"Address has an invalid EIP-55 checksum: {address}")
+    return bytes(12) + bytes.fromhex(raw)
+
+
+def _uint_word(value: int) -> bytes:
+    value = int(value)
+    if not 0 <= value <= UINT256_MAX:
+        raise ValueError(f"uint256 out of range: {value}")
+    return value.to_bytes(32, "big")
+
+
+class ERC20Codec:
+    @staticmethod
+    def balance_of(owner: str) -> bytes:
+        return ERC20_SELECTORS["balanceOf"] + _address_word(owner)
+
+    @staticmethod
+    def allowance(owner: str, spender: str) -> bytes:
+        return ERC20_SELECTORS["allowance"] + _address_word(owner) + _address_word(spender)
+
+    @staticmethod
+    def transfer(to: str, amount: int) -> bytes:
+        return ERC20_SELECTORS["transfer"] + _address_word(to) + _uint_word(amount)
+
+    @staticmethod
+    def approve(spender: str, amount: int) -> bytes:
+        return ERC20_SELECTORS["approve"] + _address_word(spender) + _uint_word(amount)
+
+    @staticmethod
+    def decimals() -> bytes:
+        return ERC20_SELECTORS["decimals"]
+
+    @staticmethod
+    def decode_uint256(data: bytes) -> int:
+        if len(data) < 32:
+            raise ValueError(f"Expected 32-byte uint256 return, got {len(data)} bytes")
+        return int.from_bytes(data[:32], "big")
+
+    @staticmethod
+    def decode_bool(data: bytes) -> bool:
+        # Non-standard tokens (e.g. USDT) return nothing from transfer/approve
+        if not data:
+            return True
+        return ERC20Codec.decode_uint256(data) != 0
+
+
+class ERC20TxBuilder:
+    # Keeps one template per token (to, value, chainId) so building a
+    # transfer/approve is a dict copy plus calldata packing
+    def __init__(self, chain_id: int) -> None:
+        self.chain_id = chain_id
+        self._templates: Dict[str, Dict[str, Any]] = {}
+
+    def _template(self, token: str) -> Dict[str, Any]:
+        template = self._templates.get(token)
+        if template is None:
+            template = {"to": Web3.to_checksum_address(token), "value": 0, "chainId": self.chain_id}
+            self._templates[token] = template
+        return template
+
+    def _build(self, token: str, data: bytes, nonce: int, gas: int, fees: Dict[str, int]) -> TxParams:
+        tx = dict(self._template(token))
+        tx["data"] = data
+        tx["nonce"] = nonce
+        tx["gas"] = gas
+        tx.update(fees)
+        return tx  # type: ignore[return-value]
+
+    def transfer(self, token: str, to: str, amount: int, nonce: int, gas: int, **fees: int) -> TxParams:
+        return self._build(token, ERC20Codec.transfer(to, amount), nonce, gas, fees)
+
+    def approve(self, token: str, spender: str, amount: int, nonce: int, gas: int, **fees: int) -> TxParams:
+        return self._build(token, ERC20Codec.approve(spender, amount), nonce, gas, fees)
+
+    @staticmethod
+    def sign(account: LocalAccount, tx: TxParams) -> HexBytes:
+        return HexBytes(account.sign_transaction(tx).raw_transaction)
+
+
+TOKEN_METADATA_FIELDS = ("decimals", "symbol", "name")
+
+
+class TokenRegistry:
+    # Builds each contract object once and memoizes immutable token metadata per chain id
+    _shared: "weakref.WeakKeyDictionary[Union[Web3, AsyncWeb3], TokenRegistry]" = weakref.WeakKeyDictionary()
+
+    def __init__(
+        self,
+        web3: Union[Web3, AsyncWeb3],
+        cache_file: Optional[str] = None,
+        chain_id: Optional[int] = None,
+    ) -> None:
+        self.web3 = web3
+        self.cache_path = Path(cache_file) if cache_file else None
+        self._chain_id = chain_id
+        self._contracts: Dict[Tuple[str, int], Any] = {}
+        self._checksums: Dict[str, str] = {}
+        # chain id -> checksum address -> {"decimals": .., "symbol": .., "name": ..}
+        self._metadata: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._load()
+
+    @classmethod
+    def for_web3(cls, web3: Union[Web3, AsyncWeb3]) -> "TokenRegistry":
+        registry = cls._shared.get(web3)
+        if registry is None:
+            registry = cls(web3)
+            cls._shared[web3] = registry
+        return registry
+
+    def attach(self) -> "TokenRegistry":
+        # Make this registry the one helpers fall back to for its web3 instance
+        type(self)._shared[self.web3] = self
+        return self
+
+    @property
+    def chain_id(self) -> int:
+        if self._chain_id is None:
+            self._chain_id = int(self.web3.eth.chain_id)
+        return self._chain_id
+
+    async def resolve_chain_id(self) -> int:
+        # AsyncWeb3 counterpart of chain_id; must run before cached()/remember() on async web3
+        if self._chain_id is None:
+            self._chain_id = int(await self.web3.eth.chain_id)
+        return self._chain_id
+
+    def checksum(self, address: str) -> str:
+        checksum = self._checksums.get(address)
+        if checksum is None:
+            checksum = Web3.to_checksum_address(address)
+            self._checksums[address] = checksum
+        return checksum
+
+    def contract(self, address: str, abi: List[dict] = ERC20_ABI):
+        checksum = self.checksum(address)
+        # The contract keeps a reference to its abi, so id(abi) stays unique while cached
+        key = (checksum, id(abi))
+        contract = self._contracts.get(key)
+        if contract is None:
+            contract = self.web3.eth.contract(address=checksum, abi=abi)
+            self._contracts[key] = contract
+        return contract
+
+    def cached(self, address: str, field_name: str) -> Any:
+        entry = self._metadata.get(str(self.chain_id), {}).get(self.checksum(address), {})
+        return entry.get(field_name)
+
+    def remember(self, address: str, **values: Any) -> None:
+        values = {k: v for k, v in values.items() if k in TOKEN_METADATA_FIELDS and v is not None}
+        if not values:
+            return
+        entry = self._metadata.setdefault(str(self.chain_id), {}).setdefault(self.checksum(address), {})
+        if all(entry.get(k) == v for k, v in values.items()):
+            return
+        entry.update(values)
+        self._save()
+
+    def _metadata_field(self, address: str, field_name: str) -> Any:
+        value = self.cached(address, field_name)
+        if value is None:
+            value = getattr(self.contract(address).functions, field_name)().call()
+            self.remember(address, **{field_name: value})
+        return value
+
+    def decimals(self, address: str) -> int:
+        return int(self._metadata_field(address, "decimals"))
+
+    def symbol(self, address: str) -> str:
+        return str(self._metadata_field(address, "symbol"))
+
+    def name(self, address: str) -> str:
+        return str(self._metadata_field(address, "name"))
+
+    def _load(self) -> None:
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            # A corrupt cache only costs a cold start
+            return
+        if isinstance(data, dict):
+            self._metadata = {str(k): v for k, v in data.items() if isinstance(v, dict)}
+
+    def _save(self) -> None:
+        if self.cache_path is None:
+            return
+        tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        try:
+            if self.cache_path.parent != Path(""):
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(self._metadata, indent=2, sort_keys=True))
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass
+
+
 @dataclass
 class ERC20Helper:
     web3: Web3
     address: str
+    multicall: Optional[Multicall] = field(default=None, repr=False)
+    registry: Optional[TokenRegistry] = field(default=None, repr=False)
+    # Set to skip eth_estimateGas for transfer/approve shapes seen before
+    gas_cache: Optional["GasEstimateCache"] = field(default=None, repr=False)
+    # With a gas_cache: receipts that show a cached limit ran out drop it
+    tracker: Optional["ReceiptTracker"] = field(default=None, repr=False)
+    _preflight: Any = field(default=None, init=False, repr=False)
 
-    def _contract(self):
-        return self.web3.eth.contract(
-            address=self.web3.to_checksum_address(self.address),
-            abi=ERC20_ABI,
-        )
+    def _registry(self) -> TokenRegistry:
+        if self.registry is None:
+            self.registry = TokenRegistry.for_web3(self.web3)
+        return self.registry
+
+    def _multicall(self) -> Multicall:
+        if self.multicall is None:
+            self.multicall = Multicall(self.web3)
+        return self.multicall
+
+    def _target(self) -> str:
+        return self._registry().checksum(self.address)
+
+    def _send(self, data: bytes, fresh: Optional[bool] = None):
+        tx: Dict[str, Any] = {"to": self._target(), "data": data}
+        if self.web3.eth.default_account:
+            tx["from"] = self.web3.eth.default_account
+        if self.gas_cache is not None:
+            if self._preflight is None:
+                from .gas import Preflight
+
+                self._preflight = Preflight(self.web3, self.gas_cache)
+            tx["gas"] = self._preflight.estimate(tx, fresh)
+        try:
+            tx_hash = self.web3.eth.send_transaction(tx)  # type: ignore[arg-type]
+        except Web3RPCError as exc:
+            from .gas import out_of_gas
+
+            if self.gas_cache is not None and out_of_gas(exc):
+                self.gas_cache.invalidate(self.address)
+            raise
+        if self.gas_cache is not None and self.tracker is not None:
+            cache = self.gas_cache
+
+            def mined(future) -> None:
+                if future.exception() is None:
+                    cache.check(tx, future.result())
+
+            self.tracker.track(tx_hash).add_done_callback(mined)
+        return tx_hash
 
     def decimals(self) -> int:
-        return int(self._contract().functions.decimals().call())
+        return self._registry().decimals(self.address)
+
+    def symbol(self) -> str:
+        return self._registry().symbol(self.address)
+
+    def name(self) -> str:
+        return self._registry().name(self.address)
 
     def balance_of(self, owner: str) -> int:
-        return int(
-            self._contract()
-            .functions.balanceOf(self.web3.to_checksum_address(owner))
-            .call()
-        )
+        data = self.web3.eth.call({"to": self._target(), "data": ERC20Codec.balance_of(owner)})
+        return ERC20Codec.decode_uint256(data)
+
+    def allowance(self, owner: str, spender: str) -> int:
+        data = self.web3.eth.call({"to": self._target(), "data": ERC20Codec.allowance(owner, spender)})
+        return ERC20Codec.decode_uint256(data)
+
+    def balances_of(self, owners: Sequence[str]) -> Dict[str, Optional[int]]:
+        target = self._target()
+        calls = [(target, ERC20Codec.balance_of(o)) for o in owners]
+        results = self._multicall().aggregate(calls)
+        # None marks a read that failed inside the batch
+        return {owner: decode_uint(r) for owner, r in zip(owners, results)}
+
+    def allowances_of(self, pairs: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[int]]:
+        target = self._target()
+        calls = [(target, ERC20Codec.allowance(owner, spender)) for owner, spender in pairs]
+        results = self._multicall().aggregate(calls)
+        return {pair: decode_uint(r) for pair, r in zip(pairs, results)}
+
+    def approve(self, spender: str, amount: int, fresh: Optional[bool] = None):
+        # fresh: whether the allowance is currently zero, if the caller knows
+        return self._send(ERC20Codec.approve(spender, amount), fresh)
+
+    def transfer(self, to: str, amount: int, fresh: Optional[bool] = None):
+        # fresh: whether `to` currently holds none of the token, if the caller knows
+        return self._send(ERC20Codec.transfer(to, amount), fresh)
 
-    def approve(self, spender: str, amount: int):
-        return (
-            self._contract()
-            .functions.approve(self.web3.to_checksum_address(spender), int(amount))
-            .transact()
-        )
 
-    def transfer(self, to: str, amount: int):
-        return (
-            self._contract()
-            .functions.transfer(self.web3.to_checksum_address(to), int(amount))
-            .transact()
+@dataclass
+class TokenPortfolio:
+    token: str
+    decimals: Optional[int]
+    balances: Dict[str, Optional[int]]
+
+
+def portfolio(
+    web3: Web3,
+    wallets: Sequence[str],
+    tokens: Iterable[str],
+    multicall: Optional[Multicall] = None,
+    registry: Optional[TokenRegistry] = None,
+) -> Dict[str, TokenPortfolio]:
+    multicall = multicall or Multicall(web3)
+    registry = registry or TokenRegistry.for_web3(web3)
+    owners = [web3.to_checksum_address(w) for w in wallets]
+    helpers = [ERC20Helper(web3, token, multicall=multicall, registry=registry) for token in tokens]
+
+    calls = []
+    # Decimals are only read for tokens the registry has not seen yet
+    known = [registry.cached(h.address, "decimals") for h in helpers]
+    for helper, decimals in zip(helpers, known):
+        target = helper._target()
+        if decimals is None:
+            calls.append((target, ERC20Codec.decimals()))
+        calls.extend((target, ERC20Codec.balance_of(owner)) for owner in owners)
+    results = iter(multicall.aggregate(calls))
+
+    out: Dict[str, TokenPortfolio] = {}
+    for helper, decimals in zip(helpers, known):
+        if decimals is None:
+            decimals = decode_uint(next(results))
+            registry.remember(helper.address, decimals=decimals)
+        out[helper.address] = TokenPortfolio(
+            token=helper.address,
+            decimals=decimals,
+            balances={owner: decode_uint(next(results)) for owner in wallets},
         )
+    return out
 
 
 class ContractCaller:
-    def __init__(self, web3: Web3, address: str, abi: List[dict]):
+    def __init__(self, web3: Web3, address: str, abi: List[dict], registry: Optional[TokenRegistry] = None):
         self.web3 = web3
-        self.contract = web3.eth.contract(
-            address=web3.to_checksum_address(address),
-            abi=abi,
-        )
+        self.registry = registry or TokenRegistry.for_web3(web3)
+        self.contract = self.registry.contract(address, abi)
 
     def call(self, fn_name: str, *args, **kwargs):
         return getattr(self.contract.functions, fn_name)(*args, **kwargs).call()
 
     def transact(self, fn_name: str, *args, **kwargs):
         return getattr(self.contract.functions, fn_name)(*args, **kwargs).transact()
+
+
+@dataclass
+class AsyncERC20Helper:
+    web3: AsyncWeb3
+    address: str
+    multicall: Optional[AsyncMulticall] = field(default=None, repr=False)
+    registry: Optional[TokenRegistry] = field(default=None, repr=False)
+
+    def _registry(self) -> TokenRegistry:
+        if self.registry is None:
+            self.registry = TokenRegistry.for_web3(self.web3)
+        return self.registry
+
+    def _contract(self):
+        return self._registry().contract(self.address, ERC20_ABI)
+
+    def _multicall(self) -> AsyncMulticall:
+        if self.multicall is None:
+            self.multicall = AsyncMulticall(self.web3)
+        return self.multicall
+
+    def _target(self) -> str:
+        return self._registry().checksum(self.address)
+
+    async def _send(self, data: bytes):
+        tx: Dict[str, Any] = {"to": self._target(), "data": data}
+        if self.web3.eth.default_account:
+            tx["from"] = self.web3.eth.default_account
+        return await self.web3.eth.send_transaction(tx)  # type: ignore[arg-type]
+
+    async def _metadata_field(self, field_name: str) -> Any:
+        registry = self._registry()
+        await registry.resolve_chain_id()
+        value = registry.cached(self.address, field_name)
+        if value is None:
+            value = await getattr(self._contract().functions, field_name)().call()
+            registry.remember(self.address, **{field_name: value})
+        return value
+
+    async def decimals(self) -> int:
+        return int(await self._metadata_field("decimals"))
+
+    async def symbol(self) -> str:
+        return str(await self._metadata_field("symbol"))
+
+    async def name(self) -> str:
+        return str(await self._metadata_field("name"))
+
+    async def balance_of(self, owner: str) -> int:
+        data = await self.web3.eth.call({"to": self._target(), "data": ERC20Codec.balance_of(owner)})
+        return ERC20Codec.decode_uint256(data)
+
+    async def allowance(self, owner: str, spender: str) -> int:
+        data = await self.web3.eth.call({"to": self._target(), "data": ERC20Codec.allowance(owner, spender)})
+        return ERC20Codec.decode_uint256(data)
+
+    async def balances_of(self, owners: Sequence[str]) -> Dict[str, Optional[int]]:
+        target = self._target()
+        calls = [(target, ERC20Codec.balance_of(o)) for o in owners]
+        results = await self._multicall().aggregate(calls)
+        return {owner: decode_uint(r) for owner, r in zip(owners, results)}
+
+    async def allowances_of(self, pairs: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[int]]:
+        target = self._target()
+        calls = [(target, ERC20Codec.allowance(owner, spender)) for owner, spender in pairs]
+        results = await self._multicall().aggregate(calls)
+        return {pair: decode_uint(r) for pair, r in zip(pairs, results)}
+
+    async def approve(self, spender: str, amount: int):
+        return await self._send(ERC20Codec.approve(spender, amount))
+
+    async def transfer(self, to: str, amount: int):
+        return await self._send(ERC20Codec.transfer(to, amount))
+
+
+class AsyncContractCaller:
+    def __init__(self, web3: AsyncWeb3, address: str, abi: List[dict], registry: Optional[TokenRegistry] = None):
+        self.web3 = web3
+        self.registry = registry or TokenRegistry.for_web3(web3)
+        self.contract = self.registry.contract(address, abi)
+
+    async def call(self, fn_name: str, *args, **kwargs):
+        return await getattr(self.contract.functions, fn_name)(*args, **kwargs).call()
+
+    async def transact(self, fn_name: str, *args, **kwargs):
+        return await getattr(self.contract.functions, fn_name)(*args, **kwargs).transact()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import signal
+import socket
+import tempfile
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"incentiv_bot-{os.getuid()}.sock")
+
+# One JSON request per connection: {"command": ..., <argparse fields>}.
+# Reply: {"ok": true, "output": str} or {"ok": false, "error": str}.
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+def _listening(path: str) -> bool:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+async def _reply(handler: Handler, request: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        result = await handler(request)
+    except SystemExit as exc:
+        # Handlers share the CLI's SystemExit("message") convention
+        return {"ok": False, "error": str(exc.code)}
+    except Exception as exc:
+        return {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+    return {"ok": True, "output": "" if result is None else str(result)}
+
+
+def claim(path: str) -> None:
+    # Raises if another daemon owns the socket; removes a stale socket file
+    if os.path.exists(path):
+        if _listening(path):
+            raise DaemonError(f"A daemon is already listening on {path}")
+        os.unlink(path)
+
+
+async def serve(path: str, handler: Handler, on_ready: Optional[Callable[[], None]] = None) -> None:
+    # Runs until SIGINT/SIGTERM; connections are handled concurrently.
+    # on_ready runs once the socket is bound.
+    claim(path)
+
+    async def on_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = json.loads(await reader.readline())
+            reply = await _reply(handler, request if isinstance(request, dict) else {})
+            writer.write(json.dumps(reply).encode() + b"\n")
+            await writer.drain()
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    # The socket carries the session's bearer token; keep it owner-only
+    umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(on_client, path)
+    finally:
+        os.umask(umask)
+    if on_ready is not None:
+        on_ready()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def request(path: str, payload: Dict[str, Any], timeout_seconds: Optional[float] = None) -> str:
+    # Plain blocking socket; the client needs no event loop
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout_seconds)
+    try:
+        try:
+            sock.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            raise DaemonError(f"No daemon listening on {path}; start one with `bot.py serve`") from None
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        sock.close()
+    try:
+        reply = json.loads(b"".join(chunks))
+    except ValueError:
+        raise DaemonError("Daemon closed the connection without a reply") from None
+    if not reply.get("ok"):
+        raise DaemonError(reply.get("error") or "Daemon command failed")
+    return reply.get("output", "")
@@ -0,0 +1,250 @@
+from __future__ import annotations
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from web3 import Web3
+from web3.exceptions import ContractLogicError, Web3RPCError
+from web3.types import TxParams
+
+from .contracts import ERC20_SELECTORS, ERC20Codec
+
+_TRANSFER = ERC20_SELECTORS["transfer"]
+_APPROVE = ERC20_SELECTORS["approve"]
+
+# (token, selector hex, fresh). "fresh" means the call writes a zero storage
+# slot (recipient balance or allowance going from 0), which costs ~15k more
+# gas; otherwise an ERC20 transfer/approve costs about the same every time.
+GasShape = Tuple[str, str, bool]
+
+
+# Node messages for a gas limit set too low, at broadcast or estimate time
+_OUT_OF_GAS = ("out of gas", "intrinsic gas too low", "gas required exceeds")
+
+
+def out_of_gas(error: BaseException) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in _OUT_OF_GAS)
+
+
+def _data(tx: TxParams) -> bytes:
+    data = tx.get("data") or tx.get("input") or b""
+    return Web3.to_bytes(hexstr=data) if isinstance(data, str) else bytes(data)
+
+
+def erc20_shape(tx: TxParams) -> Optional[Tuple[str, bytes]]:
+    # (token, selector) for ERC20 transfer/approve calldata, else None
+    data = _data(tx)
+    if len(data) != 68 or data[:4] not in (_TRANSFER, _APPROVE) or not tx.get("to"):
+        return None
+    return str(tx["to"]).lower(), data[:4]
+
+
+class GasEstimateCache:
+    # Largest estimate seen per shape, served with a safety margin. Entries
+    # older than ttl_seconds are ignored so the next lookup re-estimates.
+    def __init__(self, margin: float = 0.2, ttl_seconds: float = 600.0) -> None:
+        self.margin = margin
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[GasShape, Tuple[int, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def with_margin(self, gas: int) -> int:
+        return int(gas * (1 + self.margin))
+
+    def peek(self, shape: GasShape) -> bool:
+        # Whether a live entry exists; not counted as a hit or miss
+        with self._lock:
+            entry = self._entries.get(shape)
+            return entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds
+
+    def get(self, shape: GasShape) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(shape)
+            if entry is None or time.monotonic() - entry[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self.with_margin(entry[0])
+
+    def put(self, shape: GasShape, gas: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(shape)
+            if entry is not None and now - entry[1] <= self.ttl_seconds:
+                gas = max(gas, entry[0])
+            self._entries[shape] = (gas, now)
+
+    def check(self, tx: TxParams, receipt: Any) -> bool:
+        # Drops the token's entries when the mined tx failed having used all
+        # of its gas, i.e. the cached limit was too low. True if it did.
+        shape = erc20_shape(tx)
+        if shape is None or receipt.get("status") != 0 or "gas" not in tx:
+            return False
+        if int(receipt.get("gasUsed") or 0) < int(tx["gas"]):
+            return False
+        self.invalidate(shape[0])
+        return True
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        # Call after an out-of-gas failure (or a token upgrade)
+        with self._lock:
+            if token is None:
+                self._entries.clear()
+            else:
+                for shape in [s for s in self._entries if s[0] == token.lower()]:
+                    del self._entries[shape]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+@dataclass
+class Simulation:
+    tx: TxParams
+    ok: bool
+    gas: Optional[int] = None
+    error: Optional[str] = None
+
+
+class Preflight:
+    # Simulates planned transactions before any is signed: eth_call (reverts)
+    # and eth_estimateGas for every tx, plus a balanceOf/allowance read to
+    # classify ERC20 shapes, all issued together while a BatchingHTTPProvider
+    # is held open so they share one POST. Cached shapes skip the estimate.
+    def __init__(self, web3: Web3, cache: Optional[GasEstimateCache] = None, max_workers: int = 16) -> None:
+        self.web3 = web3
+        self.cache = cache
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _fresh_read(self, tx: TxParams, shape: Tuple[str, bytes]) -> Optional[TxParams]:
+        token, selector = shape
+        target = Web3.to_checksum_address("0x" + _data(tx)[16:36].hex())
+        if selector == _TRANSFER:
+            data = ERC20Codec.balance_of(target)
+        else:
+            owner = tx.get("from") or self.web3.eth.default_account
+            if not owner:
+                return None
+            data = ERC20Codec.allowance(Web3.to_checksum_address(owner), target)
+        return {"to": Web3.to_checksum_address(token), "data": data}
+
+    def _is_fresh(self, read: Any) -> bool:
+        # An unreadable slot counts as fresh, the expensive (safe) side
+        if read is None or isinstance(read, Exception):
+            return True
+        return ERC20Codec.decode_uint256(bytes(read)) == 0
+
+    def _cached(self, shape: Optional[Tuple[str, bytes]], fresh: Optional[bool]) -> Optional[int]:
+        if self.cache is None or shape is None:
+            return None
+        # Unknown freshness may only use the (larger) fresh-slot estimate
+        return self.cache.get((shape[0], shape[1].hex(), True if fresh is None else fresh))
+
+    def _classify(self, tx: TxParams, shape: Optional[Tuple[str, bytes]]) -> Optional[bool]:
+        # With only a warm-slot entry cached, one cheap read decides whether
+        # it applies; the estimate is skipped when it does
+        if self.cache is None or shape is None:
+            return None
+        token, selector = shape[0], shape[1].hex()
+        if self.cache.peek((token, selector, True)) or not self.cache.peek((token, selector, False)):
+            return None
+        read = self._fresh_read(tx, shape)
+        if read is None:
+            return None
+        return self._is_fresh(self._map([lambda: self.web3.eth.call(read)])[0])
+
+    def _map(self, jobs: List[Callable[[], Any]]) -> List[Any]:
+        # Each result is the value or the exception the job raised
+        def run(job: Callable[[], Any]) -> Any:
+            try:
+                return job()
+            except (ContractLogicError, Web3RPCError, ValueError) as exc:
+                return exc
+
+        if len(jobs) <= 1:
+            return [run(job) for job in jobs]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="preflight")
+        provider = self.web3.provider
+        hold = provider.batch() if hasattr(provider, "batch") else nullcontext()
+        with hold:
+            futures = [self._executor.submit(run, job) for job in jobs]
+        return [f.result() for f in futures]
+
+    def run(self, txs: Sequence[TxParams], fresh: Optional[Sequence[Optional[bool]]] = None) -> List[Simulation]:
+        hints = list(fresh) if fresh is not None else [None] * len(txs)
+        jobs: List[Callable[[], Any]] = []
+        slots: List[Dict[str, int]] = []
+        for tx, hint in zip(txs, hints):
+            shape = erc20_shape(tx)
+            slot: Dict[str, int] = {}
+            slot["call"] = len(jobs)
+            jobs.append(lambda tx=tx: self.web3.eth.call(tx))
+            cached = self._cached(shape, hint) if "gas" not in tx else None
+            if cached is not None:
+                slot["cached"] = cached
+            elif "gas" not in tx:
+                slot["estimate"] = len(jobs)
+                jobs.append(lambda tx=tx: self.web3.eth.estimate_gas(tx))
+                read = self._fresh_read(tx, shape) if shape is not None and hint is None else None
+                if read is not None:
+                    slot["fresh"] = len(jobs)
+                    jobs.append(lambda read=read: self.web3.eth.call(read))
+            slots.append(slot)
+        results = self._map(jobs)
+
+        simulations = []
+        for tx, hint, slot in zip(txs, hints, slots):
+            shape = erc20_shape(tx)
+            called = results[slot["call"]]
+            if isinstance(called, Exception):
+                simulations.append(Simulation(tx, ok=False, error=str(called)))
+                continue
+            if "gas" in tx:
+                simulations.append(Simulation(tx, ok=True, gas=int(tx["gas"])))
+                continue
+            if "cached" in slot:
+                simulations.append(Simulation(tx, ok=True, gas=slot["cached"]))
+                continue
+            estimate = results[slot["estimate"]]
+            if isinstance(estimate, Exception):
+                simulations.append(Simulation(tx, ok=False, error=str(estimate)))
+                continue
+            if shape is not None and self.cache is not None:
+                if hint is None:
+                    hint = self._is_fresh(results[slot["fresh"]] if "fresh" in slot else None)
+                self.cache.put((shape[0], shape[1].hex(), hint), int(estimate))
+            gas = self.cache.with_margin(int(estimate)) if self.cache is not None else int(estimate)
+            simulations.append(Simulation(tx, ok=True, gas=gas))
+        return simulations
+
+    def estimate(self, tx: TxParams, fresh: Optional[bool] = None) -> int:
+        # Gas for one tx: cached when possible, else one batched round trip.
+        # Raises like eth_estimateGas when the tx would revert.
+        shape = erc20_shape(tx)
+        if fresh is None:
+            fresh = self._classify(tx, shape)
+        cached = self._cached(shape, fresh)
+        if cached is not None:
+            return cached
+        if shape is None or self.cache is None:
+            gas = int(self.web3.eth.estimate_gas(tx))
+            return self.cache.with_margin(gas) if self.cache is not None else gas
+        jobs: List[Callable[[], Any]] = [lambda: self.web3.eth.estimate_gas(tx)]
+        read = self._fresh_read(tx, shape) if fresh is None else None
+        if read is not None:
+            jobs.append(lambda: self.web3.eth.call(read))
+        results = self._map(jobs)
+        if isinstance(results[0], Exception):
+            raise results[0]
+        if fresh is None:
+            fresh = self._is_fresh(results[1] if len(results) > 1 else None)
+        self.cache.put((shape[0], shape[1].hex(), fresh), int(results[0]))
+        return self.cache.with_margin(int(results[0]))
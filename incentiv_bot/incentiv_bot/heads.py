@@ -0,0 +1,239 @@
+from __future__ import annotations
+import asyncio
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+from web3 import Web3
+from web3.types import RPCEndpoint
+
+
+@dataclass(frozen=True)
+class Head:
+    number: int
+    hash: Optional[str] = None
+    timestamp: Optional[int] = None
+    # "ws" or "poll"
+    source: str = "poll"
+
+
+class HeadBus:
+    # In-process pub/sub for new blocks. Subscribers run on the publishing
+    # thread, so they should only record the head or wake their own worker.
+    # A head is published once: repeats and older numbers are dropped, except
+    # a same-height head with a new hash (a reorged tip).
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._subscribers: List[Callable[[Head], None]] = []
+        self._latest: Optional[Head] = None
+        self.published = 0
+
+    @property
+    def latest(self) -> Optional[Head]:
+        return self._latest
+
+    def subscribe(self, callback: Callable[[Head], None]) -> Callable[[], None]:
+        # Returns the matching unsubscribe function
+        with self._cond:
+            self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with self._cond:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def publish(self, head: Head) -> bool:
+        with self._cond:
+            latest = self._latest
+            if latest is not None and (
+                head.number < latest.number
+                or (head.number == latest.number and (head.hash is None or head.hash == latest.hash))
+            ):
+                return False
+            self._latest = head
+            self.published += 1
+            subscribers = list(self._subscribers)
+            self._cond.notify_all()
+        for callback in subscribers:
+            try:
+                callback(head)
+            except Exception:
+                # One broken subscriber must not starve the others
+                pass
+        return True
+
+    def wait(self, after: Optional[int] = None, timeout: Optional[float] = None) -> Optional[Head]:
+        # Blocks until a head newer than `after` is published; None on timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._latest is None or (after is not None and self._latest.number <= after):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._latest
+
+
+def _int(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+class HeadFeed:
+    # Publishes new heads to a HeadBus from one background thread. With a
+    # ws_url it holds a single eth_subscribe("newHeads") stream; when that
+    # cannot connect, errors, or goes quiet for stall_seconds, it polls
+    # eth_blockNumber over HTTP and retries the socket every
+    # ws_retry_seconds. Polling adapts to the chain: about twice per observed
+    # block time after a new block, backing off towards poll_max_seconds
+    # while the head stays put.
+    def __init__(
+        self,
+        bus: HeadBus,
+        web3: Optional[Web3] = None,
+        ws_url: Optional[str] = None,
+        proxy_url: Optional[str] = None,
+        poll_min_seconds: float = 0.25,
+        poll_max_seconds: float = 5.0,
+        ws_retry_seconds: float = 30.0,
+        stall_seconds: float = 60.0,
+    ) -> None:
+        if web3 is None and not ws_url:
+            raise ValueError("HeadFeed needs a web3 instance to poll or a ws_url to subscribe to")
+        self.bus = bus
+        self.web3 = web3
+        self.ws_url = ws_url
+        self.proxy_url = proxy_url
+        self.poll_min_seconds = poll_min_seconds
+        self.poll_max_seconds = max(poll_min_seconds, poll_max_seconds)
+        self.ws_retry_seconds = ws_retry_seconds
+        self.stall_seconds = stall_seconds
+        self.source: Optional[str] = None
+        self.interval = poll_min_seconds
+        self.polls = 0
+        self.ws_failures = 0
+        self.last_error: Optional[str] = None
+        self._block_time: Optional[float] = None
+        self._last_seen: Optional[tuple] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "HeadFeed":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="head-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        latest = self.bus.latest
+        return {
+            "source": self.source,
+            "head": latest.number if latest else None,
+            "published": self.bus.published,
+            "polls": self.polls,
+            "interval": round(self.interval, 3),
+            "block_time": round(self._block_time, 3) if self._block_time else None,
+            "ws_failures": self.ws_failures,
+            "last_error": self.last_error,
+        }
+
+    def _observe(self, head: Head) -> None:
+        # Block time estimate (EWMA over observed gaps) drives the poll interval
+        now = time.monotonic()
+        if self._last_seen is not None and head.number > self._last_seen[0]:
+            gap = (now - self._last_seen[1]) / (head.number - self._last_seen[0])
+            self._block_time = gap if self._block_time is None else 0.8 * self._block_time + 0.2 * gap
+        if self._last_seen is None or head.number > self._last_seen[0]:
+            self._last_seen = (head.number, now)
+        self.bus.publish(head)
+
+    def _run(self) -> None:
+        retry_at = 0.0
+        while not self._stop.is_set():
+            if self.ws_url and time.monotonic() >= retry_at:
+                try:
+                    asyncio.run(self._listen())
+                except Exception as exc:
+                    self.ws_failures += 1
+                    self.last_error = f"{type(exc).__name__}: {exc}"
+                retry_at = time.monotonic() + self.ws_retry_seconds
+                continue
+            if self.web3 is None:
+                self._stop.wait(max(0.0, retry_at - time.monotonic()))
+                continue
+            self.source = "poll"
+            self._poll_once()
+            wait = self.interval
+            if self.ws_url:
+                wait = min(wait, max(0.0, retry_at - time.monotonic()))
+            self._stop.wait(wait)
+
+    def _poll_once(self) -> None:
+        # Straight to the provider: the chain-state cache would answer
+        # eth_blockNumber from its own (possibly stale) copy
+        self.polls += 1
+        try:
+            response = self.web3.provider.make_request(RPCEndpoint("eth_blockNumber"), [])
+            number = _int(response.get("result")) if isinstance(response, dict) else None
+        except Exception as exc:
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            number = None
+        latest = self.bus.latest
+        if number is not None and (latest is None or number > latest.number):
+            self._observe(Head(number, source="poll"))
+            target = (self._block_time or self.interval) / 2
+            self.interval = min(self.poll_max_seconds, max(self.poll_min_seconds, target))
+        else:
+            self.interval = min(self.poll_max_seconds, self.interval * 1.5)
+
+    async def _listen(self) -> None:
+        # Returns when stopped; raises when the stream cannot be used
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(self.ws_url, proxy=self.proxy_url, heartbeat=30) as ws:
+                await ws.send_str(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]}))
+                reply = await ws.receive_json(timeout=10)
+                if "error" in reply or not reply.get("result"):
+                    raise RuntimeError(f"eth_subscribe rejected: {reply.get('error')}")
+                subscription = reply["result"]
+                self.source = "ws"
+                quiet_since = time.monotonic()
+                while not self._stop.is_set():
+                    try:
+                        msg = await ws.receive(timeout=0.5)
+                    except asyncio.TimeoutError:
+                        if time.monotonic() - quiet_since > self.stall_seconds:
+                            raise RuntimeError(f"no newHeads for {self.stall_seconds}s")
+                        continue
+                    if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        raise ConnectionError("websocket closed")
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        continue
+                    params = json.loads(msg.data).get("params") or {}
+                    header = params.get("result")
+                    if params.get("subscription") != subscription or not isinstance(header, dict):
+                        continue
+                    number = _int(header.get("number"))
+                    if number is None:
+                        continue
+                    quiet_since = time.monotonic()
+                    self._observe(Head(number, header.get("hash"), _int(header.get("timestamp")), source="ws"))
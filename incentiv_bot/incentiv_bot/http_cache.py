@@ -0,0 +1,171 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Seconds a response stays fresh; paths not listed here are never cached.
+# Swap routes are cached by routes.RouteIndex instead (ROUTE_TTL).
+DEFAULT_TTLS: Dict[str, float] = {
+    "/api/user": 30.0,
+    "/api/user/xp/chart": 60.0,
+    "/api/user/transaction-badge": 60.0,
+    "/api/badge/check": 60.0,
+}
+
+
+class CacheEntry:
+    __slots__ = ("value", "etag", "last_modified", "expires_at")
+
+    def __init__(self, value: Any, etag: Optional[str], last_modified: Optional[str], expires_at: float) -> None:
+        self.value = value
+        self.etag = etag
+        self.last_modified = last_modified
+        # Wall-clock so entries loaded from disk keep their meaning across runs
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "value": self.value,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "expires_at": self.expires_at,
+        }
+
+
+class ResponseCache:
+    # LRU of GET responses keyed by (auth identity, path, params). Stale entries
+    # are kept while they still carry a validator, so the next request can be
+    # answered by a 304 instead of a full body.
+    #
+    # With a cache_file, anonymous responses are also kept across runs;
+    # authenticated ones (user profile, XP, badges) never touch the disk. The
+    # file is rewritten at most every save_interval_seconds, and on flush().
+    def __init__(
+        self,
+        cache_file: Optional[str] = None,
+        max_entries: int = 256,
+        ttls: Optional[Dict[str, float]] = None,
+        save_interval_seconds: float = 5.0,
+    ) -> None:
+        self.cache_path = Path(cache_file) if cache_file else None
+        self.max_entries = max(1, max_entries)
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.save_interval_seconds = save_interval_seconds
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._load()
+
+    @staticmethod
+    def identity(authorization: Optional[str]) -> str:
+        # Only a digest of the bearer token is kept, never the token itself
+        if not authorization:
+            return "anonymous"
+        return hashlib.sha256(authorization.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def key(identity: str, path: str, params: Optional[Dict[str, Any]]) -> str:
+        return json.dumps([identity, path, params or {}], sort_keys=True, default=str)
+
+    @staticmethod
+    def persistable(key: str) -> bool:
+        return key.startswith('["anonymous",')
+
+    def ttl_for(self, path: str) -> Optional[float]:
+        return self.ttls.get(path.split("?", 1)[0].rstrip("/") or "/")
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._dirty = self._dirty or self.persistable(evicted)
+        self._changed(key)
+
+    def touch(self, key: str, ttl: float) -> None:
+        # A 304 renews the entry without a new body
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.expires_at = time.time() + ttl
+            self._changed(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._dirty = True
+        self.flush()
+
+    def _changed(self, key: str) -> None:
+        if self.cache_path is None or not self.persistable(key):
+            return
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= self.save_interval_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._dirty:
+            self._save()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> None:
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+        try:
+            raw = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return
+        if not isinstance(raw, dict):
+            return
+        now = time.time()
+        for key, item in list(raw.items())[-self.max_entries :]:
+            if not self.persistable(key):
+                continue
+            try:
+                entry = CacheEntry(item["value"], item.get("etag"), item.get("last_modified"), float(item["expires_at"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+            # Expired entries without a validator are useless
+            if entry.expires_at > now or entry.etag or entry.last_modified:
+                self._entries[key] = entry
+
+    def _save(self) -> None:
+        if self.cache_path is None:
+            return
+        tmp = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        try:
+            if self.cache_path.parent != Path(""):
+                self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            entries = {k: e.to_json() for k, e in self._entries.items() if self.persistable(k)}
+            tmp.write_text(json.dumps(entries))
+            os.replace(tmp, self.cache_path)
+        except (OSError, TypeError, ValueError):
+            pass
@@ -1,7 +1,13 @@
 from __future__ import annotations
+import asyncio
+import time
 from typing import Optional, Dict, Any
 import aiohttp
 
+from .http_cache import CacheEntry, ResponseCache
+from .metrics import METRICS
+from .tracing import TRACER
+
 
 class HttpClient:
     def __init__(
@@ -12,6 +18,7 @@ class HttpClient:
         referer: Optional[str] = None,
         origin: Optional[str] = None,
         timeout_seconds: int = 30,
+        cache: Optional[ResponseCache] = None,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.proxy = proxy
@@ -28,16 +35,36 @@ class HttpClient:
         if referer:
             headers["Referer"] = referer
         self._headers = headers
+        self._connector: Optional[aiohttp.TCPConnector] = None
         self._session: Optional[aiohttp.ClientSession] = None
+        self.cache = cache
+        # Cache key -> task of the request currently fetching it
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @property
+    def connector(self) -> aiohttp.TCPConnector:
+        # Shared connection pool; other aiohttp users (e.g. make_async_web3) can borrow it
+        assert self._connector is not None, "HttpClient must be used as an async context manager"
+        return self._connector
 
     async def __aenter__(self) -> "HttpClient":
-        self._session = aiohttp.ClientSession(headers=self._headers, timeout=self.timeout)
+        with TRACER.span("http.session"):
+            self._connector = aiohttp.TCPConnector()
+            self._session = aiohttp.ClientSession(
+                headers=self._headers,
+                timeout=self.timeout,
+                connector=self._connector,
+                trace_configs=METRICS.trace_configs("api"),
+            )
         return self
 
     async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self.cache is not None:
+            self.cache.flush()
         if self._session is not None:
             await self._session.close()
             self._session = None
+            self._connector = None
 
     def set_bearer_token(self, token: str) -> None:
         if self._session is not None:
@@ -45,20 +72,70 @@ class HttpClient:
         else:
             self._headers["Authorization"] = f"Bearer {token}"
 
+    def _url(self, path: str) -> str:
+        return path if path.startswith("http") else f"{self.base_url}{path if path.startswith('/') else '/' + path}"
+
+    @staticmethod
+    async def _body(resp: aiohttp.ClientResponse):
+        if "application/json" in resp.headers.get("Content-Type", ""):
+            return await resp.json()
+        return await resp.text()
+
     async def get_json(self, path: str, params: Optional[Dict[str, Any]] = None):
+        with TRACER.span(f"GET {path}", params=params):
+            return await self._get_json(path, params)
+
+    async def _get_json(self, path: str, params: Optional[Dict[str, Any]]):
         assert self._session is not None, "HttpClient must be used as an async context manager"
-        url = path if path.startswith("http") else f"{self.base_url}{path if path.startswith('/') else '/' + path}"
-        async with self._session.get(url, params=params, proxy=self.proxy) as resp:
+        ttl = self.cache.ttl_for(path) if self.cache is not None else None
+        if ttl is None:
+            async with self._session.get(self._url(path), params=params, proxy=self.proxy) as resp:
+                resp.raise_for_status()
+                return await self._body(resp)
+
+        key = self.cache.key(self.cache.identity(self._session.headers.get("Authorization")), path, params)
+        entry = self.cache.get(key)
+        if entry is not None and entry.fresh:
+            self.cache.hits += 1
+            return entry.value
+        # Concurrent identical GETs share one request; shield so a cancelled
+        # waiter does not cancel it for the others
+        task = self._inflight.get(key)
+        if task is None:
+            self.cache.misses += 1
+            task = asyncio.ensure_future(self._fetch_cached(key, path, params, entry, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.cache.hits += 1
+        return await asyncio.shield(task)
+
+    async def _fetch_cached(
+        self, key: str, path: str, params: Optional[Dict[str, Any]], entry: Optional[CacheEntry], ttl: float
+    ):
+        headers = entry.validators if entry is not None else {}
+        async with self._session.get(self._url(path), params=params, proxy=self.proxy, headers=headers) as resp:
+            if resp.status == 304 and entry is not None:
+                self.cache.revalidated += 1
+                self.cache.touch(key, ttl)
+                return entry.value
             resp.raise_for_status()
-            if "application/json" in resp.headers.get("Content-Type", ""):
-                return await resp.json()
-            return await resp.text()
+            value = await self._body(resp)
+            if "no-store" not in resp.headers.get("Cache-Control", ""):
+                self.cache.put(
+                    key,
+                    CacheEntry(
+                        value,
+                        resp.headers.get("ETag"),
+                        resp.headers.get("Last-Modified"),
+                        time.time() + ttl,
+                    ),
+                )
+            return value
 
     async def post_json(self, path: str, json_body: Optional[Dict[str, Any]] = None):
         assert self._session is not None, "HttpClient must be used as an async context manager"
-        url = path if path.startswith("http") else f"{self.base_url}{path if path.startswith('/') else '/' + path}"
-        async with self._session.post(url, json=json_body or {}, proxy=self.proxy) as resp:
-            resp.raise_for_status()
-            if "application/json" in resp.headers.get("Content-Type", ""):
-                return await resp.json()
-            return await resp.text()
\ No newline at end of file
+        with TRACER.span(f"POST {path}"):
+            async with self._session.post(self._url(path), json=json_body or {}, proxy=self.proxy) as resp:
+                resp.raise_for_status()
+                return await self._body(resp)
\ No newline at end of file
@@ -0,0 +1,364 @@
+from __future__ import annotations
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from web3 import Web3
+from web3.exceptions import Web3RPCError
+
+# keccak("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    token TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    PRIMARY KEY (block, log_index)
+);
+CREATE INDEX IF NOT EXISTS transfers_sender ON transfers (token, sender, block);
+CREATE INDEX IF NOT EXISTS transfers_recipient ON transfers (token, recipient, block);
+CREATE TABLE IF NOT EXISTS balances (
+    token TEXT NOT NULL,
+    address TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    PRIMARY KEY (token, address)
+);
+-- (token, address) pairs already indexed up to the checkpoint
+CREATE TABLE IF NOT EXISTS watched (
+    token TEXT NOT NULL,
+    address TEXT NOT NULL,
+    PRIMARY KEY (token, address)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Node messages for an eth_getLogs range (or result set) over its limit
+_RANGE_LIMITS = (
+    "too many results",
+    "block range",
+    "range too large",
+    "range is too large",
+    "query returned more than",
+    "limit exceeded",
+    "response size",
+)
+
+
+def _range_limited(exc: Exception) -> bool:
+    # Only these shrink the range; transport errors are not the range's fault
+    message = str(exc).lower()
+    return any(marker in message for marker in _RANGE_LIMITS)
+
+
+def _topic(address: str) -> str:
+    return "0x" + "0" * 24 + address.lower()[2:]
+
+
+def _hex(value: Any) -> str:
+    return value.to_0x_hex() if hasattr(value, "to_0x_hex") else str(value)
+
+
+class TransferIndexer:
+    # Mirrors ERC20 Transfer logs touching the watched wallets into SQLite.
+    # sync() walks forward from the checkpoint in eth_getLogs ranges that grow
+    # while responses stay small and halve when the node rejects one as too
+    # large (transport errors are raised as-is); each range is committed
+    # together with the checkpoint, so an interrupted sync resumes cleanly.
+    # The checkpoint block's hash is stored with it; if the chain no longer
+    # has that hash, the last reorg_depth blocks are dropped and re-read.
+    #
+    # Balances are the net of indexed transfers, so they equal on-chain
+    # balances when start_block is at or before each token's deployment.
+    def __init__(
+        self,
+        db_path: str,
+        web3: Optional[Web3] = None,
+        tokens: Iterable[str] = (),
+        addresses: Iterable[str] = (),
+        start_block: int = 0,
+        reorg_depth: int = 12,
+        initial_chunk: int = 2000,
+        max_chunk: int = 100_000,
+        target_logs: int = 2000,
+        address_chunk: int = 200,
+    ) -> None:
+        self.web3 = web3
+        self.tokens = sorted({t.lower() for t in tokens})
+        self.addresses = sorted({a.lower() for a in addresses})
+        self.start_block = start_block
+        self.reorg_depth = max(1, reorg_depth)
+        self.chunk = max(1, initial_chunk)
+        self.max_chunk = max(self.chunk, max_chunk)
+        self.target_logs = target_logs
+        self.address_chunk = max(1, address_chunk)
+        self.rpc_calls = 0
+        if Path(db_path).parent != Path(""):
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> "TransferIndexer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # -- checkpoint -------------------------------------------------------
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def checkpoint(self) -> Optional[int]:
+        value = self._meta("last_block")
+        return int(value) if value is not None else None
+
+    def _set_checkpoint(self, block: int, block_hash: Optional[str]) -> None:
+        self.db.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [("last_block", str(block)), ("last_hash", block_hash or "")],
+        )
+
+    # -- sync -------------------------------------------------------------
+
+    def sync(self, to_block: Optional[int] = None) -> int:
+        # Returns the number of new transfers stored
+        if self.web3 is None:
+            raise ValueError("TransferIndexer needs a web3 instance to sync")
+        if not self.tokens or not self.addresses:
+            return 0
+        head = self._rpc(lambda: self.web3.eth.block_number) if to_block is None else to_block
+        self._check_reorg()
+        last = self.checkpoint
+        added = 0
+        if last is not None:
+            added += self._backfill(last)
+        start = self.start_block if last is None else last + 1
+        if last is None:
+            self._mark_watched(self.tokens, self.addresses)
+        added += self._scan(self.tokens, self.addresses, start, head, advance=True)
+        return added
+
+    def _backfill(self, last: int) -> int:
+        # Wallets or tokens added since the last run need their history up to the checkpoint
+        watched = set(self.db.execute("SELECT token, address FROM watched").fetchall())
+        missing = [(t, a) for t in self.tokens for a in self.addresses if (t, a) not in watched]
+        if not missing:
+            return 0
+        tokens = sorted({t for t, _ in missing})
+        addresses = sorted({a for _, a in missing})
+        added = self._scan(tokens, addresses, self.start_block, last, advance=False)
+        # Transfers already stored for another wallet were skipped as
+        # duplicates, so their deltas never reached the new pairs: count once
+        with self.db:
+            self._refresh_balances(missing)
+        self._mark_watched(tokens, addresses)
+        return added
+
+    def _mark_watched(self, tokens: Sequence[str], addresses: Sequence[str]) -> None:
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO watched (token, address) VALUES (?, ?)",
+                [(t, a) for t in tokens for a in addresses],
+            )
+
+    def _scan(self, tokens: Sequence[str], addresses: Sequence[str], start: int, end: int, advance: bool) -> int:
+        added = 0
+        block = start
+        while block <= end:
+            to = min(end, block + self.chunk - 1)
+            try:
+                tip_hash = _hex(self._rpc(lambda: self.web3.eth.get_block(to)["hash"])) if advance else None
+                logs = self._get_logs(tokens, addresses, block, to)
+            except (Web3RPCError, ValueError) as exc:
+                if to == block or not _range_limited(exc):
+                    raise
+                self.chunk = max(1, (to - block + 1) // 2)
+                continue
+            if advance and any(log["blockNumber"] == to and _hex(log["blockHash"]) != tip_hash for log in logs):
+                # The tip was reorged between the two calls; read the range again
+                continue
+            added += self._store(logs, to if advance else None, tip_hash)
+            block = to + 1
+            if len(logs) < self.target_logs // 2:
+                self.chunk = min(self.max_chunk, self.chunk * 2)
+            elif len(logs) > self.target_logs:
+                self.chunk = max(1, self.chunk // 2)
+        return added
+
+    def _get_logs(self, tokens: Sequence[str], addresses: Sequence[str], start: int, end: int) -> List[Any]:
+        # Topics AND across positions, so "from us" and "to us" are two filters
+        logs: Dict[Tuple[int, int], Any] = {}
+        for i in range(0, len(addresses), self.address_chunk):
+            topics = [_topic(a) for a in addresses[i : i + self.address_chunk]]
+            for position in (1, 2):
+                filter_topics: List[Any] = [TRANSFER_TOPIC, None, None]
+                filter_topics[position] = topics
+                params = {
+                    "fromBlock": start,
+                    "toBlock": end,
+                    "address": [Web3.to_checksum_address(t) for t in tokens],
+                    "topics": filter_topics,
+                }
+                for log in self._rpc(lambda: self.web3.eth.get_logs(params)):
+                    logs[(log["blockNumber"], log["logIndex"])] = log
+        return [logs[k] for k in sorted(logs)]
+
+    def _rpc(self, fn):
+        self.rpc_calls += 1
+        return fn()
+
+    def _store(self, logs: Sequence[Any], checkpoint: Optional[int], tip_hash: Optional[str]) -> int:
+        rows = []
+        for log in logs:
+            # ERC721 shares the signature but indexes the token id (4 topics)
+            if len(log["topics"]) != 3 or log.get("removed"):
+                continue
+            token = log["address"].lower()
+            sender = "0x" + bytes(log["topics"][1])[-20:].hex()
+            recipient = "0x" + bytes(log["topics"][2])[-20:].hex()
+            amount = int.from_bytes(bytes(log["data"])[:32], "big") if log["data"] else 0
+            rows.append(
+                (token, log["blockNumber"], log["logIndex"], _hex(log["transactionHash"]), sender, recipient, str(amount))
+            )
+        watched = set(self.addresses)
+        deltas: Dict[Tuple[str, str], int] = {}
+        added = 0
+        with self.db:
+            for row in rows:
+                cursor = self.db.execute(
+                    "INSERT OR IGNORE INTO transfers (token, block, log_index, tx_hash, sender, recipient, amount)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    row,
+                )
+                if cursor.rowcount != 1:
+                    # Already stored (a re-read range): already in the balance
+                    continue
+                added += 1
+                token, sender, recipient, amount = row[0], row[4], row[5], int(row[6])
+                # A self-transfer nets to zero
+                if sender in watched:
+                    deltas[(token, sender)] = deltas.get((token, sender), 0) - amount
+                if recipient in watched:
+                    deltas[(token, recipient)] = deltas.get((token, recipient), 0) + amount
+            if checkpoint is not None:
+                self._set_checkpoint(checkpoint, tip_hash)
+            self._apply_deltas(deltas)
+        return added
+
+    def _apply_deltas(self, deltas: Dict[Tuple[str, str], int]) -> None:
+        # Amounts are uint256 text, so the sum is done here rather than in SQL
+        for (token, address), delta in deltas.items():
+            row = self.db.execute(
+                "SELECT amount FROM balances WHERE token = ? AND address = ?", (token, address)
+            ).fetchone()
+            amount = (int(row[0]) if row else 0) + delta
+            self.db.execute(
+                "INSERT OR REPLACE INTO balances (token, address, amount) VALUES (?, ?, ?)", (token, address, str(amount))
+            )
+
+    def _refresh_balances(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        # Full recount from the stored transfers, for rollback() and backfills
+        watched = set(self.addresses)
+        for token, address in pairs:
+            if address not in watched:
+                continue
+            total = 0
+            for sender, recipient, amount in self.db.execute(
+                "SELECT sender, recipient, amount FROM transfers WHERE token = ? AND sender = ?"
+                " UNION ALL SELECT sender, recipient, amount FROM transfers WHERE token = ? AND recipient = ?",
+                (token, address, token, address),
+            ):
+                # A self-transfer shows up in both halves and nets to zero
+                total += (int(amount) if recipient == address else 0) - (int(amount) if sender == address else 0)
+            self.db.execute(
+                "INSERT OR REPLACE INTO balances (token, address, amount) VALUES (?, ?, ?)", (token, address, str(total))
+            )
+
+    # -- reorgs -----------------------------------------------------------
+
+    def _check_reorg(self) -> None:
+        last = self.checkpoint
+        stored = self._meta("last_hash")
+        if last is None or not stored:
+            return
+        if _hex(self._rpc(lambda: self.web3.eth.get_block(last)["hash"])) != stored:
+            self.rollback(max(self.start_block - 1, last - self.reorg_depth))
+
+    def rollback(self, block: int) -> None:
+        # Forget everything after `block` and resume from there
+        with self.db:
+            touched = self.db.execute(
+                "SELECT token, sender FROM transfers WHERE block > ? UNION SELECT token, recipient FROM transfers WHERE block > ?",
+                (block, block),
+            ).fetchall()
+            self.db.execute("DELETE FROM transfers WHERE block > ?", (block,))
+            # The hash of the new checkpoint is unknown; the next range records one
+            self._set_checkpoint(block, None)
+            self._refresh_balances(touched)
+
+    # -- local queries (no RPC) --------------------------------------------
+
+    def history(self, address: str, token: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        address = address.lower()
+        tokens = [token.lower()] if token else self._tokens_for(address)
+        rows: List[Tuple] = []
+        for t in tokens:
+            rows.extend(
+                self.db.execute(
+                    "SELECT token, block, log_index, tx_hash, sender, recipient, amount FROM transfers"
+                    " WHERE token = ? AND sender = ? UNION"
+                    " SELECT token, block, log_index, tx_hash, sender, recipient, amount FROM transfers"
+                    " WHERE token = ? AND recipient = ? ORDER BY block DESC, log_index DESC LIMIT ?",
+                    (t, address, t, address, limit),
+                ).fetchall()
+            )
+        rows.sort(key=lambda r: (r[1], r[2]), reverse=True)
+        return [
+            {
+                "token": r[0],
+                "block": r[1],
+                "log_index": r[2],
+                "tx_hash": r[3],
+                "from": r[4],
+                "to": r[5],
+                "amount": int(r[6]),
+                "direction": "in" if r[5] == address else "out",
+            }
+            for r in rows[:limit]
+        ]
+
+    def balance(self, address: str, token: str) -> int:
+        row = self.db.execute(
+            "SELECT amount FROM balances WHERE token = ? AND address = ?", (token.lower(), address.lower())
+        ).fetchone()
+        return int(row[0]) if row else 0
+
+    def balances(self, address: str) -> Dict[str, int]:
+        return {
+            token: int(amount)
+            for token, amount in self.db.execute(
+                "SELECT token, amount FROM balances WHERE address = ?", (address.lower(),)
+            )
+        }
+
+    def _tokens_for(self, address: str) -> List[str]:
+        return [r[0] for r in self.db.execute("SELECT token FROM watched WHERE address = ?", (address,))]
+
+    def stats(self) -> Dict[str, Any]:
+        count = self.db.execute("SELECT COUNT(*) FROM transfers").fetchone()[0]
+        return {"checkpoint": self.checkpoint, "transfers": count, "chunk": self.chunk, "rpc_calls": self.rpc_calls}
@@ -0,0 +1,298 @@
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from web3.exceptions import TimeExhausted
+
+if TYPE_CHECKING:
+    from .receipts import ReceiptTracker
+
+# planned: registered, not started; pending: started (a send has its tx hash);
+# done / failed: finished. Everything but "done" is left to do.
+STATUSES = ("planned", "pending", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS steps (
+    run TEXT NOT NULL,
+    key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    inputs TEXT,
+    tx_hash TEXT,
+    result TEXT,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (run, key)
+);
+CREATE INDEX IF NOT EXISTS steps_status ON steps (run, status);
+-- Per-status totals kept by triggers, so "what's left" never scans steps
+CREATE TABLE IF NOT EXISTS counts (
+    run TEXT NOT NULL,
+    status TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (run, status)
+);
+CREATE TRIGGER IF NOT EXISTS steps_insert AFTER INSERT ON steps BEGIN
+    INSERT INTO counts (run, status, n) VALUES (NEW.run, NEW.status, 1)
+        ON CONFLICT (run, status) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS steps_update AFTER UPDATE OF status ON steps
+WHEN OLD.status != NEW.status BEGIN
+    UPDATE counts SET n = n - 1 WHERE run = OLD.run AND status = OLD.status;
+    INSERT INTO counts (run, status, n) VALUES (NEW.run, NEW.status, 1)
+        ON CONFLICT (run, status) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS steps_delete AFTER DELETE ON steps BEGIN
+    UPDATE counts SET n = n - 1 WHERE run = OLD.run AND status = OLD.status;
+END;
+"""
+
+_UPSERT = """
+INSERT INTO steps (run, key, status, inputs, tx_hash, result, error, updated)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (run, key) DO UPDATE SET
+    status = excluded.status,
+    inputs = COALESCE(excluded.inputs, steps.inputs),
+    tx_hash = COALESCE(excluded.tx_hash, steps.tx_hash),
+    result = excluded.result,
+    error = excluded.error,
+    updated = excluded.updated
+"""
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    if hasattr(value, "items"):
+        return dict(value)
+    return str(value)
+
+
+def _dump(value: Any) -> Optional[str]:
+    return None if value is None else json.dumps(value, default=_default, sort_keys=True)
+
+
+def _load(raw: Optional[str]) -> Any:
+    return None if raw is None else json.loads(raw)
+
+
+def _hex(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    return str(value)
+
+
+@dataclass
+class Step:
+    key: str
+    status: str
+    inputs: Any = None
+    tx_hash: Optional[str] = None
+    result: Any = None
+    error: Optional[str] = None
+
+
+class RunJournal:
+    # Durable record of a multi-step run (API calls, approvals, transfers) in
+    # SQLite, so a restarted run skips finished steps and reattaches to sent
+    # transactions instead of re-deriving state from the chain and API.
+    #
+    # Writes are buffered and committed together once batch_size records or
+    # flush_seconds have built up (and on flush()/close()). A pending send is
+    # the exception: record it with durable=True, or use the pipeline, which
+    # commits the tx hashes of a whole batch before broadcasting any of them.
+    # Lookups read an in-memory copy of the run, loaded on first use.
+    def __init__(self, db_path: str, run: str = "default", batch_size: int = 256, flush_seconds: float = 1.0) -> None:
+        self.run = run
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.commits = 0
+        if Path(db_path).parent != Path(""):
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # Receipt callbacks record from the tracker's thread
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._buffer: List[Tuple[Any, ...]] = []
+        self._last_flush = time.monotonic()
+        self._steps: Optional[Dict[str, Step]] = None
+        self._counts: Optional[Counter] = None
+
+    def close(self) -> None:
+        self.flush()
+        self.db.close()
+
+    def __enter__(self) -> "RunJournal":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # -- reads ------------------------------------------------------------
+
+    def _loaded(self) -> Dict[str, Step]:
+        with self._lock:
+            if self._steps is None:
+                rows = self.db.execute(
+                    "SELECT key, status, inputs, tx_hash, result, error FROM steps WHERE run = ?", (self.run,)
+                )
+                self._steps = {
+                    key: Step(key, status, _load(inputs), tx_hash, _load(result), error)
+                    for key, status, inputs, tx_hash, result, error in rows
+                }
+                self._counts = Counter(step.status for step in self._steps.values())
+            return self._steps
+
+    def get(self, key: str) -> Optional[Step]:
+        return self._loaded().get(key)
+
+    def done(self, key: str) -> bool:
+        step = self._loaded().get(key)
+        return step is not None and step.status == "done"
+
+    def counts(self) -> Dict[str, int]:
+        # Steps per status. Reads the trigger-kept totals when the run is not
+        # loaded, so a status check stays cheap however long the run is.
+        with self._lock:
+            if self._counts is not None:
+                return {s: self._counts.get(s, 0) for s in STATUSES}
+            self.flush()
+            stored = dict(self.db.execute("SELECT status, n FROM counts WHERE run = ?", (self.run,)).fetchall())
+        return {s: stored.get(s, 0) for s in STATUSES}
+
+    def left(self) -> int:
+        counts = self.counts()
+        return counts["planned"] + counts["pending"] + counts["failed"]
+
+    def steps(self, status: Optional[str] = None) -> List[Step]:
+        steps = self._loaded().values()
+        return [s for s in steps if status is None or s.status == status]
+
+    # -- writes -----------------------------------------------------------
+
+    def record(
+        self,
+        key: str,
+        status: str,
+        inputs: Any = None,
+        tx_hash: Any = None,
+        result: Any = None,
+        error: Optional[str] = None,
+        durable: bool = False,
+    ) -> Step:
+        # inputs and tx_hash are kept from earlier records when omitted
+        if status not in STATUSES:
+            raise ValueError(f"Unknown step status: {status} (expected one of {', '.join(STATUSES)})")
+        with self._lock:
+            steps = self._loaded()
+            previous = steps.get(key)
+            step = Step(
+                key,
+                status,
+                inputs if inputs is not None else (previous.inputs if previous else None),
+                _hex(tx_hash) or (previous.tx_hash if previous else None),
+                result,
+                error,
+            )
+            steps[key] = step
+            if previous is not None:
+                self._counts[previous.status] -= 1
+            self._counts[status] += 1
+            self._buffer.append(
+                (self.run, key, status, _dump(inputs), _hex(tx_hash), _dump(result), error, time.time())
+            )
+            if durable or len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_seconds:
+                self.flush()
+            return step
+
+    def flush(self) -> None:
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+            buffer, self._buffer = self._buffer, []
+            with self.db:
+                self.db.executemany(_UPSERT, buffer)
+            self.commits += 1
+
+    def plan(self, steps: Iterable[Tuple[str, Any]]) -> int:
+        # Registers (key, inputs) steps not seen before; returns how many
+        added = 0
+        for key, inputs in steps:
+            if self.get(key) is None:
+                self.record(key, "planned", inputs=inputs)
+                added += 1
+        self.flush()
+        return added
+
+    # -- running steps ----------------------------------------------------
+
+    def run_step(self, key: str, fn: Callable[[], Any], inputs: Any = None) -> Any:
+        # Runs fn once per run: a finished step returns its stored result.
+        # A step interrupted mid-call is run again (at-least-once).
+        step = self.get(key)
+        if step is not None and step.status == "done":
+            return step.result
+        self.record(key, "pending", inputs=inputs)
+        try:
+            result = fn()
+        except Exception as exc:
+            self.record(key, "failed", error=f"{type(exc).__name__}: {exc}")
+            raise
+        self.record(key, "done", result=result)
+        return result
+
+    async def arun_step(self, key: str, fn: Callable[[], Awaitable[Any]], inputs: Any = None) -> Any:
+        step = self.get(key)
+        if step is not None and step.status == "done":
+            return step.result
+        self.record(key, "pending", inputs=inputs)
+        try:
+            result = await fn()
+        except Exception as exc:
+            self.record(key, "failed", error=f"{type(exc).__name__}: {exc}")
+            raise
+        self.record(key, "done", result=result)
+        return result
+
+    def watch(self, key: str, future: Future) -> Future:
+        # Finishes a pending send's step when its ReceiptTracker future resolves.
+        # A timeout leaves it pending: the transaction may still be mined.
+        def finished(f: Future) -> None:
+            exc = f.exception()
+            if isinstance(exc, TimeExhausted):
+                return
+            if exc is not None:
+                self.record(key, "failed", error=f"{type(exc).__name__}: {exc}")
+                return
+            receipt = f.result()
+            result = {
+                "status": receipt.get("status"),
+                "block": receipt.get("blockNumber"),
+                "gas_used": receipt.get("gasUsed"),
+            }
+            if receipt.get("status") == 0:
+                self.record(key, "failed", result=result, error="reverted")
+            else:
+                self.record(key, "done", result=result)
+
+        future.add_done_callback(finished)
+        return future
+
+    def reattach(self, tracker: "ReceiptTracker") -> Dict[str, Future]:
+        # Tracks every pending step that has a tx hash (sent before a restart)
+        return {
+            step.key: self.watch(step.key, tracker.track(step.tx_hash))
+            for step in self.steps("pending")
+            if step.tx_hash
+        }
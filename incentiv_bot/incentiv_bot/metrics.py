@@ -0,0 +1,194 @@
+from __future__ import annotations
+import bisect
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# Latency histogram upper bounds in seconds (Prometheus "le" labels)
+BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (kind, name): kind is "api", "rpc" or "captcha"; name is the URL path or
+# JSON-RPC method
+SeriesKey = Tuple[str, str]
+
+
+class Series:
+    __slots__ = ("buckets", "sum", "count", "statuses", "bytes_sent", "bytes_received", "retries")
+
+    def __init__(self) -> None:
+        # One slot per bound plus +Inf; cumulated only on export
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.statuses: Dict[str, int] = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.sum, 6),
+            "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], self.buckets)),
+            "statuses": dict(self.statuses),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "retries": self.retries,
+        }
+
+
+class Metrics:
+    # Process-wide request metrics. Disabled by default: every recording
+    # method returns on its first line, and the aiohttp trace hooks and
+    # provider timing are only installed when `enabled` is set.
+    def __init__(self) -> None:
+        self.enabled = False
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._series: Dict[SeriesKey, Series] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def _get(self, kind: str, name: str) -> Series:
+        series = self._series.get((kind, name))
+        if series is None:
+            series = self._series[(kind, name)] = Series()
+        return series
+
+    def observe(self, kind: str, name: str, seconds: float, status: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._get(kind, name)
+            series.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            series.sum += seconds
+            series.count += 1
+            series.statuses[status] = series.statuses.get(status, 0) + 1
+
+    def add_bytes(self, kind: str, name: str, sent: int = 0, received: int = 0) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._get(kind, name)
+            series.bytes_sent += sent
+            series.bytes_received += received
+
+    def retry(self, kind: str, name: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._get(kind, name).retries += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            series = {f"{kind} {name}": s.to_dict() for (kind, name), s in sorted(self._series.items())}
+        return {"started_at": self.started_at, "dumped_at": time.time(), "buckets": list(BUCKETS), "series": series}
+
+    def dump(self, path: str) -> None:
+        # Atomic, like the other cache files
+        target = Path(path)
+        tmp = target.with_name(target.name + ".tmp")
+        tmp.write_text(json.dumps(self.snapshot(), indent=2))
+        os.replace(tmp, target)
+
+    def prometheus(self) -> str:
+        with self._lock:
+            items = sorted((key, s.to_dict()) for key, s in self._series.items())
+        lines: List[str] = [
+            "# HELP incentiv_request_duration_seconds Request latency",
+            "# TYPE incentiv_request_duration_seconds histogram",
+        ]
+        for (kind, name), s in items:
+            labels = f'kind="{kind}",name="{_escape(name)}"'
+            cumulative = 0
+            for le, count in s["buckets"].items():
+                cumulative += count
+                lines.append(f'incentiv_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"incentiv_request_duration_seconds_sum{{{labels}}} {s['sum_seconds']}")
+            lines.append(f"incentiv_request_duration_seconds_count{{{labels}}} {s['count']}")
+        lines += ["# HELP incentiv_requests_total Requests by outcome", "# TYPE incentiv_requests_total counter"]
+        for (kind, name), s in items:
+            for status, count in sorted(s["statuses"].items()):
+                lines.append(
+                    f'incentiv_requests_total{{kind="{kind}",name="{_escape(name)}",status="{_escape(status)}"}} {count}'
+                )
+        lines += ["# HELP incentiv_request_bytes_total Request and response body bytes", "# TYPE incentiv_request_bytes_total counter"]
+        for (kind, name), s in items:
+            for direction in ("sent", "received"):
+                lines.append(
+                    f'incentiv_request_bytes_total{{kind="{kind}",name="{_escape(name)}",direction="{direction}"}} {s["bytes_" + direction]}'
+                )
+        lines += ["# HELP incentiv_request_retries_total Retries, failovers, hedges and polls", "# TYPE incentiv_request_retries_total counter"]
+        for (kind, name), s in items:
+            lines.append(f'incentiv_request_retries_total{{kind="{kind}",name="{_escape(name)}"}} {s["retries"]}')
+        return "\n".join(lines) + "\n"
+
+    def trace_configs(self, kind: str) -> list:
+        # aiohttp ClientSession(trace_configs=...) hooks; empty when disabled
+        if not self.enabled:
+            return []
+        import aiohttp
+
+        async def on_start(session, ctx, params) -> None:
+            ctx.start = time.perf_counter()
+
+        async def on_end(session, ctx, params) -> None:
+            self.observe(kind, params.url.path, time.perf_counter() - ctx.start, str(params.response.status))
+
+        async def on_exception(session, ctx, params) -> None:
+            self.observe(kind, params.url.path, time.perf_counter() - ctx.start, type(params.exception).__name__)
+
+        async def on_sent(session, ctx, params) -> None:
+            self.add_bytes(kind, params.url.path, sent=len(params.chunk))
+
+        async def on_received(session, ctx, params) -> None:
+            self.add_bytes(kind, params.url.path, received=len(params.chunk))
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(on_start)
+        trace.on_request_end.append(on_end)
+        trace.on_request_exception.append(on_exception)
+        trace.on_request_chunk_sent.append(on_sent)
+        trace.on_response_chunk_received.append(on_received)
+        return [trace]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def rpc_status(response: Any) -> str:
+    # "ok", or the JSON-RPC error code
+    if isinstance(response, dict) and response.get("error"):
+        error = response["error"]
+        return str(error.get("code", "error")) if isinstance(error, dict) else "error"
+    return "ok"
+
+
+async def serve_prometheus(metrics: "Metrics", listen: str) -> Any:
+    # GET /metrics on host:port; returns the aiohttp runner so the caller can clean it up
+    from aiohttp import web
+
+    host, _, port = listen.rpartition(":")
+
+    async def handle(request: "web.Request") -> "web.Response":
+        return web.Response(text=metrics.prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host or "127.0.0.1", int(port)).start()
+    return runner
+
+
+METRICS = Metrics()
@@ -0,0 +1,143 @@
+from __future__ import annotations
+import asyncio
+from typing import List, Optional, Sequence, Tuple
+from web3 import AsyncWeb3, Web3
+from web3.exceptions import ContractLogicError, Web3RPCError
+
+# Canonical Multicall3 deployment (same address on nearly every EVM chain)
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+MULTICALL3_ABI: List[dict] = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"name": "target", "type": "address"},
+                    {"name": "allowFailure", "type": "bool"},
+                    {"name": "callData", "type": "bytes"},
+                ],
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"name": "success", "type": "bool"},
+                    {"name": "returnData", "type": "bytes"},
+                ],
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
+    },
+]
+
+# (target, calldata) -> (success, returndata)
+Call = Tuple[str, bytes]
+CallResult = Tuple[bool, bytes]
+
+
+class Multicall:
+    def __init__(
+        self,
+        web3: Web3,
+        address: Optional[str] = MULTICALL3_ADDRESS,
+        chunk_size: int = 200,
+    ) -> None:
+        self.web3 = web3
+        self.chunk_size = max(1, chunk_size)
+        self.address = web3.to_checksum_address(address) if address else None
+        self._deployed: Optional[bool] = None if self.address else False
+        self._contract = (
+            web3.eth.contract(address=self.address, abi=MULTICALL3_ABI) if self.address else None
+        )
+
+    @property
+    def available(self) -> bool:
+        # Checked once per instance; an empty code slot means no contract on this chain
+        if self._deployed is None:
+            self._deployed = len(self.web3.eth.get_code(self.address)) > 0
+        return self._deployed
+
+    def aggregate(self, calls: Sequence[Call]) -> List[CallResult]:
+        if not calls:
+            return []
+        if not self.available:
+            return [self._single(target, data) for target, data in calls]
+        results: List[CallResult] = []
+        for start in range(0, len(calls), self.chunk_size):
+            chunk = calls[start : start + self.chunk_size]
+            try:
+                out = self._contract.functions.aggregate3(
+                    [(target, True, data) for target, data in chunk]
+                ).call()
+            except (ContractLogicError, Web3RPCError):
+                # Whole chunk rejected (e.g. gas cap on eth_call); retry it call by call
+                results.extend(self._single(target, data) for target, data in chunk)
+                continue
+            results.extend((bool(ok), bytes(data)) for ok, data in out)
+        return results
+
+    def _single(self, target: str, data: bytes) -> CallResult:
+        try:
+            return True, bytes(self.web3.eth.call({"to": target, "data": data}))
+        except (ContractLogicError, Web3RPCError):
+            return False, b""
+
+
+class AsyncMulticall:
+    def __init__(
+        self,
+        web3: AsyncWeb3,
+        address: Optional[str] = MULTICALL3_ADDRESS,
+        chunk_size: int = 200,
+    ) -> None:
+        self.web3 = web3
+        self.chunk_size = max(1, chunk_size)
+        self.address = Web3.to_checksum_address(address) if address else None
+        self._deployed: Optional[bool] = None if self.address else False
+        self._contract = (
+            web3.eth.contract(address=self.address, abi=MULTICALL3_ABI) if self.address else None
+        )
+
+    async def available(self) -> bool:
+        if self._deployed is None:
+            self._deployed = len(await self.web3.eth.get_code(self.address)) > 0
+        return self._deployed
+
+    async def aggregate(self, calls: Sequence[Call]) -> List[CallResult]:
+        if not calls:
+            return []
+        if not await self.available():
+            return list(await asyncio.gather(*(self._single(t, d) for t, d in calls)))
+        chunks = [calls[i : i + self.chunk_size] for i in range(0, len(calls), self.chunk_size)]
+        results: List[CallResult] = []
+        for chunk_results in await asyncio.gather(*(self._chunk(c) for c in chunks)):
+            results.extend(chunk_results)
+        return results
+
+    async def _chunk(self, chunk: Sequence[Call]) -> List[CallResult]:
+        try:
+            out = await self._contract.functions.aggregate3(
+                [(target, True, data) for target, data in chunk]
+            ).call()
+        except (ContractLogicError, Web3RPCError):
+            return list(await asyncio.gather(*(self._single(t, d) for t, d in chunk)))
+        return [(bool(ok), bytes(data)) for ok, data in out]
+
+    async def _single(self, target: str, data: bytes) -> CallResult:
+        try:
+            return True, bytes(await self.web3.eth.call({"to": target, "data": data}))
+        except (ContractLogicError, Web3RPCError):
+            return False, b""
+
+
+def decode_uint(result: CallResult) -> Optional[int]:
+    ok, data = result
+    if not ok or len(data) < 32:
+        return None
+    return int.from_bytes(data[:32], "big")
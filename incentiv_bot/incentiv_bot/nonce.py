@@ -0,0 +1,340 @@
+from __future__ import annotations
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from eth_account.signers.local import LocalAccount
+from eth_utils import keccak, to_checksum_address
+from hexbytes import HexBytes
+from toolz import curry
+from web3 import AsyncWeb3, Web3
+from web3._utils.transactions import fill_transaction_defaults
+from web3.exceptions import Web3RPCError
+from web3.middleware.base import Web3MiddlewareBuilder
+from web3.types import RPCEndpoint, RPCResponse, TxParams
+
+from .rpc_pool import sending_as
+
+if TYPE_CHECKING:
+    from .journal import RunJournal
+    from .receipts import ReceiptTracker
+
+# Substrings geth/erigon/nethermind/besu use when a nonce is already taken
+NONCE_TOO_LOW = ("nonce too low", "nonce is too low", "oldnonce", "invalid nonce")
+NONCE_TAKEN = ("already known", "replacement transaction underpriced", "known transaction")
+
+
+def classify_nonce_error(message: str) -> Optional[str]:
+    message = message.lower()
+    if any(s in message for s in NONCE_TOO_LOW):
+        return "too_low"
+    if any(s in message for s in NONCE_TAKEN):
+        return "taken"
+    return None
+
+
+def _response_error(response: Any) -> Optional[str]:
+    if isinstance(response, dict) and response.get("error"):
+        error = response["error"]
+        return str(error.get("message", error)) if isinstance(error, dict) else str(error)
+    return None
+
+
+class NonceManager:
+    # Hands out nonces locally per sender. Each address is seeded once from
+    # eth_getTransactionCount(pending) and only re-read after a nonce error.
+    def __init__(self, web3: Union[Web3, AsyncWeb3]) -> None:
+        self.web3 = web3
+        self._lock = threading.Lock()
+        self._next: Dict[str, int] = {}
+
+    def _seed(self, address: str, chain_count: int) -> int:
+        # Never move backwards: the node may not have seen our latest sends yet
+        with self._lock:
+            nonce = max(chain_count, self._next.get(address, 0))
+            self._next[address] = nonce + 1
+            return nonce
+
+    def _take(self, address: str) -> Optional[int]:
+        with self._lock:
+            nonce = self._next.get(address)
+            if nonce is not None:
+                self._next[address] = nonce + 1
+            return nonce
+
+    def next_nonce(self, address: str) -> int:
+        address = to_checksum_address(address)
+        nonce = self._take(address)
+        if nonce is None:
+            nonce = self._seed(address, self.web3.eth.get_transaction_count(address, "pending"))
+        return nonce
+
+    async def async_next_nonce(self, address: str) -> int:
+        address = to_checksum_address(address)
+        nonce = self._take(address)
+        if nonce is None:
+            nonce = self._seed(address, await self.web3.eth.get_transaction_count(address, "pending"))
+        return nonce
+
+    def release(self, address: str, nonce: int) -> None:
+        # A nonce that was never broadcast can be reused only if it is the last
+        # one handed out; otherwise there is a gap and the sender must reseed.
+        address = to_checksum_address(address)
+        with self._lock:
+            if self._next.get(address) == nonce + 1:
+                self._next[address] = nonce
+            else:
+                self._next.pop(address, None)
+
+    def reset(self, address: str) -> None:
+        with self._lock:
+            self._next.pop(to_checksum_address(address), None)
+
+    def resync(self, address: str) -> int:
+        address = to_checksum_address(address)
+        count = self.web3.eth.get_transaction_count(address, "pending")
+        with self._lock:
+            self._next[address] = count
+        return count
+
+    async def async_resync(self, address: str) -> int:
+        address = to_checksum_address(address)
+        count = await self.web3.eth.get_transaction_count(address, "pending")
+        with self._lock:
+            self._next[address] = count
+        return count
+
+
+class LocalNonceMiddlewareBuilder(Web3MiddlewareBuilder):
+    # Fills `nonce` on eth_sendTransaction from a NonceManager before the signing
+    # middleware sees it (so it no longer asks the node), and retries with a
+    # fresh nonce when the node reports the nonce as used.
+    nonces: NonceManager
+    max_retries: int = 2
+
+    @staticmethod
+    @curry
+    def build(nonces: NonceManager, w3: Union[Web3, AsyncWeb3]) -> "LocalNonceMiddlewareBuilder":
+        middleware = LocalNonceMiddlewareBuilder(w3)
+        middleware.nonces = nonces
+        return middleware
+
+    @staticmethod
+    def _applies(method: RPCEndpoint, params: Any) -> bool:
+        return (
+            method == "eth_sendTransaction"
+            and bool(params)
+            and isinstance(params[0], dict)
+            and params[0].get("from") is not None
+            and "nonce" not in params[0]
+        )
+
+    def _should_retry(self, error: str, sender: str, nonce: int, attempt: int) -> bool:
+        if classify_nonce_error(error) is not None and attempt < self.max_retries:
+            return True
+        self.nonces.release(sender, nonce)
+        return False
+
+    def wrap_make_request(self, make_request):
+        def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            if not self._applies(method, params):
+                return make_request(method, params)
+            tx = dict(params[0])
+            sender = tx["from"]
+            for attempt in range(self.max_retries + 1):
+                tx["nonce"] = self.nonces.next_nonce(sender)
+                try:
+                    response = make_request(method, [tx])
+                except Web3RPCError as exc:
+                    # Filling gas/fees with a stale nonce can fail before the send itself
+                    if not self._should_retry(str(exc), sender, tx["nonce"], attempt):
+                        raise
+                    self.nonces.resync(sender)
+                    continue
+                except Exception:
+                    self.nonces.release(sender, tx["nonce"])
+                    raise
+                error = _response_error(response)
+                if error is None or not self._should_retry(error, sender, tx["nonce"], attempt):
+                    return response
+                self.nonces.resync(sender)
+            return response
+
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            if not self._applies(method, params):
+                return await make_request(method, params)
+            tx = dict(params[0])
+            sender = tx["from"]
+            for attempt in range(self.max_retries + 1):
+                tx["nonce"] = await self.nonces.async_next_nonce(sender)
+                try:
+                    response = await make_request(method, [tx])
+                except Web3RPCError as exc:
+                    # Filling gas/fees with a stale nonce can fail before the send itself
+                    if not self._should_retry(str(exc), sender, tx["nonce"], attempt):
+                        raise
+                    await self.nonces.async_resync(sender)
+                    continue
+                except Exception:
+                    self.nonces.release(sender, tx["nonce"])
+                    raise
+                error = _response_error(response)
+                if error is None or not self._should_retry(error, sender, tx["nonce"], attempt):
+                    return response
+                await self.nonces.async_resync(sender)
+            return response
+
+        return middleware
+
+
+class TransactionPipeline:
+    # Signs locally and broadcasts several transactions from one wallet back to
+    # back with consecutive nonces, without waiting for any receipt.
+    # With a RunJournal, keyed sends are journaled: a key already done or
+    # pending is not sent again, and the tx hashes of a batch are committed
+    # before the first broadcast so a crash mid-batch can be reattached.
+    def __init__(
+        self,
+        web3: Web3,
+        account: LocalAccount,
+        nonces: NonceManager,
+        max_retries: int = 2,
+        tracker: Optional["ReceiptTracker"] = None,
+        journal: Optional["RunJournal"] = None,
+    ) -> None:
+        self.web3 = web3
+        self.account = account
+        self.nonces = nonces
+        self.max_retries = max_retries
+        self.tracker = tracker
+        self.journal = journal
+        self.in_flight: List[HexBytes] = []
+        self.receipts: Dict[HexBytes, Future] = {}
+
+    def _prepare(self, tx: Any) -> TxParams:
+        if hasattr(tx, "build_transaction"):
+            # ContractFunction; build_transaction fills gas and fees
+            return tx.build_transaction({"from": self.account.address})
+        params = dict(tx)
+        params.setdefault("from", self.account.address)
+        return fill_transaction_defaults(self.web3, params)
+
+    def _sign(self, tx: TxParams, nonce: int) -> HexBytes:
+        signable = dict(tx)
+        signable["nonce"] = nonce
+        signable.pop("from", None)
+        return HexBytes(self.account.sign_transaction(signable).raw_transaction)
+
+    def _journal_sent(self, key: Optional[str], tx: TxParams, raw: HexBytes, durable: bool) -> None:
+        if self.journal is not None and key is not None:
+            inputs = {k: tx.get(k) for k in ("from", "to", "value", "data") if tx.get(k) is not None}
+            self.journal.record(key, "pending", inputs=inputs, tx_hash=keccak(raw), durable=durable)
+
+    def _broadcast(self, tx: TxParams, nonce: int, key: Optional[str] = None, raw: Optional[HexBytes] = None) -> HexBytes:
+        address = self.account.address
+        attempt = 0
+        while True:
+            if raw is None:
+                raw = self._sign(tx, nonce)
+                self._journal_sent(key, tx, raw, durable=True)
+            try:
+                with sending_as(address):
+                    tx_hash = HexBytes(self.web3.eth.send_raw_transaction(raw))
+                break
+            except Web3RPCError as exc:
+                message = str(exc)
+                if "already known" in message.lower():
+                    # The node already has exactly this signed transaction
+                    tx_hash = HexBytes(keccak(raw))
+                    break
+                if classify_nonce_error(message) is None or attempt >= self.max_retries:
+                    self.nonces.release(address, nonce)
+                    raise
+                attempt += 1
+                self.nonces.resync(address)
+                nonce = self.nonces.next_nonce(address)
+                raw = None
+            except Exception:
+                # A transport error may or may not have delivered the send, so
+                # neither keep the nonce nor hand it out again: ask the node
+                try:
+                    self.nonces.resync(address)
+                except Exception:
+                    self.nonces.reset(address)
+                raise
+        self.in_flight.append(tx_hash)
+        if self.tracker is not None:
+            self.receipts[tx_hash] = self._track(key, tx_hash, nonce)
+        return tx_hash
+
+    def _track(self, key: Optional[str], tx_hash: HexBytes, nonce: Optional[int]) -> Future:
+        future = self.tracker.track(tx_hash, sender=self.account.address, nonce=nonce)
+        if self.journal is not None and key is not None:
+            self.journal.watch(key, future)
+        return future
+
+    def _journaled(self, key: Optional[str]) -> Optional[HexBytes]:
+        # Hash of an earlier send for this key, if it needs no new one
+        if self.journal is None or key is None:
+            return None
+        step = self.journal.get(key)
+        if step is None or step.status not in ("done", "pending") or not step.tx_hash:
+            return None
+        tx_hash = HexBytes(step.tx_hash)
+        if step.status == "pending" and self.tracker is not None and tx_hash not in self.receipts:
+            self.receipts[tx_hash] = self._track(key, tx_hash, None)
+        return tx_hash
+
+    def submit(self, tx: Any, key: Optional[str] = None) -> HexBytes:
+        earlier = self._journaled(key)
+        if earlier is not None:
+            return earlier
+        prepared = self._prepare(tx)
+        return self._broadcast(prepared, self.nonces.next_nonce(self.account.address), key)
+
+    def submit_many(self, txs: Sequence[Any], keys: Optional[Sequence[str]] = None) -> List[HexBytes]:
+        # keys (one per tx) journal the sends when the pipeline has a journal
+        keys = list(keys) if keys is not None else [None] * len(txs)
+        if len(keys) != len(txs):
+            raise ValueError("submit_many needs one key per transaction")
+        hashes: List[Optional[HexBytes]] = [self._journaled(key) for key in keys]
+        todo = [i for i, h in enumerate(hashes) if h is None]
+        # Fill every transaction before taking nonces so a failing estimate
+        # cannot leave a gap in the middle of the sequence
+        prepared = {i: self._prepare(txs[i]) for i in todo}
+        if self.journal is None or not any(keys[i] is not None for i in todo):
+            for i in todo:
+                hashes[i] = self._broadcast(prepared[i], self.nonces.next_nonce(self.account.address))
+            return hashes  # type: ignore[return-value]
+        # Sign the batch and commit every hash in one write before broadcasting
+        signed = {}
+        for i in todo:
+            nonce = self.nonces.next_nonce(self.account.address)
+            signed[i] = (nonce, self._sign(prepared[i], nonce))
+            self._journal_sent(keys[i], prepared[i], signed[i][1], durable=False)
+        self.journal.flush()
+        for n, i in enumerate(todo):
+            nonce, raw = signed[i]
+            try:
+                hashes[i] = self._broadcast(prepared[i], nonce, keys[i], raw)
+            except Exception as exc:
+                self._unsend(keys, todo[n:], signed, exc)
+                raise
+        return hashes  # type: ignore[return-value]
+
+    def _unsend(self, keys: List[Optional[str]], unsent: List[int], signed: Dict[int, Tuple[int, HexBytes]], exc: Exception) -> None:
+        # The first of `unsent` failed to broadcast and the rest were never
+        # tried: return their nonces (last first, so they rewind) and take
+        # their journaled hashes off pending. A rejected send is failed; one
+        # lost to a transport error may still have reached the node, so it
+        # stays pending.
+        for i in reversed(unsent[1:]):
+            self.nonces.release(self.account.address, signed[i][0])
+            if keys[i] is not None:
+                self.journal.record(keys[i], "planned")
+        if isinstance(exc, Web3RPCError) and keys[unsent[0]] is not None:
+            self.journal.record(keys[unsent[0]], "failed", error=f"{type(exc).__name__}: {exc}")
+        self.journal.flush()
@@ -0,0 +1,309 @@
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from eth_utils import to_bytes
+from web3 import AsyncHTTPProvider, HTTPProvider
+from web3._utils.encoding import FriendlyJsonSerde, Web3JsonEncoder
+from web3.types import RPCEndpoint, RPCResponse
+
+from .metrics import METRICS, rpc_status
+
+# Sends must reach the node in submission order, so they never share a batch
+UNBATCHED_METHODS = frozenset({"eth_sendRawTransaction", "eth_sendTransaction"})
+
+
+class _PendingCall:
+    __slots__ = ("method", "params", "urgent", "held", "queued_at", "response", "error", "done")
+
+    def __init__(self, method: RPCEndpoint, params: Any, urgent: bool, held: bool) -> None:
+        self.method = method
+        self.params = params
+        # Issued by a thread that holds a batch() block open; waiting for the
+        # block to close would deadlock it, so it flushes the queue instead.
+        self.urgent = urgent
+        # Queued while some batch() block was open
+        self.held = held
+        self.queued_at = time.monotonic()
+        self.response: Optional[RPCResponse] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+def _encode_batch(provider: Any, methods: List[RPCEndpoint], params: List[Any]) -> Tuple[List[int], bytes]:
+    ids = [next(provider.request_counter) for _ in methods]
+    payload = [
+        {"jsonrpc": "2.0", "method": m, "params": p or [], "id": i}
+        for m, p, i in zip(methods, params, ids)
+    ]
+    return ids, to_bytes(text=FriendlyJsonSerde().json_encode(payload, Web3JsonEncoder))
+
+
+def _batch_bytes(batch_methods: List[RPCEndpoint], sent: int, received: Optional[bytes]) -> None:
+    # A batch POST has no per-method size; split it evenly over its calls
+    share_in = len(received or b"") // len(batch_methods)
+    for method in batch_methods:
+        METRICS.add_bytes("rpc", method, sent // len(batch_methods), share_in)
+
+
+def _route_responses(response: Any, ids: List[int]) -> List[Optional[RPCResponse]]:
+    # Nodes may answer a batch in any order; match each reply back by id.
+    # A non-list reply means the node rejected the batch as a whole.
+    if not isinstance(response, list):
+        return [None] * len(ids)
+    by_id: Dict[Any, RPCResponse] = {r.get("id"): r for r in response if isinstance(r, dict)}
+    return [by_id.get(i) for i in ids]
+
+
+class BatchingHTTPProvider(HTTPProvider):
+    # Coalesces concurrent requests into JSON-RPC batch arrays. A request made
+    # while nothing else is in flight goes out at once, so single-threaded
+    # callers pay no extra latency; requests from other threads (or queued
+    # inside `with provider.batch():`) wait up to batch_window_seconds and
+    # share one POST of at most max_batch_size calls.
+
+    def __init__(
+        self,
+        endpoint_uri: Optional[str] = None,
+        request_kwargs: Optional[Any] = None,
+        batch_window_seconds: float = 0.002,
+        max_batch_size: int = 100,
+        hold_timeout_seconds: float = 0.05,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs, **kwargs)
+        self.batch_window_seconds = batch_window_seconds
+        self.max_batch_size = max(1, max_batch_size)
+        self.hold_timeout_seconds = hold_timeout_seconds
+        self.calls_made = 0
+        self.posts_made = 0
+        self._cond = threading.Condition()
+        self._pending: List[_PendingCall] = []
+        self._leading = False
+        self._in_flight = 0
+        self._holds: Dict[int, int] = {}
+
+    @contextmanager
+    def batch(self) -> Iterator["BatchingHTTPProvider"]:
+        # Hold the queue open until the block exits (or a batch fills up), so
+        # requests fired from worker threads inside the block share one POST.
+        # A hold delays only requests queued while it is open, and those for
+        # at most hold_timeout_seconds; collect worker futures after the block
+        # exits so they go out at once.
+        ident = threading.get_ident()
+        with self._cond:
+            self._holds[ident] = self._holds.get(ident, 0) + 1
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._holds[ident] -= 1
+                if not self._holds[ident]:
+                    del self._holds[ident]
+                self._cond.notify_all()
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if not METRICS.enabled:
+            return self._dispatch(method, params)
+        start = time.perf_counter()
+        try:
+            response = self._dispatch(method, params)
+        except Exception as exc:
+            METRICS.observe("rpc", method, time.perf_counter() - start, type(exc).__name__)
+            raise
+        METRICS.observe("rpc", method, time.perf_counter() - start, rpc_status(response))
+        return response
+
+    def _make_request(self, method: RPCEndpoint, request_data: bytes) -> bytes:
+        raw = super()._make_request(method, request_data)
+        METRICS.add_bytes("rpc", method, len(request_data), len(raw or b""))
+        return raw
+
+    def _dispatch(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if method in UNBATCHED_METHODS or self.max_batch_size == 1:
+            with self._cond:
+                self.calls_made += 1
+                self.posts_made += 1
+            return super().make_request(method, params)
+
+        with self._cond:
+            # _holds is changed by batch() under the same lock
+            item = _PendingCall(method, params, urgent=threading.get_ident() in self._holds, held=bool(self._holds))
+            self.calls_made += 1
+            self._pending.append(item)
+            lead = not self._leading
+            if lead:
+                self._leading = True
+            elif item.urgent or len(self._pending) >= self.max_batch_size:
+                self._cond.notify_all()
+        if lead:
+            self._lead()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.response  # type: ignore[return-value]
+
+    def _wait_timeout(self, deadline: float) -> float:
+        # Seconds to keep collecting; 0 means "send now"
+        if len(self._pending) >= self.max_batch_size or any(c.urgent for c in self._pending):
+            return 0.0
+        if self._holds and all(c.held for c in self._pending):
+            # Bounded, so a holder waiting on its own requests inside the
+            # block cannot stall them (or anyone queued behind them)
+            return max(0.0, self._pending[0].queued_at + self.hold_timeout_seconds - time.monotonic())
+        if self._in_flight == 0:
+            return 0.0
+        return max(0.0, deadline - time.monotonic())
+
+    def _lead(self) -> None:
+        more = True
+        while more:
+            with self._cond:
+                deadline = time.monotonic() + self.batch_window_seconds
+                timeout = self._wait_timeout(deadline)
+                while timeout > 0:
+                    self._cond.wait(timeout)
+                    timeout = self._wait_timeout(deadline)
+                batch = self._pending[: self.max_batch_size]
+                del self._pending[: self.max_batch_size]
+                more = bool(self._pending)
+                if not more:
+                    self._leading = False
+                self._in_flight += 1
+                self.posts_made += 1
+            try:
+                self._send(batch)
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def _send(self, batch: List[_PendingCall]) -> None:
+        if len(batch) == 1:
+            item = batch[0]
+            try:
+                item.response = super().make_request(item.method, item.params)
+            except BaseException as exc:
+                item.error = exc
+            item.done.set()
+            return
+        try:
+            ids, data = _encode_batch(self, [c.method for c in batch], [c.params for c in batch])
+            raw = self._request_session_manager.make_post_request(
+                self.endpoint_uri, data, **self.get_request_kwargs()
+            )
+            _batch_bytes([c.method for c in batch], len(data), raw)
+            routed = _route_responses(self.decode_rpc_response(raw), ids)
+        except BaseException as exc:
+            for item in batch:
+                item.error = exc
+                item.done.set()
+            return
+        for item, response in zip(batch, routed):
+            if response is None:
+                # Missing from the batch reply; retry it on its own
+                try:
+                    response = super().make_request(item.method, item.params)
+                except BaseException as exc:
+                    item.error = exc
+            item.response = response
+            item.done.set()
+
+
+class AsyncBatchingHTTPProvider(AsyncHTTPProvider):
+    # Requests issued within batch_window_seconds of each other (by default the
+    # same event-loop tick, e.g. under asyncio.gather) go out as one batch
+
+    def __init__(
+        self,
+        endpoint_uri: Optional[str] = None,
+        request_kwargs: Optional[Any] = None,
+        batch_window_seconds: float = 0.0,
+        max_batch_size: int = 100,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs, **kwargs)
+        self.batch_window_seconds = batch_window_seconds
+        self.max_batch_size = max(1, max_batch_size)
+        self.calls_made = 0
+        self.posts_made = 0
+        self._queue: List[Tuple[RPCEndpoint, Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.Handle] = None
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if not METRICS.enabled:
+            return await self._dispatch(method, params)
+        start = time.perf_counter()
+        try:
+            response = await self._dispatch(method, params)
+        except Exception as exc:
+            METRICS.observe("rpc", method, time.perf_counter() - start, type(exc).__name__)
+            raise
+        METRICS.observe("rpc", method, time.perf_counter() - start, rpc_status(response))
+        return response
+
+    async def _make_request(self, method: RPCEndpoint, request_data: bytes) -> bytes:
+        raw = await super()._make_request(method, request_data)
+        METRICS.add_bytes("rpc", method, len(request_data), len(raw or b""))
+        return raw
+
+    async def _dispatch(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        self.calls_made += 1
+        if method in UNBATCHED_METHODS or self.max_batch_size == 1:
+            self.posts_made += 1
+            return await super().make_request(method, params)
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._queue.append((method, params, future))
+        if len(self._queue) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window_seconds, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._queue = self._queue, []
+        if batch:
+            self.posts_made += 1
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[RPCEndpoint, Any, asyncio.Future]]) -> None:
+        if len(batch) == 1:
+            method, params, future = batch[0]
+            try:
+                result = await super().make_request(method, params)
+            except BaseException as exc:
+                if not future.done():
+                    future.set_exception(exc)
+                return
+            if not future.done():
+                future.set_result(result)
+            return
+        try:
+            ids, data = _encode_batch(self, [b[0] for b in batch], [b[1] for b in batch])
+            raw = await self._request_session_manager.async_make_post_request(
+                self.endpoint_uri, data, **self.get_request_kwargs()
+            )
+            _batch_bytes([b[0] for b in batch], len(data), raw)
+            routed = _route_responses(self.decode_rpc_response(raw), ids)
+        except BaseException as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (method, params, future), response in zip(batch, routed):
+            if future.done():
+                continue
+            if response is None:
+                try:
+                    response = await super().make_request(method, params)
+                except BaseException as exc:
+                    future.set_exception(exc)
+                    continue
+            future.set_result(response)
@@ -0,0 +1,303 @@
+from __future__ import annotations
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.exceptions import MethodUnavailable, TimeExhausted, TransactionNotFound, Web3RPCError
+
+if TYPE_CHECKING:
+    from .heads import Head, HeadBus
+
+
+class TransactionDropped(RuntimeError):
+    pass
+
+
+class TransactionReplaced(RuntimeError):
+    pass
+
+
+class _Tracked:
+    __slots__ = ("tx_hash", "future", "deadline", "sender", "nonce", "missing_polls", "seen")
+
+    def __init__(self, tx_hash: HexBytes, deadline: float, sender: Optional[str], nonce: Optional[int]) -> None:
+        self.tx_hash = tx_hash
+        self.future: Future = Future()
+        self.deadline = deadline
+        self.sender = sender
+        self.nonce = nonce
+        self.missing_polls = 0
+        # False until the first poll; it may have been mined before tracking began
+        self.seen = False
+
+
+# Messages of nodes that do not serve a method
+_UNSUPPORTED = ("method not found", "not supported", "unsupported", "does not exist", "not available")
+
+
+def _unsupported(exc: Exception) -> bool:
+    if isinstance(exc, (NotImplementedError, MethodUnavailable)):
+        return True
+    response = getattr(exc, "rpc_response", None)
+    error = response.get("error") if isinstance(response, dict) else None
+    if isinstance(error, dict) and error.get("code") == -32601:
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in _UNSUPPORTED)
+
+
+class ReceiptTracker:
+    # Resolves one Future per tracked hash, polling once per new block for all
+    # of them together. Receipts come from eth_getBlockReceipts when the node
+    # has it, otherwise from concurrent eth_getTransactionReceipt calls that a
+    # BatchingHTTPProvider folds into a single batch POST.
+    # Use asyncio.wrap_future(tracker.track(h)) to await from a coroutine.
+    # Given a HeadBus it polls as each head is published instead of on a
+    # timer; poll_interval_seconds then only paces timeout checks.
+    def __init__(
+        self,
+        web3: Web3,
+        poll_interval_seconds: float = 1.0,
+        timeout_seconds: float = 120.0,
+        drop_after_polls: int = 5,
+        use_block_receipts: Optional[bool] = None,
+        max_block_span: int = 16,
+        max_workers: int = 16,
+        heads: Optional["HeadBus"] = None,
+    ) -> None:
+        self.web3 = web3
+        self.heads = heads
+        self.poll_interval_seconds = poll_interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.drop_after_polls = drop_after_polls
+        # None = probe on first use
+        self.use_block_receipts = use_block_receipts
+        self.max_block_span = max_block_span
+        self._pending: Dict[HexBytes, _Tracked] = {}
+        self._lock = threading.Lock()
+        self._last_block: Optional[int] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="receipts")
+        self._stop = threading.Event()
+        # Set by stop() and by each published head
+        self._wake = threading.Event()
+        self._head_hint: Optional[int] = None
+        self._unsubscribe: Optional[Callable[[], None]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "ReceiptTracker":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def track(
+        self,
+        tx_hash: Any,
+        sender: Optional[str] = None,
+        nonce: Optional[int] = None,
+        timeout_seconds: Optional[float] = None,
+    ) -> Future:
+        tx_hash = HexBytes(tx_hash)
+        with self._lock:
+            tracked = self._pending.get(tx_hash)
+            if tracked is None:
+                deadline = time.monotonic() + (timeout_seconds or self.timeout_seconds)
+                tracked = _Tracked(tx_hash, deadline, sender, nonce)
+                self._pending[tx_hash] = tracked
+            return tracked.future
+
+    def wait(self, tx_hash: Any, timeout_seconds: Optional[float] = None):
+        return self.track(tx_hash, timeout_seconds=timeout_seconds).result()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        if self.heads is not None:
+            self._unsubscribe = self.heads.subscribe(self._on_head)
+        self._thread = threading.Thread(target=self._run, name="receipt-tracker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=False)
+
+    def _on_head(self, head: "Head") -> None:
+        self._head_hint = head.number
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # Cleared before polling so a head published mid-poll is not lost
+            self._wake.clear()
+            hint, self._head_hint = self._head_hint, None
+            if hint is None and self.heads is not None and self.heads.latest is not None:
+                hint = self.heads.latest.number
+            try:
+                self.poll_once(hint)
+            except Exception:
+                # A failed poll (RPC hiccup) is retried on the next tick
+                pass
+            self._wake.wait(self.poll_interval_seconds)
+
+    def poll_once(self, block_number: Optional[int] = None) -> int:
+        # Returns how many tracked transactions were resolved by this poll
+        resolved = self._expire()
+        with self._lock:
+            if not self._pending:
+                return resolved
+        head = self.web3.eth.block_number if block_number is None else block_number
+        if self._last_block is not None and head <= self._last_block:
+            return resolved
+        first = head if self._last_block is None else self._last_block + 1
+        self._last_block = head
+
+        with self._lock:
+            pending = dict(self._pending)
+        fresh = [h for h, t in pending.items() if not t.seen]
+        known = {h: t for h, t in pending.items() if t.seen}
+        receipts: Dict[HexBytes, Any] = {}
+        if known:
+            from_blocks = None
+            if head - first < self.max_block_span:
+                from_blocks = self._receipts_from_blocks(first, head, known)
+            if from_blocks is None:
+                fresh.extend(known)
+            else:
+                receipts.update(from_blocks)
+        if fresh:
+            receipts.update(self._receipts_by_hash(fresh))
+        for tracked in pending.values():
+            tracked.seen = True
+        for tx_hash, receipt in receipts.items():
+            resolved += self._resolve(tx_hash, result=receipt)
+
+        with self._lock:
+            missing = [t for h, t in self._pending.items() if h in pending]
+        if missing:
+            resolved += self._check_missing(missing)
+        return resolved
+
+    def _map(self, fn, items: List[Any]) -> List[Any]:
+        provider = self.web3.provider
+        # Hold a BatchingHTTPProvider open so every lookup shares one POST
+        hold = provider.batch() if hasattr(provider, "batch") else nullcontext()
+        with hold:
+            futures = [self._executor.submit(fn, item) for item in items]
+        return [f.result() for f in futures]
+
+    def _receipts_from_blocks(
+        self, first: int, last: int, pending: Dict[HexBytes, _Tracked]
+    ) -> Optional[Dict[HexBytes, Any]]:
+        if self.use_block_receipts is False:
+            return None
+        try:
+            blocks = self._map(self.web3.eth.get_block_receipts, list(range(first, last + 1)))
+        except (Web3RPCError, ValueError, NotImplementedError) as exc:
+            # Only a node without eth_getBlockReceipts stops us trying; any
+            # other error (e.g. a lagging node's "header not found") falls
+            # back to per-hash lookups for this poll alone
+            if _unsupported(exc):
+                self.use_block_receipts = False
+            return None
+        self.use_block_receipts = True
+        found: Dict[HexBytes, Any] = {}
+        for block_receipts in blocks:
+            for receipt in block_receipts or []:
+                tx_hash = HexBytes(receipt["transactionHash"])
+                if tx_hash in pending:
+                    found[tx_hash] = receipt
+        return found
+
+    def _receipts_by_hash(self, hashes: List[HexBytes]) -> Dict[HexBytes, Any]:
+        def fetch(tx_hash: HexBytes):
+            try:
+                return self.web3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                return None
+
+        return {h: r for h, r in zip(hashes, self._map(fetch, hashes)) if r is not None}
+
+    def _check_missing(self, missing: List[_Tracked]) -> int:
+        # A transaction with no receipt is either still in the mempool, replaced
+        # (its nonce was used by another tx) or dropped (gone from the mempool).
+        def lookup(tracked: _Tracked):
+            try:
+                return self.web3.eth.get_transaction(tracked.tx_hash)
+            except TransactionNotFound:
+                return None
+
+        txs = self._map(lookup, missing)
+        for tracked, tx in zip(missing, txs):
+            if tx is not None:
+                tracked.missing_polls = 0
+                if tracked.sender is None:
+                    tracked.sender, tracked.nonce = tx["from"], tx["nonce"]
+            else:
+                tracked.missing_polls += 1
+
+        senders = sorted({t.sender for t in missing if t.sender is not None})
+        counts = dict(zip(senders, self._map(lambda s: self.web3.eth.get_transaction_count(s, "latest"), senders)))
+
+        replaced: List[_Tracked] = []
+        resolved = 0
+        for tracked in missing:
+            mined_nonce = counts.get(tracked.sender) if tracked.sender is not None else None
+            if mined_nonce is not None and tracked.nonce is not None and mined_nonce > tracked.nonce:
+                replaced.append(tracked)
+            elif tracked.missing_polls >= self.drop_after_polls:
+                resolved += self._resolve(
+                    tracked.tx_hash,
+                    error=TransactionDropped(f"Transaction {tracked.tx_hash.to_0x_hex()} dropped from mempool"),
+                )
+        if replaced:
+            # The nonce may have been used by our own tx landing after the receipt
+            # lookup above; only call it replaced if it still has no receipt.
+            late = self._receipts_by_hash([t.tx_hash for t in replaced])
+            for tracked in replaced:
+                receipt = late.get(tracked.tx_hash)
+                if receipt is not None:
+                    resolved += self._resolve(tracked.tx_hash, result=receipt)
+                else:
+                    resolved += self._resolve(
+                        tracked.tx_hash,
+                        error=TransactionReplaced(f"Transaction {tracked.tx_hash.to_0x_hex()} was replaced"),
+                    )
+        return resolved
+
+    def _expire(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expired = [h for h, t in self._pending.items() if t.deadline <= now]
+        return sum(
+            self._resolve(h, error=TimeExhausted(f"Transaction {h.to_0x_hex()} not mined in time"))
+            for h in expired
+        )
+
+    def _resolve(self, tx_hash: HexBytes, result: Any = None, error: Optional[BaseException] = None) -> int:
+        with self._lock:
+            tracked = self._pending.pop(tx_hash, None)
+        if tracked is None or tracked.future.done():
+            return 0
+        if error is not None:
+            tracked.future.set_exception(error)
+        else:
+            tracked.future.set_result(result)
+        return 1
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import asyncio
+import time
+from itertools import permutations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from .incentiv_api import IncentivApi
+
+
+class RouteIndex:
+    # Swap routes for every ordered pair of known tokens. Tokens are numbered
+    # once and routes live in a dict keyed by (from index, to index), so a
+    # lookup is two dict hits and no I/O. prefetch() fills the whole table
+    # with at most `concurrency` requests in flight; entries expire after
+    # `ttl` seconds or when invalidate() is called for a failed swap.
+    # invalidate() bumps a generation: fetches started before it (e.g. under
+    # the previous login) never store their result, and callers waiting on
+    # them fetch again. This is the only cache for routes; the HTTP response
+    # cache leaves /api/user/swap-route alone.
+    def __init__(
+        self,
+        api: IncentivApi,
+        tokens: Iterable[str] = (),
+        ttl: float = 300.0,
+        concurrency: int = 8,
+    ) -> None:
+        self.api = api
+        self.ttl = ttl
+        self.concurrency = max(1, concurrency)
+        self._ids: Dict[str, int] = {}
+        self._addresses: List[str] = []
+        self._routes: Dict[Tuple[int, int], Tuple[Any, float]] = {}
+        self._inflight: Dict[Tuple[int, int], asyncio.Task] = {}
+        # Full invalidations bump _epoch, single-pair ones that pair's counter
+        self._epoch = 0
+        self._pair_generations: Dict[Tuple[int, int], int] = {}
+        for token in tokens:
+            self._id(token)
+
+    def _id(self, token: str) -> int:
+        key = token.lower()
+        index = self._ids.get(key)
+        if index is None:
+            index = self._ids[key] = len(self._addresses)
+            self._addresses.append(token)
+        return index
+
+    def _generation(self, pair: Tuple[int, int]) -> Tuple[int, int]:
+        return self._epoch, self._pair_generations.get(pair, 0)
+
+    def pairs(self) -> List[Tuple[int, int]]:
+        return list(permutations(range(len(self._addresses)), 2))
+
+    def get(self, from_token: str, to_token: str) -> Optional[Any]:
+        # Local only: None when the pair is unknown, stale or invalidated
+        a = self._ids.get(from_token.lower())
+        b = self._ids.get(to_token.lower())
+        if a is None or b is None:
+            return None
+        entry = self._routes.get((a, b))
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    async def route(self, from_token: str, to_token: str) -> Any:
+        route = self.get(from_token, to_token)
+        if route is not None:
+            return route
+        pair = (self._id(from_token), self._id(to_token))
+        while True:
+            generation = self._generation(pair)
+            route = await self._fetch(pair)
+            if generation == self._generation(pair):
+                return route
+
+    async def prefetch(self, stale_only: bool = True) -> Dict[str, int]:
+        now = time.monotonic()
+        todo = [p for p in self.pairs() if not stale_only or self._routes.get(p, (None, 0.0))[1] <= now]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(pair: Tuple[int, int]) -> bool:
+            async with semaphore:
+                try:
+                    await self._fetch(pair)
+                    return True
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    return False
+
+        results = await asyncio.gather(*(one(p) for p in todo))
+        return {"pairs": len(self.pairs()), "fetched": sum(results), "failed": len(results) - sum(results)}
+
+    def _fetch(self, pair: Tuple[int, int]) -> "asyncio.Future[Any]":
+        # Concurrent lookups of one pair share a request
+        task = self._inflight.get(pair)
+        if task is None:
+            task = asyncio.ensure_future(self._load(pair, self._generation(pair)))
+            self._inflight[pair] = task
+
+            def done(_: asyncio.Task) -> None:
+                # invalidate() may already have replaced it
+                if self._inflight.get(pair) is task:
+                    del self._inflight[pair]
+
+            task.add_done_callback(done)
+        return asyncio.shield(task)
+
+    async def _load(self, pair: Tuple[int, int], generation: Tuple[int, int]) -> Any:
+        route = await self.api.swap_route(self._addresses[pair[0]], self._addresses[pair[1]])
+        if generation == self._generation(pair):
+            self._routes[pair] = (route, time.monotonic() + self.ttl)
+        return route
+
+    def invalidate(self, from_token: Optional[str] = None, to_token: Optional[str] = None) -> None:
+        # Drop one pair (e.g. after a swap using it failed), or everything.
+        # Requests already in flight are left to finish but not stored.
+        if from_token is None or to_token is None:
+            self._epoch += 1
+            self._routes.clear()
+            self._inflight.clear()
+            return
+        a = self._ids.get(from_token.lower())
+        b = self._ids.get(to_token.lower())
+        if a is None or b is None:
+            return
+        self._pair_generations[(a, b)] = self._pair_generations.get((a, b), 0) + 1
+        self._routes.pop((a, b), None)
+        self._inflight.pop((a, b), None)
+
+    def stats(self) -> Dict[str, int]:
+        now = time.monotonic()
+        fresh = sum(1 for _, expires_at in self._routes.values() if expires_at > now)
+        return {"tokens": len(self._addresses), "pairs": len(self.pairs()), "fresh": fresh}
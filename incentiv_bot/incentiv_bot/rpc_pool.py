@@ -0,0 +1,389 @@
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence
+
+from web3.providers.async_base import AsyncBaseProvider
+from web3.providers.base import BaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from .metrics import METRICS
+from .providers import UNBATCHED_METHODS, AsyncBatchingHTTPProvider, BatchingHTTPProvider
+
+# Sender of the transaction currently being broadcast; set by our signers so
+# the pool can pin a sender to one node without recovering the signature
+_current_sender: ContextVar[Optional[str]] = ContextVar("rpc_pool_sender", default=None)
+
+
+@contextmanager
+def sending_as(address: Optional[str]) -> Iterator[None]:
+    token = _current_sender.set(address.lower() if address else None)
+    try:
+        yield
+    finally:
+        _current_sender.reset(token)
+
+
+def _recover_sender(raw_tx: Any) -> Optional[str]:
+    # Slow path (~10 ms without coincurve); only hit for raw transactions
+    # broadcast outside sending_as()
+    from eth_account import Account
+
+    try:
+        return Account.recover_transaction(raw_tx).lower()
+    except Exception:
+        return None
+
+
+def sender_of(method: RPCEndpoint, params: Any) -> Optional[str]:
+    # Calls whose answer depends on which node has seen our sends
+    if method == "eth_sendRawTransaction" and params:
+        return _current_sender.get() or _recover_sender(params[0])
+    if method == "eth_sendTransaction" and params and isinstance(params[0], dict) and params[0].get("from"):
+        return str(params[0]["from"]).lower()
+    if method == "eth_getTransactionCount" and len(params or ()) > 1 and params[1] == "pending":
+        return str(params[0]).lower()
+    return None
+
+
+def _retrieve(task: "asyncio.Future") -> None:
+    # Losing hedge attempts may fail after the winner returned; mark their
+    # exceptions as seen so asyncio does not log them
+    if not task.cancelled():
+        task.exception()
+
+
+class EndpointStats:
+    __slots__ = ("url", "latency", "error_rate", "samples", "failures", "down_until", "last_used", "requests", "errors")
+
+    def __init__(self, url: str, window: int = 128) -> None:
+        self.url = url
+        # EWMAs; latency is None until the first success
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_used = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 2),
+            "error_rate": round(self.error_rate, 4),
+            "requests": self.requests,
+            "errors": self.errors,
+            "down": self.down_until > time.monotonic(),
+        }
+
+
+class EndpointPool:
+    # Routing state shared by the sync and async pooled providers. Reads go to
+    # the healthy endpoint with the lowest error-weighted EWMA latency
+    # (endpoints with no samples yet are tried first); an endpoint that fails
+    # max_failures times in a row sits out cooldown_seconds. An endpoint left
+    # unused for probe_interval_seconds gets the next read, so one slow sample
+    # cannot bench it forever. Each sender is pinned to one endpoint so its
+    # sends and pending nonce stay consistent.
+    def __init__(
+        self,
+        urls: Sequence[str],
+        alpha: float = 0.3,
+        max_failures: int = 3,
+        cooldown_seconds: float = 5.0,
+        probe_interval_seconds: float = 10.0,
+        hedge_percentile: float = 0.0,
+        min_hedge_samples: int = 16,
+    ) -> None:
+        if not urls:
+            raise ValueError("EndpointPool needs at least one RPC endpoint")
+        self.endpoints = [EndpointStats(url) for url in urls]
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.cooldown_seconds = cooldown_seconds
+        self.probe_interval_seconds = probe_interval_seconds
+        # 0 disables hedging; e.g. 0.9 hedges reads slower than the primary's p90
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_samples = min_hedge_samples
+        self._lock = threading.Lock()
+        self._sticky: Dict[str, int] = {}
+
+    def _score(self, stats: EndpointStats) -> float:
+        if stats.latency is None:
+            return 0.0
+        return stats.latency * (1.0 + 4.0 * stats.error_rate)
+
+    def ranked(self) -> List[int]:
+        now = time.monotonic()
+        with self._lock:
+            healthy = [i for i, s in enumerate(self.endpoints) if s.down_until <= now]
+            down = [i for i, s in enumerate(self.endpoints) if s.down_until > now]
+            healthy.sort(key=lambda i: self._score(self.endpoints[i]))
+            stale = [i for i in healthy if now - self.endpoints[i].last_used > self.probe_interval_seconds]
+            if stale and stale[0] != healthy[0]:
+                healthy.remove(stale[0])
+                healthy.insert(0, stale[0])
+            if healthy:
+                # Claim the slot now so concurrent callers do not all probe
+                self.endpoints[healthy[0]].last_used = now
+            # All down: try whichever comes back first rather than failing outright
+            down.sort(key=lambda i: self.endpoints[i].down_until)
+        return healthy + down
+
+    def record(self, index: int, seconds: float, ok: bool) -> None:
+        with self._lock:
+            stats = self.endpoints[index]
+            stats.last_used = time.monotonic()
+            stats.requests += 1
+            stats.error_rate += self.alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+            if ok:
+                stats.failures = 0
+                stats.samples.append(seconds)
+                stats.latency = seconds if stats.latency is None else stats.latency + self.alpha * (seconds - stats.latency)
+                return
+            stats.errors += 1
+            stats.failures += 1
+            if stats.failures >= self.max_failures:
+                stats.down_until = time.monotonic() + self.cooldown_seconds
+
+    def sticky(self, sender: str) -> int:
+        with self._lock:
+            index = self._sticky.get(sender)
+            if index is not None and self.endpoints[index].down_until <= time.monotonic():
+                return index
+        index = self.ranked()[0]
+        with self._lock:
+            self._sticky[sender] = index
+        return index
+
+    def repin(self, sender: str, failed: int) -> Optional[int]:
+        for index in self.ranked():
+            if index != failed:
+                with self._lock:
+                    self._sticky[sender] = index
+                return index
+        return None
+
+    def hedge_delay(self, index: int) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(self.endpoints) < 2:
+            return None
+        with self._lock:
+            stats = self.endpoints[index]
+            if len(stats.samples) < self.min_hedge_samples:
+                return None
+            return max(0.001, stats.percentile(self.hedge_percentile) or 0.0)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [s.to_dict() for s in self.endpoints]
+
+
+class PooledHTTPProvider(BaseProvider):
+    # One BatchingHTTPProvider per endpoint, routed by an EndpointPool. Reads
+    # fail over down the ranking; raw sends fail over after re-pinning the
+    # sender (resending the same signed tx is idempotent).
+    def __init__(
+        self,
+        endpoint_uris: Sequence[str],
+        pool: Optional[EndpointPool] = None,
+        max_workers: int = 16,
+        **provider_kwargs: Any,
+    ) -> None:
+        super().__init__()
+        self.pool = pool or EndpointPool(endpoint_uris)
+        # Fail fast and let the pool fail over instead of web3's retry backoff
+        provider_kwargs.setdefault("exception_retry_configuration", None)
+        self.providers = [BatchingHTTPProvider(uri, **provider_kwargs) for uri in endpoint_uris]
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._max_workers = max_workers
+        self._holds: Dict[int, int] = {}
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return any(p.is_connected(show_traceback) for p in self.providers)
+
+    @contextmanager
+    def batch(self) -> Iterator["PooledHTTPProvider"]:
+        ident = threading.get_ident()
+        self._holds[ident] = self._holds.get(ident, 0) + 1
+        try:
+            with ExitStack() as stack:
+                for provider in self.providers:
+                    stack.enter_context(provider.batch())
+                yield self
+        finally:
+            self._holds[ident] -= 1
+            if not self._holds[ident]:
+                del self._holds[ident]
+
+    def _call(self, index: int, method: RPCEndpoint, params: Any) -> RPCResponse:
+        start = time.perf_counter()
+        try:
+            response = self.providers[index].make_request(method, params)
+        except Exception:
+            self.pool.record(index, time.perf_counter() - start, ok=False)
+            raise
+        self.pool.record(index, time.perf_counter() - start, ok=True)
+        return response
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        sender = sender_of(method, params)
+        if sender is not None:
+            return self._sticky_request(sender, method, params)
+        ranked = self.pool.ranked()
+        delay = None if method in UNBATCHED_METHODS else self.pool.hedge_delay(ranked[0])
+        # A thread holding batch() would block its own hedge worker
+        if delay is not None and threading.get_ident() not in self._holds:
+            return self._hedged(ranked, delay, method, params)
+        return self._failover(ranked, method, params)
+
+    def _failover(self, ranked: List[int], method: RPCEndpoint, params: Any) -> RPCResponse:
+        error: Optional[Exception] = None
+        for attempt, index in enumerate(ranked):
+            if attempt:
+                METRICS.retry("rpc", method)
+            try:
+                return self._call(index, method, params)
+            except Exception as exc:
+                error = exc
+        raise error  # type: ignore[misc]
+
+    def _sticky_request(self, sender: str, method: RPCEndpoint, params: Any) -> RPCResponse:
+        index = self.pool.sticky(sender)
+        try:
+            return self._call(index, method, params)
+        except Exception:
+            # eth_sendTransaction is signed by the node; resending elsewhere could double-spend
+            if method == "eth_sendTransaction":
+                raise
+            fallback = self.pool.repin(sender, index)
+            if fallback is None:
+                raise
+            METRICS.retry("rpc", method)
+            return self._call(fallback, method, params)
+
+    def _hedged(self, ranked: List[int], delay: float, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="rpc-hedge")
+        primary = self._executor.submit(self._call, ranked[0], method, params)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            try:
+                return primary.result()
+            except Exception:
+                METRICS.retry("rpc", method)
+            return self._failover(ranked[1:], method, params)
+        METRICS.retry("rpc", method)
+        backup = self._executor.submit(self._call, ranked[1], method, params)
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        if len(ranked) > 2:
+            METRICS.retry("rpc", method)
+            return self._failover(ranked[2:], method, params)
+        raise error  # type: ignore[misc]
+
+
+class AsyncPooledHTTPProvider(AsyncBaseProvider):
+    def __init__(
+        self,
+        endpoint_uris: Sequence[str],
+        pool: Optional[EndpointPool] = None,
+        **provider_kwargs: Any,
+    ) -> None:
+        super().__init__()
+        self.pool = pool or EndpointPool(endpoint_uris)
+        provider_kwargs.setdefault("exception_retry_configuration", None)
+        self.providers = [AsyncBatchingHTTPProvider(uri, **provider_kwargs) for uri in endpoint_uris]
+
+    async def is_connected(self, show_traceback: bool = False) -> bool:
+        for provider in self.providers:
+            if await provider.is_connected(show_traceback):
+                return True
+        return False
+
+    async def disconnect(self) -> None:
+        for provider in self.providers:
+            await provider.disconnect()
+
+    async def _call(self, index: int, method: RPCEndpoint, params: Any) -> RPCResponse:
+        start = time.perf_counter()
+        try:
+            response = await self.providers[index].make_request(method, params)
+        except Exception:
+            self.pool.record(index, time.perf_counter() - start, ok=False)
+            raise
+        self.pool.record(index, time.perf_counter() - start, ok=True)
+        return response
+
+    async def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        sender = sender_of(method, params)
+        if sender is not None:
+            index = self.pool.sticky(sender)
+            try:
+                return await self._call(index, method, params)
+            except Exception:
+                fallback = self.pool.repin(sender, index) if method != "eth_sendTransaction" else None
+                if fallback is None:
+                    raise
+                METRICS.retry("rpc", method)
+                return await self._call(fallback, method, params)
+        ranked = self.pool.ranked()
+        delay = None if method in UNBATCHED_METHODS else self.pool.hedge_delay(ranked[0])
+        if delay is not None:
+            return await self._hedged(ranked, delay, method, params)
+        return await self._failover(ranked, method, params)
+
+    async def _failover(self, ranked: List[int], method: RPCEndpoint, params: Any) -> RPCResponse:
+        error: Optional[Exception] = None
+        for attempt, index in enumerate(ranked):
+            if attempt:
+                METRICS.retry("rpc", method)
+            try:
+                return await self._call(index, method, params)
+            except Exception as exc:
+                error = exc
+        raise error  # type: ignore[misc]
+
+    async def _hedged(self, ranked: List[int], delay: float, method: RPCEndpoint, params: Any) -> RPCResponse:
+        primary = asyncio.ensure_future(self._call(ranked[0], method, params))
+        primary.add_done_callback(_retrieve)
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            if primary.exception() is None:
+                return primary.result()
+            METRICS.retry("rpc", method)
+            return await self._failover(ranked[1:], method, params)
+        METRICS.retry("rpc", method)
+        backup = asyncio.ensure_future(self._call(ranked[1], method, params))
+        backup.add_done_callback(_retrieve)
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    # The loser keeps running so its latency still feeds the EWMA
+                    return task.result()
+                error = task.exception()
+        if len(ranked) > 2:
+            METRICS.retry("rpc", method)
+            return await self._failover(ranked[2:], method, params)
+        raise error  # type: ignore[misc]
@@ -0,0 +1,85 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List
+
+
+class Tracer:
+    # Nested timing spans for `bot.py --profile`, written as Chrome
+    # trace-event JSON (open in chrome://tracing or ui.perfetto.dev). Spans
+    # are "X" (complete) events; each asyncio task gets its own track so
+    # concurrent API calls do not overlap on one row. Disabled, span() hands
+    # back a shared no-op context manager.
+    def __init__(self) -> None:
+        self.enabled = False
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._tracks: Dict[int, int] = {}
+        self._names: Dict[int, str] = {}
+        self._null = nullcontext()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def _track(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = id(task) if task is not None else threading.get_ident()
+        with self._lock:
+            track = self._tracks.get(key)
+            if track is None:
+                track = self._tracks[key] = len(self._tracks) + 1
+                self._names[track] = task.get_name() if task is not None else threading.current_thread().name
+        return track
+
+    def span(self, name: str, **args: Any) -> ContextManager[None]:
+        if not self.enabled:
+            return self._null
+        return self._span(name, args)
+
+    @contextmanager
+    def _span(self, name: str, args: Dict[str, Any]) -> Iterator[None]:
+        track = self._track()
+        start = time.perf_counter_ns()
+        try:
+            yield
+        except BaseException as exc:
+            args["error"] = type(exc).__name__
+            raise
+        finally:
+            event = {
+                "name": name,
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": (time.perf_counter_ns() - start) / 1000,
+                "pid": os.getpid(),
+                "tid": track,
+            }
+            if args:
+                event["args"] = {k: str(v) for k, v in args.items()}
+            with self._lock:
+                self._events.append(event)
+
+    def write(self, path: str) -> None:
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+            names = dict(self._names)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": track, "args": {"name": name}}
+            for track, name in names.items()
+        ]
+        target = Path(path)
+        tmp = target.with_name(target.name + ".tmp")
+        tmp.write_text(json.dumps({"traceEvents": metadata + events, "displayTimeUnit": "ms"}))
+        os.replace(tmp, target)
+
+
+TRACER = Tracer()
@@ -1,49 +1,245 @@
 from __future__ import annotations
+import asyncio
+import hashlib
 import json
-from dataclasses import dataclass
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable, List
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar, Union
 
 from eth_account import Account
 from eth_account.signers.local import LocalAccount
-from web3 import Web3
-from web3.middleware import SignAndSendRawMiddlewareBuilder
+from hexbytes import HexBytes
+from toolz import curry
+from web3 import AsyncWeb3, Web3
+from web3._utils.async_transactions import async_fill_nonce, async_fill_transaction_defaults
+from web3._utils.transactions import fill_nonce, fill_transaction_defaults
+from web3.middleware.base import Web3MiddlewareBuilder
+from web3.middleware.signing import format_transaction
+from web3.types import RPCEndpoint, RPCResponse, TxParams
+
+from .nonce import LocalNonceMiddlewareBuilder, NonceManager, TransactionPipeline
+from .receipts import ReceiptTracker
+from .rpc_pool import sending_as
+from .tracing import TRACER
+
+if TYPE_CHECKING:
+    from .journal import RunJournal
 
 Account.enable_unaudited_hdwallet_features()
 
 
-@dataclass
+T = TypeVar("T")
+
+# Below this many underived entries the process pool costs more than it saves
+PARALLEL_DERIVE_THRESHOLD = 32
+
+
+def _derive_account(kind: str, secret: str) -> Optional[LocalAccount]:
+    try:
+        if kind == "mnemonic":
+            return Account.from_mnemonic(secret)  # type: ignore[return-value]
+        return Account.from_key(secret)  # type: ignore[return-value]
+    except Exception:
+        return None
+
+
+def _derive_address(kind: str, secret: str) -> Optional[Tuple[str, str]]:
+    # Returns (address, private key hex) so a later touch never repeats the
+    # PBKDF2 work of a mnemonic
+    acct = _derive_account(kind, secret)
+    if acct is None:
+        return None
+    return acct.address, acct.key.hex()
+
+
+def _derive_many(fn: Callable[[str, str], T], entries: Sequence[Tuple[str, str]]) -> List[T]:
+    workers = min(len(entries) // PARALLEL_DERIVE_THRESHOLD, os.cpu_count() or 1)
+    if workers < 2:
+        return [fn(kind, secret) for kind, secret in entries]
+    kinds, secrets = zip(*entries)
+    # LocalAccount pickles with its public key, so results cross back cheaply.
+    # Spawned, not forked: callers run alongside aiohttp, batching and receipt
+    # threads, and a forked child can inherit one of their locks held.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(fn, kinds, secrets, chunksize=PARALLEL_DERIVE_THRESHOLD))
+
+
+def _cache_key(secret: str) -> str:
+    # Only a digest of the secret is written to disk, never the secret itself
+    return hashlib.sha256(secret.strip().encode()).hexdigest()
+
+
 class Wallet:
-    address: str
-    account: LocalAccount
+    # The address is known up front (from the cache or a one-off derivation);
+    # the signing account is only built when a caller first touches it.
+    __slots__ = ("address", "_account", "_kind", "_secret")
+
+    def __init__(
+        self,
+        address: str,
+        account: Optional[LocalAccount] = None,
+        kind: str = "private_key",
+        secret: Optional[str] = None,
+    ) -> None:
+        self.address = address
+        self._account = account
+        self._kind = kind
+        self._secret = secret
+
+    @property
+    def derived(self) -> bool:
+        return self._account is not None
+
+    @property
+    def account(self) -> LocalAccount:
+        if self._account is None:
+            if self._kind == "mnemonic":
+                self._account = Account.from_mnemonic(self._secret)  # type: ignore[assignment]
+            else:
+                self._account = Account.from_key(self._secret)  # type: ignore[assignment]
+            self._secret = None
+        return self._account
+
+    def _set_account(self, account: LocalAccount) -> None:
+        self._account = account
+        self._secret = None
+
+    def __repr__(self) -> str:
+        return f"Wallet(address={self.address!r})"
 
 
 class WalletManager:
-    def __init__(self, web3: Web3, accounts_file: str):
+    def __init__(
+        self,
+        web3: Union[Web3, AsyncWeb3],
+        accounts_file: str,
+        address_cache_file: Optional[str] = None,
+    ):
         self.web3 = web3
         self.wallets: List[Wallet] = []
-        self._load_accounts(accounts_file)
+        self.nonces = NonceManager(web3)
+        self._by_address: Dict[str, Wallet] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._cache_path = Path(address_cache_file) if address_cache_file else None
+        with TRACER.span("wallets.load", accounts_file=accounts_file):
+            self._load_accounts(accounts_file)
+
+    def _read_address_cache(self) -> Dict[str, str]:
+        if self._cache_path is None or not self._cache_path.exists():
+            return {}
+        try:
+            data = json.loads(self._cache_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write_address_cache(self, cache: Dict[str, str]) -> None:
+        if self._cache_path is None:
+            return
+        tmp = self._cache_path.with_name(self._cache_path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(cache))
+            os.replace(tmp, self._cache_path)
+        except OSError:
+            pass
 
     def _load_accounts(self, accounts_file: str) -> None:
         path = Path(accounts_file)
         if not path.exists():
             return
         data = json.loads(path.read_text())
+        cache = self._read_address_cache()
+
+        entries: List[Tuple[str, str]] = []
         for entry in data:
-            try:
-                if isinstance(entry, dict) and entry.get("private_key"):
-                    acct: LocalAccount = Account.from_key(entry["private_key"])  # type: ignore[assignment]
-                    self.wallets.append(Wallet(address=acct.address, account=acct))
-                elif isinstance(entry, dict) and entry.get("mnemonic"):
-                    acct = Account.from_mnemonic(entry["mnemonic"])  # type: ignore[assignment]
-                    self.wallets.append(Wallet(address=acct.address, account=acct))
-            except Exception:
-                # Skip invalid key/mnemonic entries
-                continue
+            if isinstance(entry, dict) and entry.get("private_key"):
+                entries.append(("private_key", str(entry["private_key"])))
+            elif isinstance(entry, dict) and entry.get("mnemonic"):
+                entries.append(("mnemonic", str(entry["mnemonic"])))
+
+        keys = [_cache_key(secret) for _, secret in entries]
+        missing = [i for i, key in enumerate(keys) if key not in cache]
+        with TRACER.span("wallets.derive_addresses", entries=len(entries), uncached=len(missing)):
+            derived: Dict[int, Optional[Tuple[str, str]]] = dict(
+                zip(missing, _derive_many(_derive_address, [entries[i] for i in missing]))
+            )
+
+        for i, ((kind, secret), key) in enumerate(zip(entries, keys)):
+            if i in derived:
+                result = derived[i]
+                if result is None:
+                    # Skip invalid key/mnemonic entries
+                    continue
+                address, key_hex = result
+                cache[key] = address
+                wallet = Wallet(address, kind="private_key", secret=key_hex)
+            else:
+                wallet = Wallet(cache[key], kind=kind, secret=secret)
+            self.wallets.append(wallet)
+            self._by_address.setdefault(wallet.address.lower(), wallet)
+
+        if missing:
+            self._write_address_cache(cache)
+
+    def get(self, address: str) -> Optional[Wallet]:
+        return self._by_address.get(address.lower())
+
+    def derive_all(self) -> None:
+        # Build every signing account up front, in parallel for large sets
+        pending = [w for w in self.wallets if not w.derived]
+        with TRACER.span("wallets.derive_all", pending=len(pending)):
+            accounts = _derive_many(_derive_account, [(w._kind, w._secret) for w in pending])  # type: ignore[misc]
+        for wallet, account in zip(pending, accounts):
+            if account is not None:
+                wallet._set_account(account)
+
+    def signer_for(self, address: Optional[str]) -> Optional[LocalAccount]:
+        wallet = self._by_address.get(address.lower()) if address else None
+        return wallet.account if wallet is not None else None
+
+    def sign_transaction(self, tx: TxParams) -> HexBytes:
+        # tx must be fully filled (nonce, gas, fees, chainId)
+        account = self.signer_for(tx.get("from"))  # type: ignore[arg-type]
+        if account is None:
+            raise ValueError(f"No loaded wallet for sender: {tx.get('from')}")
+        signable = {k: v for k, v in tx.items() if k != "from"}
+        return HexBytes(account.sign_transaction(signable).raw_transaction)
+
+    def _sign_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) + 2), thread_name_prefix="sign")
+        return self._executor
+
+    async def sign_transactions(self, txs: Sequence[TxParams]) -> List[HexBytes]:
+        # Key derivation and ECDSA signing are CPU-bound; keep them off the event loop
+        loop = asyncio.get_running_loop()
+        executor = self._sign_executor()
+        return list(await asyncio.gather(*(loop.run_in_executor(executor, self.sign_transaction, tx) for tx in txs)))
 
     def attach_wallet(self, wallet: Wallet) -> None:
-        builder = SignAndSendRawMiddlewareBuilder(self.web3)
-        self.web3.middleware_onion.add(builder.build(account=wallet.account))
+        # One signing middleware serves every loaded wallet; attaching just makes
+        # sure it is installed and the wallet's key is derived
+        wallet.account
+        onion = self.web3.middleware_onion
+        if "wallet_signer" in onion:
+            return
+        onion.add(WalletSigningMiddlewareBuilder.build(self), name="wallet_signer")
+        # Nonce and fee fields must be filled before the signer sees the tx,
+        # so keep those middlewares outside it
+        if "chain_state" in onion:
+            chain_state = onion["chain_state"]
+            onion.remove("chain_state")
+            onion.add(chain_state, name="chain_state")
+        if "local_nonce" in onion:
+            onion.remove("local_nonce")
+        onion.add(LocalNonceMiddlewareBuilder.build(self.nonces), name="local_nonce")
+
+    def pipeline(
+        self, wallet: Wallet, tracker: Optional[ReceiptTracker] = None, journal: Optional["RunJournal"] = None
+    ) -> TransactionPipeline:
+        return TransactionPipeline(self.web3, wallet.account, self.nonces, tracker=tracker, journal=journal)
 
     def attach_first_wallet(self) -> Wallet:
         if not self.wallets:
@@ -54,3 +250,52 @@ class WalletManager:
 
     def iterate_wallets(self) -> Iterable[Wallet]:
         yield from self.wallets
+
+
+class WalletSigningMiddlewareBuilder(Web3MiddlewareBuilder):
+    # Signs eth_sendTransaction for any wallet the WalletManager has loaded,
+    # resolving the sender with a single dict lookup; unknown senders pass
+    # through to the node untouched.
+    wallets: WalletManager
+
+    @staticmethod
+    @curry
+    def build(wallets: WalletManager, w3: Union[Web3, AsyncWeb3]) -> "WalletSigningMiddlewareBuilder":
+        middleware = WalletSigningMiddlewareBuilder(w3)
+        middleware.wallets = wallets
+        return middleware
+
+    def _sender(self, method: RPCEndpoint, params: Any) -> Optional[LocalAccount]:
+        if method != "eth_sendTransaction" or not params or not isinstance(params[0], dict):
+            return None
+        return self.wallets.signer_for(params[0].get("from"))
+
+    # The send is tagged with its sender so a PooledHTTPProvider can keep each
+    # wallet on one node without recovering the signature
+    def wrap_make_request(self, make_request):
+        def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            account = self._sender(method, params)
+            if account is None:
+                return make_request(method, params)
+            tx = fill_nonce(self._w3, fill_transaction_defaults(self._w3, format_transaction(params[0])))
+            tx.pop("from", None)
+            raw = account.sign_transaction(tx).raw_transaction
+            with sending_as(account.address):
+                return make_request(RPCEndpoint("eth_sendRawTransaction"), [raw.to_0x_hex()])
+
+        return middleware
+
+    async def async_wrap_make_request(self, make_request):
+        async def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            account = self._sender(method, params)
+            if account is None:
+                return await make_request(method, params)
+            tx = await async_fill_transaction_defaults(self._w3, format_transaction(params[0]))
+            tx = await async_fill_nonce(self._w3, tx)
+            tx.pop("from", None)
+            loop = asyncio.get_running_loop()
+            signed = await loop.run_in_executor(self.wallets._sign_executor(), account.sign_transaction, tx)
+            with sending_as(account.address):
+                return await make_request(RPCEndpoint("eth_sendRawTransaction"), [signed.raw_transaction.to_0x_hex()])
+
+        return middleware